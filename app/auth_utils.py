@@ -1,10 +1,17 @@
-from fastapi import Request, HTTPException, Depends
+from fastapi import Request, HTTPException
 from starlette.status import HTTP_302_FOUND
 from passlib.context import CryptContext
 from fastapi import Request
 from itsdangerous import URLSafeSerializer
+from collections import OrderedDict
+from typing import NamedTuple
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
+import time
 from dotenv import load_dotenv
+from app.db import fetchrow
+from app.queries import USER_ID_BY_USERNAME
 
 load_dotenv()
 
@@ -12,27 +19,155 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 secret_key = os.getenv("SECRET_KEY")
 serializer = URLSafeSerializer(secret_key)
 
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "4096"))
+
+# bcrypt runs on a small dedicated thread pool (it releases the GIL), never on the event loop.
+# At most HASH_WORKERS hashes run at once and HASH_MAX_PENDING may wait; past that requests
+# are turned away with HashingOverloaded instead of queueing without bound.
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", "32"))
+hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+hash_metrics = {
+    "pending": 0,  # running + waiting for a worker
+    "peak_pending": 0,
+    "rejected": 0,
+    "completed": 0,
+    "total_ms": 0.0,
+    "max_ms": 0.0,
+}
+
+class HashingOverloaded(Exception):
+    pass
+
+class Principal(NamedTuple):
+    user_id: int
+    username: str
+
+# Bounded LRU: username => user_id
+identity_cache: OrderedDict[str, int] = OrderedDict()
+
+def remember_identity(username: str, user_id: int):
+    identity_cache[username] = user_id
+    identity_cache.move_to_end(username)
+    while len(identity_cache) > IDENTITY_CACHE_SIZE:
+        identity_cache.popitem(last=False)
+
+def cached_user_id(username: str) -> int | None:
+    user_id = identity_cache.get(username)
+    if user_id is not None:
+        identity_cache.move_to_end(username)
+    return user_id
+
+async def resolve_user_id(username: str) -> int | None:
+    # Cache first, database only on a miss
+    user_id = cached_user_id(username)
+    if user_id is None:
+        row = await fetchrow(USER_ID_BY_USERNAME, username)
+        if not row:
+            return None
+        user_id = row["id"]
+        remember_identity(username, user_id)
+    return user_id
+
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
-def create_session_cookie(username: str) -> str:
-    return serializer.dumps({"username": username})
+async def run_hashing(fn, *args):
+    if hash_metrics["pending"] >= HASH_WORKERS + HASH_MAX_PENDING:
+        hash_metrics["rejected"] += 1
+        raise HashingOverloaded()
+
+    hash_metrics["pending"] += 1
+    hash_metrics["peak_pending"] = max(hash_metrics["peak_pending"], hash_metrics["pending"])
+    started = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(hash_executor, fn, *args)
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000  # includes time waiting for a worker
+        hash_metrics["pending"] -= 1
+        hash_metrics["completed"] += 1
+        hash_metrics["total_ms"] += elapsed_ms
+        hash_metrics["max_ms"] = max(hash_metrics["max_ms"], elapsed_ms)
+
+async def hash_password_async(password: str) -> str:
+    return await run_hashing(hash_password, password)
 
-def decode_session_cookie(cookie: str) -> str | None:
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await run_hashing(verify_password, plain_password, hashed_password)
+
+def get_hash_stats() -> dict:
+    completed = hash_metrics["completed"]
+    return {
+        **hash_metrics,
+        "workers": HASH_WORKERS,
+        "max_pending": HASH_MAX_PENDING,
+        "avg_ms": round(hash_metrics["total_ms"] / completed, 2) if completed else 0.0,
+    }
+
+# Session cookies: {"v": 2, "u": username, "id": user_id, "exp": unix seconds}, signed.
+# Cookies from before versioning ({"username", "user_id"}) carry no issue time, so they could
+# never expire: they are rejected and their holders sign in again.
+SESSION_COOKIE_VERSION = 2
+SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", str(30 * 24 * 3600)))  # seconds
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "4096"))
+SESSION_CACHE_TTL = int(os.getenv("SESSION_CACHE_TTL", "3600"))  # seconds, at most (and for rejected cookies)
+
+# Bounded LRU of verified cookies: cookie => (session data or None if invalid, cached until)
+session_cache: OrderedDict[str, tuple] = OrderedDict()
+
+def create_session_cookie(username: str, user_id: int) -> str:
+    return serializer.dumps({
+        "v": SESSION_COOKIE_VERSION,
+        "u": username,
+        "id": user_id,
+        "exp": int(time.time()) + SESSION_MAX_AGE,
+    })
+
+def verify_session_cookie(cookie: str) -> dict | None:
+    # Signature check + JSON decode; returns {"username", "user_id", "exp"} or None
     try:
         data = serializer.loads(cookie)
-        return data.get("username")
     except Exception:
         return None
+    if not isinstance(data, dict):
+        return None
+    if data.get("v") == SESSION_COOKIE_VERSION:
+        if not data.get("u") or data.get("exp", 0) <= time.time():
+            return None
+        return {"username": data["u"], "user_id": data.get("id"), "exp": data["exp"]}
+    return None
+
+def decode_session_data(cookie: str) -> dict | None:
+    # Verified once per cookie, then served from the cache until it expires
+    now = time.time()
+    entry = session_cache.get(cookie)
+    if entry is not None and entry[1] > now:
+        session_cache.move_to_end(cookie)
+        return entry[0]
+
+    data = verify_session_cookie(cookie)
+    cached_until = now + SESSION_CACHE_TTL
+    if data:
+        cached_until = min(cached_until, data["exp"])
+    session_cache[cookie] = (data, cached_until)
+    session_cache.move_to_end(cookie)
+    while len(session_cache) > SESSION_CACHE_SIZE:
+        session_cache.popitem(last=False)
+    return data
+
+def request_session(request: Request) -> dict | None:
+    # Memoized on the request, so several dependencies share one lookup
+    if not hasattr(request.state, "session_data"):
+        cookie = request.cookies.get("session")
+        request.state.session_data = decode_session_data(cookie) if cookie else None
+    return request.state.session_data
 
 def get_current_user(request: Request):
-    cookie = request.cookies.get("session")
-    if not cookie:
-        return None
-    return decode_session_cookie(cookie)
+    data = request_session(request)
+    return data["username"] if data else None
 
 def is_password_complex(password: str) -> bool:
     """Check if password meets complexity requirements:
@@ -50,23 +185,19 @@ def is_password_complex(password: str) -> bool:
 
     return has_upper and has_digit and has_symbol
 
-async def auth_required(request: Request):
-    user = get_current_user(request)
-    if not user:
+async def auth_required(request: Request) -> Principal:
+    data = request_session(request)
+    username = data.get("username") if data else None
+    if not username:
         # Raise exception or redirect
         raise HTTPException(status_code=HTTP_302_FOUND, detail="Redirect", headers={"Location": "/welcome"})
-    return user
-
-def split_sentences(text):
-    sentences = []
-    current_sentence = ""
-    for char in text:
-        if char.isdigit() and not current_sentence.endswith("."):
-            if current_sentence.strip():
-                sentences.append(current_sentence.strip())
-            current_sentence = ""
-        else:
-            current_sentence += char
-    if current_sentence.strip():
-        sentences.append(current_sentence.strip())
-    return sentences
+
+    user_id = data.get("user_id")
+    if user_id is not None:
+        remember_identity(username, user_id)
+    else:
+        # No user id in the cookie: look it up
+        user_id = await resolve_user_id(username)
+        if user_id is None:
+            raise HTTPException(status_code=HTTP_302_FOUND, detail="Redirect", headers={"Location": "/welcome"})
+    return Principal(user_id, username)
@@ -0,0 +1,127 @@
+# app/backplane.py
+# Broadcast backplane for websocket rooms.
+# broadcast() in app/routes/websock.py publishes every message here; each worker process
+# delivers it to the sockets it holds locally. The in-process backend is enough for a single
+# worker. The Postgres backend fans out across processes with LISTEN/NOTIFY on the database we
+# already use. A message too large for a NOTIFY payload is stored in backplane_messages and
+# only its id is notified; the other workers read it back from there.
+# It carries broadcasts only: game state and presence stay per worker, so the app itself
+# still runs as one worker (see README).
+
+import asyncio
+import json
+import logging
+import os
+import uuid
+import asyncpg
+from app.db import DATABASE_URL, execute, fetchrow
+from app.queries import PUBLISH_BACKPLANE_REFERENCE, BACKPLANE_MESSAGE
+
+logger = logging.getLogger("backplane")
+
+BROADCAST_BACKPLANE = os.getenv("BROADCAST_BACKPLANE", "memory")  # "memory" | "postgres"
+BROADCAST_CHANNEL = os.getenv("BROADCAST_CHANNEL", "gifreact_broadcast")
+NOTIFY_PAYLOAD_LIMIT = 7900  # Postgres caps NOTIFY payloads at 8000 bytes
+BACKPLANE_MESSAGE_TTL = float(os.getenv("BACKPLANE_MESSAGE_TTL", "300"))  # seconds a stored large message is kept
+
+WORKER_ID = uuid.uuid4().hex  # lets a worker skip its own notifications
+
+class InProcessBackplane:
+    # Single worker: nothing to fan out, local delivery already happened
+    async def start(self, deliver):
+        self.deliver = deliver
+
+    async def publish(self, room: str, kind: str, text: str, snapshot_text: str | None = None, key=None):
+        return None
+
+    async def stop(self):
+        return None
+
+class PostgresBackplane:
+    def __init__(self):
+        self.deliver = None
+        self.listener = None
+        self.stopping = False
+
+    async def start(self, deliver):
+        self.deliver = deliver
+        self.stopping = False
+        await self.connect_listener()
+
+    async def connect_listener(self):
+        # LISTEN needs a connection of its own, outside the query pool
+        self.listener = await asyncpg.connect(DATABASE_URL)
+        self.listener.add_termination_listener(self.on_listener_lost)
+        await self.listener.add_listener(BROADCAST_CHANNEL, self.on_notify)
+        logger.info(f"Listening for broadcasts on '{BROADCAST_CHANNEL}' as worker {WORKER_ID}")
+
+    def on_listener_lost(self, conn):
+        if not self.stopping:
+            logger.warning("Broadcast listener connection lost, reconnecting")
+            asyncio.create_task(self.reconnect())
+
+    async def reconnect(self):
+        delay = 1
+        while not self.stopping:
+            try:
+                await self.connect_listener()
+                return
+            except Exception as e:
+                logger.error(f"Broadcast listener reconnect failed: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    def on_notify(self, conn, pid, channel, payload):
+        try:
+            envelope = json.loads(payload)
+        except ValueError:
+            return
+        if envelope.get("origin") == WORKER_ID:
+            return
+        if "ref" in envelope:
+            asyncio.create_task(self.deliver_reference(envelope["ref"]))
+            return
+        self.dispatch(envelope)
+
+    async def deliver_reference(self, ref: int):
+        # A message that was too large for NOTIFY: read it back from backplane_messages
+        try:
+            row = await fetchrow(BACKPLANE_MESSAGE, ref)
+        except Exception as e:
+            logger.error(f"Failed to read stored broadcast {ref}: {e}")
+            return
+        if row is None:
+            logger.warning(f"Stored broadcast {ref} expired before it was read")
+            return
+        self.dispatch(json.loads(row["payload"]))
+
+    def dispatch(self, envelope: dict):
+        kind, text, snapshot, key = envelope["kind"], envelope["text"], envelope.get("snapshot"), envelope.get("key")
+        if kind == "session_delta" and snapshot:
+            # Deltas are relative to the publishing worker's last payload; send our clients the full snapshot
+            kind, text = "session_update", snapshot
+        asyncio.create_task(self.deliver(envelope["room"], kind, text, snapshot, key))
+
+    async def publish(self, room: str, kind: str, text: str, snapshot_text: str | None = None, key=None):
+        envelope = {"origin": WORKER_ID, "room": room, "kind": kind, "text": text, "snapshot": snapshot_text, "key": key}
+        payload = json.dumps(envelope)
+        if len(payload.encode()) > NOTIFY_PAYLOAD_LIMIT:
+            # Too large for NOTIFY: store it and notify its id instead
+            await fetchrow(PUBLISH_BACKPLANE_REFERENCE, BROADCAST_CHANNEL, WORKER_ID, payload, BACKPLANE_MESSAGE_TTL)
+            return
+        await execute("SELECT pg_notify($1, $2)", BROADCAST_CHANNEL, payload)
+
+    async def stop(self):
+        self.stopping = True
+        if self.listener is not None:
+            try:
+                await self.listener.close()
+            finally:
+                self.listener = None
+
+def create_backplane():
+    if BROADCAST_BACKPLANE == "postgres":
+        return PostgresBackplane()
+    return InProcessBackplane()
+
+backplane = create_backplane()
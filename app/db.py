@@ -1,43 +1,212 @@
 # app/db.py
 import asyncpg
+import asyncio
 import os
+import logging
+import time
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+from app.queries import NamedQuery
 
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-async def connect_db():
-    return await asyncpg.connect(DATABASE_URL)
+# Pool sizing / timeouts (overridable through .env)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_ACQUIRE_TIMEOUT = float(os.getenv("DB_ACQUIRE_TIMEOUT", "10"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "30"))
 
-# Run a query and return a single row
-async def fetchrow(query, *args):
-    conn = await connect_db()
+logger = logging.getLogger("db")
+
+# Process-wide pool, created by the lifespan hook in app/main.py
+pool: asyncpg.Pool | None = None
+
+# Pool saturation counters
+pool_metrics = {
+    "acquired": 0,
+    "in_use": 0,
+    "peak_in_use": 0,
+    "waiting": 0,
+    "peak_waiting": 0,
+    "acquire_timeouts": 0,
+}
+
+# Per named query: calls, errors, total/max latency in ms
+query_stats: dict[str, dict] = {}
+
+class RegistryConnection(asyncpg.Connection):
+    # Pool connection that keeps the prepared statements of app/queries.py for its lifetime
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._named_statements = {}
+
+    async def named_statement(self, query: NamedQuery):
+        stmt = self._named_statements.get(query.name)
+        if stmt is None:
+            stmt = await self.prepare(query)
+            self._named_statements[query.name] = stmt
+        return stmt
+
+    def forget_named_statement(self, query: NamedQuery):
+        self._named_statements.pop(query.name, None)
+
+async def _run_named(conn, mode, query: NamedQuery, args):
+    stats = query_stats.setdefault(query.name, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+    started = time.perf_counter()
     try:
-        row = await conn.fetchrow(query, *args)
-        return row
+        try:
+            stmt = await conn.named_statement(query)
+            return await getattr(stmt, mode)(*args)
+        except asyncpg.exceptions.InvalidCachedStatementError:
+            # Schema changed under a prepared statement: re-prepare once
+            conn.forget_named_statement(query)
+            stmt = await conn.named_statement(query)
+            return await getattr(stmt, mode)(*args)
+    except Exception:
+        stats["errors"] += 1
+        raise
     finally:
-        await conn.close()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        stats["calls"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+async def _conn_fetchrow(conn, query, args):
+    if isinstance(query, NamedQuery):
+        return await _run_named(conn, "fetchrow", query, args)
+    return await conn.fetchrow(query, *args)
+
+async def _conn_fetch(conn, query, args):
+    if isinstance(query, NamedQuery):
+        return await _run_named(conn, "fetch", query, args)
+    return await conn.fetch(query, *args)
+
+async def _conn_execute(conn, query, args):
+    if "returning" in query.lower():
+        # If the query has a RETURNING clause, fetch and return the result
+        return await _conn_fetch(conn, query, args)
+    if isinstance(query, NamedQuery):
+        # PreparedStatement has no execute(); fetch() runs it and returns no rows
+        await _run_named(conn, "fetch", query, args)
+    else:
+        await conn.execute(query, *args)
+    return None
+
+def get_query_stats() -> dict:
+    report = {}
+    for name, stats in query_stats.items():
+        calls = stats["calls"]
+        report[name] = {
+            "calls": calls,
+            "errors": stats["errors"],
+            "avg_ms": round(stats["total_ms"] / calls, 3) if calls else 0.0,
+            "max_ms": round(stats["max_ms"], 3),
+        }
+    return report
+
+async def init_pool():
+    global pool
+    if pool is None:
+        pool = await asyncpg.create_pool(
+            DATABASE_URL,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            command_timeout=DB_COMMAND_TIMEOUT,
+            connection_class=RegistryConnection,
+        )
+        logger.info(f"Database pool ready (min={DB_POOL_MIN_SIZE}, max={DB_POOL_MAX_SIZE})")
+    return pool
+
+async def close_pool():
+    global pool
+    if pool is not None:
+        await pool.close()
+        pool = None
+
+def get_pool_stats() -> dict:
+    stats = dict(pool_metrics)
+    stats["min_size"] = DB_POOL_MIN_SIZE
+    stats["max_size"] = DB_POOL_MAX_SIZE
+    if pool is not None:
+        stats["size"] = pool.get_size()
+        stats["idle"] = pool.get_idle_size()
+    else:
+        stats["size"] = 0
+        stats["idle"] = 0
+    return stats
+
+class _PooledConnection:
+    # async context manager that borrows a connection from the pool and keeps the saturation counters up to date
+    def __init__(self):
+        self.pool = None
+        self.conn = None
+
+    async def __aenter__(self):
+        # Remember the pool: the connection goes back to it even if the global pool is replaced meanwhile
+        self.pool = pool or await init_pool()
+        pool_metrics["waiting"] += 1
+        pool_metrics["peak_waiting"] = max(pool_metrics["peak_waiting"], pool_metrics["waiting"])
+        try:
+            self.conn = await self.pool.acquire(timeout=DB_ACQUIRE_TIMEOUT)
+        except asyncio.TimeoutError:
+            pool_metrics["acquire_timeouts"] += 1
+            logger.warning(f"Timed out after {DB_ACQUIRE_TIMEOUT}s waiting for a database connection")
+            raise
+        finally:
+            pool_metrics["waiting"] -= 1
+
+        pool_metrics["acquired"] += 1
+        pool_metrics["in_use"] += 1
+        pool_metrics["peak_in_use"] = max(pool_metrics["peak_in_use"], pool_metrics["in_use"])
+        return self.conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pool_metrics["in_use"] -= 1
+        await self.pool.release(self.conn)
+
+def connect_db():
+    # usage: async with connect_db() as conn: ...
+    return _PooledConnection()
+
+# Run a query and return a single row
+async def fetchrow(query, *args):
+    async with connect_db() as conn:
+        return await _conn_fetchrow(conn, query, args)
 
 # Run a query and return multiple rows
 async def fetch(query, *args):
-    conn = await connect_db()
-    try:
-        rows = await conn.fetch(query, *args)
-        return rows
-    finally:
-        await conn.close()
+    async with connect_db() as conn:
+        return await _conn_fetch(conn, query, args)
 
 # Run a query that modifies data (INSERT, UPDATE, DELETE) and optionally returns rows
 async def execute(query, *args):
-    conn = await connect_db()
-    try:
-        if "returning" in query.lower():
-            # If the query has a RETURNING clause, fetch and return the result
-            rows = await conn.fetch(query, *args)
-            return rows
-        else:
-            await conn.execute(query, *args)
-            return None
-    finally:
-        await conn.close()
+    async with connect_db() as conn:
+        return await _conn_execute(conn, query, args)
+
+class Transaction:
+    # Same fetchrow/fetch/execute API as the module functions, bound to one connection
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def fetchrow(self, query, *args):
+        return await _conn_fetchrow(self.conn, query, args)
+
+    async def fetch(self, query, *args):
+        return await _conn_fetch(self.conn, query, args)
+
+    async def execute(self, query, *args):
+        return await _conn_execute(self.conn, query, args)
+
+    async def executemany(self, query, args_list):
+        # One prepared statement, many parameter sets, single round-trip pipeline
+        if args_list:
+            await self.conn.executemany(query, args_list)
 
+@asynccontextmanager
+async def transaction():
+    # usage: async with transaction() as tx: await tx.execute(...)
+    # Statements run sequentially on one pooled connection and commit together (rolled back on error)
+    async with connect_db() as conn:
+        async with conn.transaction():
+            yield Transaction(conn)
@@ -0,0 +1,329 @@
+# app/game_state.py
+# Authoritative in-memory state for each game session.
+# A GameState is loaded from Postgres once, then updated in place by the route handlers.
+# Every mutation is also queued for the database and written behind, per session and in
+# order, so the hot path (game_page, broadcast_presence, save_gif, vote, next_round) only
+# reads memory.
+# The state is authoritative for the worker process that holds it: other workers' writes
+# never reach it, so the game supports a single worker process (see app/main.py).
+
+import asyncio
+import logging
+import os
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional
+from app.db import fetch, fetchrow, transaction
+from app.queries import (
+    SESSION_BY_ID, GAME_STARTED_BY_SESSION, SESSION_PLAYERS_WITH_SCORES, SESSION_SENTENCES,
+    SESSION_ROUNDS, SESSION_SUBMISSIONS, SESSION_VOTES,
+    INSERT_SUBMISSION, INSERT_NULL_SUBMISSIONS, INSERT_VOTE, INSERT_AUTO_VOTES, AWARD_POINTS,
+    END_ROUND, OPEN_ROUND, INSERT_SENTENCE, FINISH_SESSION, MARK_WINNER,
+    PAUSE_GAME, RESET_ROUND, DELETE_ROUND_SUBMISSIONS, DELETE_ROUND_VOTES,
+)
+
+logger = logging.getLogger("game_state")
+
+GAME_STATE_CACHE_SIZE = int(os.getenv("GAME_STATE_CACHE_SIZE", "256"))
+
+class GameState:
+    def __init__(self, session_id: int):
+        self.session_id = session_id
+        self.category = None
+        self.max_players = 0
+        self.time_per_question = 0
+        self.points_to_win = 0
+        self.host_id = None
+        self.active = False
+        self.players: Dict[str, dict] = {}  # username => {"user_id", "is_host", "score", "winner"}
+        self.sentences: List[str] = []
+        self.game_started: Optional[dict] = None  # None until the host starts the game
+        self.rounds: Dict[int, bool] = {}  # round => ended
+        self.submissions: Dict[int, Dict[int, dict]] = defaultdict(dict)  # round => user_id => {"username", "gif_url", "is_null"}
+        self.votes: Dict[int, Dict[int, int]] = defaultdict(dict)  # round => voter user_id => voted-for user_id
+        self._pending: List[tuple] = []  # statements waiting for commit()
+
+    async def load(self) -> bool:
+        session, game_started, player_rows, sentence_rows, round_rows, gif_rows, vote_rows = await asyncio.gather(
+            fetchrow(SESSION_BY_ID, self.session_id),
+            fetchrow(GAME_STARTED_BY_SESSION, self.session_id),
+            fetch(SESSION_PLAYERS_WITH_SCORES, self.session_id),
+            fetch(SESSION_SENTENCES, self.session_id),
+            fetch(SESSION_ROUNDS, self.session_id),
+            fetch(SESSION_SUBMISSIONS, self.session_id),
+            fetch(SESSION_VOTES, self.session_id),
+        )
+        if not session:
+            return False
+
+        self.category = session["category"]
+        self.max_players = session["players"]
+        self.time_per_question = session["time_per_question"]
+        self.points_to_win = session["points_to_win"]
+        self.host_id = session["host_id"]
+        self.active = session["active"]
+        self.game_started = {"paused": game_started["paused"]} if game_started else None
+        self.players = {
+            row["username"]: {"user_id": row["user_id"], "is_host": row["is_host"], "score": row["score"], "winner": row["winner"]}
+            for row in player_rows
+        }
+        self.sentences = [row["sentence"] for row in sentence_rows]
+        self.rounds = {row["round"]: bool(row["ended"]) for row in round_rows}
+        for row in gif_rows:
+            self.submissions[row["round"]][row["user_id"]] = {"username": row["username"], "gif_url": row["gif_url"], "is_null": row["is_n"]}
+        for row in vote_rows:
+            self.votes[row["round"]][row["user_id"]] = row["voted_for_user_id"]
+        return True
+
+    # ---- reads ----
+
+    @property
+    def open_round(self) -> Optional[int]:
+        # Highest round not yet ended
+        open_rounds = [r for r, ended in self.rounds.items() if not ended]
+        return max(open_rounds) if open_rounds else None
+
+    @property
+    def last_round(self) -> Optional[int]:
+        return max(self.rounds) if self.rounds else None
+
+    @property
+    def current_round(self) -> int:
+        return self.open_round or self.last_round or 1
+
+    def derived_round_state(self) -> str:
+        # For a round with no recorded state: finished games show game over, anything else is idle
+        if self.open_round is None and self.last_round is not None:
+            return "game_over" if self.winners() else "ended"
+        return "idle"
+
+    @property
+    def is_paused(self) -> bool:
+        return self.game_started["paused"] if self.game_started else False
+
+    def user_id_of(self, username: str) -> Optional[int]:
+        player = self.players.get(username)
+        return player["user_id"] if player else None
+
+    def username_of(self, user_id: int) -> Optional[str]:
+        for username, player in self.players.items():
+            if player["user_id"] == user_id:
+                return username
+        return None
+
+    def is_host(self, username: str) -> Optional[bool]:
+        player = self.players.get(username)
+        return player["is_host"] if player else None
+
+    def sentence_for(self, round: int) -> str:
+        return self.sentences[round - 1] if round - 1 < len(self.sentences) else "Statement unavailable"
+
+    def player_list(self) -> List[dict]:
+        return [
+            {"username": username, "is_host": p["is_host"], "score": p["score"], "winner": p["winner"]}
+            for username, p in self.players.items()
+        ]
+
+    def round_submissions(self, round: int) -> List[dict]:
+        return [{"user_id": user_id, **entry} for user_id, entry in self.submissions[round].items()]
+
+    def has_voted(self, round: int, user_id: int) -> bool:
+        return user_id in self.votes[round]
+
+    def votes_cast(self, round: int) -> int:
+        return len(self.votes[round])
+
+    def vote_tally(self, round: int) -> List[dict]:
+        counts: Dict[int, int] = {}
+        for voted_id in self.votes[round].values():
+            counts[voted_id] = counts.get(voted_id, 0) + 1
+        tally = [{"username": self.username_of(user_id), "votes": n} for user_id, n in counts.items()]
+        tally.sort(key=lambda row: row["votes"], reverse=True)
+        return tally
+
+    def winners(self) -> List[str]:
+        return [username for username, p in self.players.items() if p["score"] == self.points_to_win]
+
+    def leaderboard(self) -> List[dict]:
+        return [{"username": username, "score": p["score"]} for username, p in self.players.items()]
+
+    # ---- writes (memory now, database on commit) ----
+
+    def _queue(self, query: str, *args):
+        self._pending.append((query, args))
+
+    def add_submission(self, round: int, user_id: int, username: str, gif_url: Optional[str]) -> bool:
+        if user_id in self.submissions[round]:
+            return False
+        self.submissions[round][user_id] = {"username": username, "gif_url": gif_url, "is_null": gif_url is None}
+        self._queue(INSERT_SUBMISSION, self.session_id, user_id, gif_url, round, gif_url is None)
+        return True
+
+    def auto_submit(self, round: int) -> List[int]:
+        # Null GIF for every player who hasn't submitted, as one INSERT; returns their user ids
+        missing = [(username, p["user_id"]) for username, p in self.players.items() if p["user_id"] not in self.submissions[round]]
+        if not missing:
+            return []
+        for username, user_id in missing:
+            self.submissions[round][user_id] = {"username": username, "gif_url": None, "is_null": True}
+        self._queue(INSERT_NULL_SUBMISSIONS, self.session_id, round, [user_id for _, user_id in missing])
+        return [user_id for _, user_id in missing]
+
+    def add_vote(self, round: int, voter_id: int, voted_id: int) -> bool:
+        if voter_id in self.votes[round]:
+            return False
+        self.votes[round][voter_id] = voted_id
+        # A vote that is already stored (one per player per round) is skipped, not an error
+        self._queue(INSERT_VOTE, self.session_id, round, voter_id, voted_id)
+        return True
+
+    def add_auto_votes(self, round: int, pairs: List[tuple]) -> List[int]:
+        # (voter_id, voted_id) pairs cast by the game itself, plus a point for each player voted for.
+        # Points follow the votes that were actually inserted, so finalizing the same round again
+        # (this process or another one after a restart) never scores twice. Returns who scored.
+        pairs = [(voter, voted) for voter, voted in pairs if voter not in self.votes[round]]
+        if not pairs:
+            return []
+        for voter_id, voted_id in pairs:
+            self.votes[round][voter_id] = voted_id
+        scored = list(dict.fromkeys(voted for _, voted in pairs))
+        for user_id in scored:
+            username = self.username_of(user_id)
+            if username is not None:
+                self.players[username]["score"] = (self.players[username]["score"] or 0) + 1
+        self._queue(INSERT_AUTO_VOTES, self.session_id, round, [p[0] for p in pairs], [p[1] for p in pairs])
+        return scored
+
+    def award_points(self, user_ids: List[int]):
+        # One set-based UPDATE for every player who scored
+        if not user_ids:
+            return
+        for user_id in user_ids:
+            username = self.username_of(user_id)
+            if username is not None:
+                self.players[username]["score"] = (self.players[username]["score"] or 0) + 1
+        self._queue(AWARD_POINTS, self.session_id, list(user_ids))
+
+    def end_round(self, round: int):
+        self.rounds[round] = True
+        self._queue(END_ROUND, self.session_id, round)
+
+    def open_new_round(self, round: int):
+        # The round-state store may already have created the row
+        self.rounds[round] = False
+        self._queue(OPEN_ROUND, self.session_id, round)
+
+    def add_sentences(self, sentences: List[str]):
+        # Statements that arrive while the game is already running
+        self.sentences.extend(sentences)
+        for sentence in sentences:
+            self._queue(INSERT_SENTENCE, self.session_id, sentence)
+
+    def finish_game(self, winners: List[str]):
+        self.active = False
+        self._queue(FINISH_SESSION, self.session_id)
+        for username in winners:
+            self.players[username]["winner"] = True
+            self._queue(MARK_WINNER, self.session_id, self.players[username]["user_id"])
+
+    def pause(self, round: int):
+        # Pausing discards the round's submissions and votes so it can be replayed
+        if self.game_started is not None:
+            self.game_started["paused"] = True
+        self.submissions.pop(round, None)
+        self.votes.pop(round, None)
+        self._queue(PAUSE_GAME, self.session_id)
+        self._queue(RESET_ROUND, self.session_id, round)
+        self._queue(DELETE_ROUND_SUBMISSIONS, self.session_id, round)
+        self._queue(DELETE_ROUND_VOTES, self.session_id, round)
+
+    def commit(self):
+        # Hand everything queued since the last commit to the write-behind as one transaction
+        if self._pending:
+            _enqueue_write(self.session_id, self._pending)
+            self._pending = []
+
+# ---- registry ----
+
+game_states: "OrderedDict[int, GameState]" = OrderedDict()
+_load_locks: Dict[int, asyncio.Lock] = {}
+
+async def get_game_state(session_id: int) -> Optional[GameState]:
+    state = game_states.get(session_id)
+    if state is not None:
+        game_states.move_to_end(session_id)
+        return state
+
+    lock = _load_locks.setdefault(session_id, asyncio.Lock())
+    try:
+        async with lock:
+            state = game_states.get(session_id)
+            if state is None:
+                # Reads must see every write already queued for this session
+                await flush_session_writes(session_id)
+                state = GameState(session_id)
+                if not await state.load():
+                    return None
+                game_states[session_id] = state
+                while len(game_states) > GAME_STATE_CACHE_SIZE:
+                    game_states.popitem(last=False)
+        return state
+    finally:
+        if _load_locks.get(session_id) is lock and not lock.locked():
+            _load_locks.pop(session_id, None)
+
+async def invalidate_game_state(session_id: int):
+    # Called after a handler writes session data directly; the next read reloads it
+    game_states.pop(session_id, None)
+    await flush_session_writes(session_id)
+
+# ---- write-behind ----
+# Each commit() becomes a task that waits for the session's previous batch, so a session's
+# writes land in order while different sessions write concurrently (bounded by _write_slots).
+
+WRITE_BEHIND_CONCURRENCY = int(os.getenv("WRITE_BEHIND_CONCURRENCY", "4"))  # batches in flight across all sessions
+WRITE_BEHIND_ATTEMPTS = int(os.getenv("WRITE_BEHIND_ATTEMPTS", "3"))
+
+_write_slots = asyncio.Semaphore(WRITE_BEHIND_CONCURRENCY)
+_write_tails: Dict[int, asyncio.Task] = {}  # session_id => its most recently queued batch
+
+def _enqueue_write(session_id: int, statements: List[tuple]):
+    task = asyncio.create_task(_write_batch(session_id, statements, _write_tails.get(session_id)))
+    _write_tails[session_id] = task
+
+    def forget(done: asyncio.Task):
+        if _write_tails.get(session_id) is done:
+            del _write_tails[session_id]
+    task.add_done_callback(forget)
+
+async def _write_batch(session_id: int, statements: List[tuple], previous: Optional[asyncio.Task]):
+    if previous is not None:
+        await asyncio.wait([previous])
+
+    for attempt in range(1, WRITE_BEHIND_ATTEMPTS + 1):
+        try:
+            async with _write_slots:
+                async with transaction() as tx:
+                    for query, args in statements:
+                        await tx.execute(query, *args)
+            return
+        except Exception as e:
+            logger.warning(f"Write-behind for session {session_id} failed (attempt {attempt}/{WRITE_BEHIND_ATTEMPTS}): {e}")
+            if attempt < WRITE_BEHIND_ATTEMPTS:
+                await asyncio.sleep(0.2 * 2 ** attempt)
+
+    # Memory and database disagree now; drop the state so the next read reloads it from the database
+    logger.error(f"Giving up on a write-behind batch for session {session_id}; reloading its state")
+    game_states.pop(session_id, None)
+
+async def flush_session_writes(session_id: int):
+    tail = _write_tails.get(session_id)
+    if tail is not None:
+        await asyncio.wait([tail])
+
+async def flush_writes():
+    while _write_tails:
+        await asyncio.wait(list(_write_tails.values()))
+
+async def stop_write_behind():
+    # Drain queued game-state writes (called before the pool closes)
+    await flush_writes()
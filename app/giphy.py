@@ -0,0 +1,184 @@
+# app/giphy.py
+# GIPHY search proxy used by /search-gifs.
+# One pooled httpx client for the whole process (created in the app lifespan), a TTL + LRU
+# cache keyed by the normalized query, and single-flight so identical searches that are
+# already in flight share one upstream request. Point GIPHY_BASE_URL at a local fake GIPHY
+# server to run without the real API.
+# Results are trimmed to the few renditions the game can use before they are cached, and
+# each response is projected to a compact schema for the requested rendition set.
+
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("giphy")
+
+GIPHY_API_KEY = os.getenv("GIPHY_API_KEY")
+GIPHY_BASE_URL = os.getenv("GIPHY_BASE_URL", "https://api.giphy.com")
+GIPHY_TIMEOUT = float(os.getenv("GIPHY_TIMEOUT", "5"))
+GIPHY_SEARCH_LIMIT = 25
+GIPHY_CACHE_SIZE = int(os.getenv("GIPHY_CACHE_SIZE", "1024"))
+GIPHY_CACHE_TTL = float(os.getenv("GIPHY_CACHE_TTL", "600"))  # seconds
+GIPHY_MAX_OFFSET = 4999  # GIPHY rejects larger offsets
+
+# Rendition set => which GIPHY renditions fill the compact schema.
+# "default" is the small rendition the game has always submitted (100px wide), which keeps
+# search results light on mobile data; "large" and "downsampled" are 200px tall.
+RENDITION_SETS = {
+    "default": {"url": "fixed_width_small", "still": "fixed_width_small_still", "webp": "fixed_width_small"},
+    "large": {"url": "fixed_height", "still": "fixed_height_still", "webp": "fixed_height"},
+    "downsampled": {"url": "fixed_height_downsampled", "still": "fixed_height_still", "webp": "fixed_height_downsampled"},
+}
+KEPT_RENDITIONS = {name for renditions in RENDITION_SETS.values() for name in renditions.values()}
+
+client: Optional[httpx.AsyncClient] = None
+search_cache: "OrderedDict[tuple, tuple]" = OrderedDict()  # (query key, offset) => (expires_at, page)
+in_flight: Dict[tuple, asyncio.Future] = {}  # (query key, offset) => upstream request shared by every waiter
+cache_stats = {"hits": 0, "misses": 0, "coalesced": 0, "upstream_errors": 0}
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", (query or "").strip().lower())
+
+async def start_client():
+    global client
+    if client is None:
+        client = httpx.AsyncClient(
+            base_url=GIPHY_BASE_URL,
+            timeout=GIPHY_TIMEOUT,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+
+async def close_client():
+    global client
+    if client is not None:
+        await client.aclose()
+        client = None
+
+def trim_gif(gif: dict) -> dict:
+    # Keep only the renditions some rendition set can use
+    images = gif.get("images") or {}
+    return {
+        "id": gif.get("id"),
+        "title": gif.get("title") or "",
+        "images": {
+            name: {field: images[name].get(field) for field in ("url", "webp", "width", "height")}
+            for name in KEPT_RENDITIONS if name in images
+        },
+    }
+
+def project_gif(gif: dict, rendition_set: str) -> Optional[dict]:
+    renditions = RENDITION_SETS[rendition_set]
+    images = gif["images"]
+    main = images.get(renditions["url"])
+    if not main or not main.get("url"):
+        return None
+    still = images.get(renditions["still"]) or {}
+    webp = images.get(renditions["webp"]) or {}
+    return {
+        "id": gif["id"],
+        "title": gif["title"],
+        "url": main["url"],
+        "preview": still.get("url"),
+        "preview_webp": webp.get("webp"),
+        "width": int(main.get("width") or 0),
+        "height": int(main.get("height") or 0),
+    }
+
+def cached_search(key: tuple) -> Optional[dict]:
+    entry = search_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, page = entry
+    if expires_at < time.monotonic():
+        search_cache.pop(key, None)
+        return None
+    search_cache.move_to_end(key)
+    return page
+
+def remember_search(key: tuple, page: dict):
+    search_cache[key] = (time.monotonic() + GIPHY_CACHE_TTL, page)
+    search_cache.move_to_end(key)
+    while len(search_cache) > GIPHY_CACHE_SIZE:
+        search_cache.popitem(last=False)
+
+async def fetch_upstream(query: str, offset: int) -> dict:
+    if client is None:
+        await start_client()
+    response = await client.get("/v1/gifs/search", params={
+        "api_key": GIPHY_API_KEY,
+        "q": query,
+        "limit": GIPHY_SEARCH_LIMIT,
+        "offset": offset
+    })
+    response.raise_for_status()
+    body = response.json()
+    pagination = body.get("pagination") or {}
+    return {
+        "gifs": [trim_gif(gif) for gif in body.get("data", [])],
+        "total_count": pagination.get("total_count"),
+    }
+
+async def search(query: str, offset: int = 0, rendition_set: str = "default") -> dict:
+    # Compact page of results: {"gifs": [...], "offset", "next_offset"}
+    if rendition_set not in RENDITION_SETS:
+        raise ValueError(f"Unknown rendition set: {rendition_set}")
+    offset = min(max(offset, 0), GIPHY_MAX_OFFSET)
+    page = await search_page(normalize_query(query), offset)
+
+    gifs = [g for g in (project_gif(gif, rendition_set) for gif in page["gifs"]) if g]
+    next_offset = offset + len(page["gifs"])
+    total = page["total_count"]
+    has_more = len(page["gifs"]) == GIPHY_SEARCH_LIMIT and (total is None or next_offset < total) and next_offset <= GIPHY_MAX_OFFSET
+    return {"gifs": gifs, "offset": offset, "next_offset": next_offset if has_more else None}
+
+async def search_page(query: str, offset: int) -> dict:
+    if not query:
+        return {"gifs": [], "total_count": 0}
+    key = (query, offset)
+
+    page = cached_search(key)
+    if page is not None:
+        cache_stats["hits"] += 1
+        return page
+
+    pending = in_flight.get(key)
+    if pending is not None:
+        cache_stats["coalesced"] += 1
+        try:
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            if not pending.cancelled():
+                raise  # this caller was cancelled
+            # Only the leading request was cancelled (its client went away): search again ourselves
+            return await search_page(query, offset)
+
+    cache_stats["misses"] += 1
+    pending = asyncio.get_running_loop().create_future()
+    in_flight[key] = pending
+    try:
+        page = await fetch_upstream(query, offset)
+        remember_search(key, page)
+        pending.set_result(page)
+        return page
+    except Exception as e:
+        cache_stats["upstream_errors"] += 1
+        logger.error(f"GIPHY search for '{query}' (offset {offset}) failed: {e}")
+        pending.set_exception(e)
+        pending.exception()  # mark retrieved when nobody else was waiting
+        raise
+    finally:
+        if not pending.done():
+            pending.cancel()  # the leading request was cancelled; its waiters search again
+        if in_flight.get(key) is pending:
+            del in_flight[key]
+
+def get_cache_stats() -> dict:
+    return {**cache_stats, "cached_queries": len(search_cache), "in_flight": len(in_flight)}
@@ -1,13 +1,23 @@
 # app/main.py
-from fastapi import FastAPI, Request
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from app.routes import websock
 from app.routes import auth
 from app.routes import dashboard
-from app.auth_utils import get_current_user
+from app.auth_utils import get_current_user, get_hash_stats, hash_executor
+from app.rate_limit import get_rate_limit_stats
+from app.db import init_pool, close_pool, get_pool_stats, get_query_stats
+from app.game_state import stop_write_behind
+from app.backplane import backplane
+from app.migrations import run_migrations
+from app.statements import close_client as close_openai_client
+from app import statement_bank, giphy, round_timer
+from contextlib import asynccontextmanager
+import hmac
 import logging
+import os
 
 logging.basicConfig(
     level=logging.DEBUG,
@@ -17,7 +27,44 @@ logging.basicConfig(
     ]
 )
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One asyncpg pool for the whole process
+    await init_pool()
+    # Game state lives in this process's memory (app/game_state.py); a second worker would never see it
+    if int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+        logging.getLogger("main").warning("WEB_CONCURRENCY > 1: game state is per worker, run a single worker")
+    # Apply pending schema migrations and check the tables exist before serving
+    await run_migrations()
+    statement_bank.start_refill_worker()
+    await giphy.start_client()
+    round_timer.start()
+    await round_timer.restore()
+    await backplane.start(websock.deliver_local)
+    try:
+        yield
+    finally:
+        await backplane.stop()
+        await round_timer.stop()
+        await statement_bank.stop_refill_worker()
+        await close_openai_client()
+        await giphy.close_client()
+        # Drain queued game-state writes before the pool goes away
+        await stop_write_behind()
+        await close_pool()
+        # Queued bcrypt hashes have no one left to answer; don't make shutdown wait on them
+        hash_executor.shutdown(wait=False, cancel_futures=True)
+
+# /metrics/* is off unless METRICS_TOKEN is set, then needs "Authorization: Bearer <token>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+def metrics_access(request: Request):
+    # 404 rather than 401/403, so the endpoints don't advertise themselves
+    supplied = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    if not METRICS_TOKEN or not hmac.compare_digest(supplied.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=404)
+
+app = FastAPI(lifespan=lifespan)
 
 templates = Jinja2Templates(directory="app/templates")
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
@@ -33,6 +80,22 @@ async def welcome(request: Request):
         return RedirectResponse("/", status_code=302)
     return templates.TemplateResponse("welcome.html", {"request": request, "user": user})
 
+@app.get("/metrics/db", dependencies=[Depends(metrics_access)])
+async def db_metrics():
+    return get_pool_stats()
+
+@app.get("/metrics/queries", dependencies=[Depends(metrics_access)])
+async def query_metrics():
+    return get_query_stats()
+
+@app.get("/metrics/auth", dependencies=[Depends(metrics_access)])
+async def auth_metrics():
+    return {**get_hash_stats(), **get_rate_limit_stats()}
+
+@app.get("/metrics/giphy", dependencies=[Depends(metrics_access)])
+async def giphy_metrics():
+    return giphy.get_cache_stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=10000)
@@ -0,0 +1,78 @@
+-- Core game tables (see "Database Structure" in README.md).
+-- IF NOT EXISTS throughout: databases that were set up by hand before migrations existed
+-- keep their tables, fresh databases get the whole schema.
+
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    hash TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    id SERIAL PRIMARY KEY,
+    category TEXT NOT NULL,
+    players INTEGER NOT NULL,
+    time_per_question INTEGER NOT NULL,
+    points_to_win INTEGER NOT NULL,
+    host_id INTEGER REFERENCES users (id),
+    active BOOLEAN NOT NULL DEFAULT TRUE
+);
+
+CREATE TABLE IF NOT EXISTS session_users (
+    session_id INTEGER NOT NULL REFERENCES sessions (id),
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    is_host BOOLEAN NOT NULL DEFAULT FALSE,
+    PRIMARY KEY (session_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS user_scores (
+    session_id INTEGER NOT NULL REFERENCES sessions (id),
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    score INTEGER NOT NULL DEFAULT 0,
+    winner BOOLEAN NOT NULL DEFAULT FALSE,
+    PRIMARY KEY (session_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS rounds (
+    session_id INTEGER NOT NULL REFERENCES sessions (id),
+    round INTEGER NOT NULL,
+    started BOOLEAN DEFAULT FALSE,
+    ended BOOLEAN DEFAULT FALSE,
+    paused BOOLEAN DEFAULT FALSE,
+    start_at TIMESTAMPTZ,
+    pause_at TIMESTAMPTZ,
+    resume_at TIMESTAMPTZ,
+    end_at TIMESTAMPTZ,
+    PRIMARY KEY (session_id, round)
+);
+
+CREATE TABLE IF NOT EXISTS game_sentences (
+    id SERIAL PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions (id),
+    sentence TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS game_started (
+    session_id INTEGER PRIMARY KEY REFERENCES sessions (id),
+    started BOOLEAN NOT NULL DEFAULT FALSE,
+    start_time TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    paused BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+CREATE TABLE IF NOT EXISTS gif_urls (
+    id SERIAL PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions (id),
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    round INTEGER NOT NULL,
+    gif_url TEXT,
+    is_n BOOLEAN NOT NULL DEFAULT FALSE,
+    UNIQUE (session_id, user_id, round)
+);
+
+CREATE TABLE IF NOT EXISTS votes (
+    session_id INTEGER NOT NULL REFERENCES sessions (id),
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    round INTEGER NOT NULL,
+    voted_for_user_id INTEGER REFERENCES users (id),
+    PRIMARY KEY (session_id, user_id, round)
+);
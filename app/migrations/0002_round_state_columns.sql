@@ -0,0 +1,5 @@
+-- Round state kept on the rounds row (see app/round_state.py)
+ALTER TABLE rounds
+    ADD COLUMN IF NOT EXISTS state TEXT,
+    ADD COLUMN IF NOT EXISTS state_start_at TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS state_end_at TIMESTAMPTZ;
@@ -0,0 +1,18 @@
+-- Indexes behind the named queries in app/queries.py (users.username is served by its UNIQUE index).
+-- `python -m app.migrations explain` checks that each of them plans without a sequential scan.
+
+-- Current / last round lookups: newest round first, "ended" read from the index
+CREATE INDEX IF NOT EXISTS rounds_session_round_idx ON rounds (session_id, round DESC) INCLUDE (ended);
+
+-- Per-round vote and submission lookups, and the insert-if-absent checks
+CREATE INDEX IF NOT EXISTS votes_session_round_user_idx ON votes (session_id, round, user_id) INCLUDE (voted_for_user_id);
+CREATE INDEX IF NOT EXISTS gif_urls_session_round_user_idx ON gif_urls (session_id, round, user_id);
+
+-- Sessions a user belongs to (dashboard, history)
+CREATE INDEX IF NOT EXISTS session_users_user_idx ON session_users (user_id);
+
+-- A session's sentences (game page, statement bank draws)
+CREATE INDEX IF NOT EXISTS game_sentences_session_idx ON game_sentences (session_id);
+
+-- Active session listings and "is this user already in an active game" checks
+CREATE INDEX IF NOT EXISTS sessions_active_idx ON sessions (id DESC) WHERE active;
@@ -0,0 +1,8 @@
+-- Shared pool of generated statements per category (see app/statement_bank.py)
+CREATE TABLE IF NOT EXISTS statement_bank (
+    id SERIAL PRIMARY KEY,
+    category_key TEXT NOT NULL,
+    sentence TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    UNIQUE (category_key, sentence)
+);
@@ -0,0 +1,9 @@
+-- Broadcasts too large for a NOTIFY payload (see app/backplane.py): the message is stored here
+-- and only its id is sent over NOTIFY. Rows are short-lived; publishing prunes old ones.
+CREATE TABLE IF NOT EXISTS backplane_messages (
+    id BIGSERIAL PRIMARY KEY,
+    payload TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS backplane_messages_created_at_idx ON backplane_messages (created_at);
@@ -0,0 +1,123 @@
+# app/migrations/__init__.py
+# Versioned schema migrations, applied at startup.
+# Each change is a NNNN_name.sql file in this folder. Applied versions are recorded in
+# schema_migrations, and every pending file runs in its own transaction, in version order.
+# A Postgres advisory lock keeps several workers booting at once from applying the same file twice.
+# After migrating, the startup check confirms every table the app queries exists.
+# MIGRATIONS_MODE=check only reads: it refuses to start on pending migrations but changes nothing.
+# `python -m app.migrations [status|apply|explain]` runs the same steps by hand (see __main__.py).
+
+import hashlib
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+from app.db import connect_db
+
+logger = logging.getLogger("migrations")
+
+MIGRATIONS_DIR = Path(__file__).parent
+MIGRATIONS_MODE = os.getenv("MIGRATIONS_MODE", "apply").lower()  # apply | check | off
+MIGRATIONS_LOCK_KEY = int(os.getenv("MIGRATIONS_LOCK_KEY", "720451"))
+
+# Tables the app reads or writes; the startup check fails if any is missing
+REQUIRED_TABLES = [
+    "users", "sessions", "session_users", "user_scores", "rounds",
+    "game_sentences", "game_started", "gif_urls", "votes", "statement_bank",
+    "backplane_messages",
+]
+
+FILENAME = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    sql: str
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.sql.encode()).hexdigest()
+
+def load_migrations() -> List[Migration]:
+    migrations = {}
+    for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+        match = FILENAME.match(path.name)
+        if not match:
+            raise RuntimeError(f"Migration file name must look like 0001_name.sql: {path.name}")
+        version = int(match.group(1))
+        if version in migrations:
+            raise RuntimeError(f"Two migrations share version {version}: {path.name}")
+        migrations[version] = Migration(version, match.group(2), path.read_text())
+    return [migrations[v] for v in sorted(migrations)]
+
+async def applied_migrations(conn, create: bool = True) -> Dict[int, str]:
+    # version => checksum of what was applied. With create=False nothing is written:
+    # a database without schema_migrations simply has nothing applied yet.
+    if create:
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                checksum TEXT NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+        """)
+    elif await conn.fetchval("SELECT to_regclass('schema_migrations')") is None:
+        return {}
+    rows = await conn.fetch("SELECT version, checksum FROM schema_migrations")
+    return {row["version"]: row["checksum"] for row in rows}
+
+def pending_migrations(migrations: List[Migration], applied: Dict[int, str]) -> List[Migration]:
+    for migration in migrations:
+        checksum = applied.get(migration.version)
+        if checksum is not None and checksum != migration.checksum:
+            logger.warning(f"Migration {migration.version}_{migration.name} was edited after it was applied")
+    return [m for m in migrations if m.version not in applied]
+
+async def missing_tables(conn) -> List[str]:
+    rows = await conn.fetch("""
+        SELECT t.name FROM unnest($1::text[]) AS t(name)
+        WHERE to_regclass(t.name) IS NULL
+    """, REQUIRED_TABLES)
+    return [row["name"] for row in rows]
+
+async def migrate(apply: bool = True) -> List[Migration]:
+    # Returns the migrations that are (apply=False) or were (apply=True) pending.
+    # apply=False is read-only: no lock, no schema_migrations table created.
+    migrations = load_migrations()
+    async with connect_db() as conn:
+        if not apply:
+            return pending_migrations(migrations, await applied_migrations(conn, create=False))
+
+        await conn.execute("SELECT pg_advisory_lock($1)", MIGRATIONS_LOCK_KEY)
+        try:
+            pending = pending_migrations(migrations, await applied_migrations(conn))
+            for migration in pending:
+                async with conn.transaction():
+                    # No arguments: simple query protocol, so a file may hold several statements
+                    await conn.execute(migration.sql)
+                    await conn.execute("""
+                        INSERT INTO schema_migrations (version, name, checksum) VALUES ($1, $2, $3)
+                    """, migration.version, migration.name, migration.checksum)
+                logger.info(f"Applied migration {migration.version}_{migration.name}")
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATIONS_LOCK_KEY)
+    return pending
+
+async def check_schema():
+    async with connect_db() as conn:
+        missing = await missing_tables(conn)
+    if missing:
+        raise RuntimeError(f"Database is missing tables: {', '.join(missing)}")
+
+async def run_migrations():
+    # Startup hook: migrate (or, with MIGRATIONS_MODE=check, refuse to start on a stale schema)
+    if MIGRATIONS_MODE == "off":
+        return
+    pending = await migrate(apply=MIGRATIONS_MODE != "check")
+    if MIGRATIONS_MODE == "check" and pending:
+        names = ", ".join(f"{m.version}_{m.name}" for m in pending)
+        raise RuntimeError(f"Pending schema migrations: {names} (run `python -m app.migrations apply`)")
+    await check_schema()
+    logger.info(f"Schema up to date ({len(load_migrations())} migrations)")
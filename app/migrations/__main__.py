@@ -0,0 +1,57 @@
+# app/migrations/__main__.py
+# python -m app.migrations status   -> list applied / pending migrations
+# python -m app.migrations apply    -> apply pending migrations, then run the startup check
+# python -m app.migrations explain  -> EXPLAIN every named query in app/queries.py and fail on sequential scans
+#
+# The explain check covers every query in the registry: route lookups, GameState loads and
+# write-behind statements, the round-state store and statement bank draws (see plans.py).
+# Run it after `apply` against a local Postgres to check the indexes in 0003_hot_query_indexes.sql;
+# tests/test_query_plans.py runs the same check against a throwaway schema.
+
+import asyncio
+import sys
+from app.db import connect_db, init_pool, close_pool
+from app.queries import REGISTRY
+from app.migrations import load_migrations, migrate, check_schema, applied_migrations
+from app.migrations.plans import explain_seq_scans
+
+async def explain_queries() -> int:
+    failures = 0
+    async with connect_db() as conn:
+        for name, query in sorted(REGISTRY.items()):
+            scanned = await explain_seq_scans(conn, query)
+            if scanned:
+                failures += 1
+                print(f"FAIL {name}: sequential scan on {', '.join(scanned)}")
+            else:
+                print(f"ok   {name}")
+    print(f"{len(REGISTRY) - failures}/{len(REGISTRY)} queries use indexes")
+    return failures
+
+async def status():
+    async with connect_db() as conn:
+        applied = await applied_migrations(conn, create=False)
+    for migration in load_migrations():
+        mark = "applied" if migration.version in applied else "pending"
+        print(f"{migration.version:04d}_{migration.name}: {mark}")
+
+async def main(command: str) -> int:
+    await init_pool()
+    try:
+        if command == "status":
+            await status()
+        elif command == "apply":
+            pending = await migrate()
+            await check_schema()
+            print(f"Applied {len(pending)} migrations")
+        elif command == "explain":
+            return 1 if await explain_queries() else 0
+        else:
+            print(f"Unknown command: {command} (expected status, apply or explain)")
+            return 2
+        return 0
+    finally:
+        await close_pool()
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "status")))
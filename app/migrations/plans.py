@@ -0,0 +1,39 @@
+# app/migrations/plans.py
+# Query plan check shared by `python -m app.migrations explain` and tests/test_query_plans.py.
+# Each query is planned with enable_seqscan off, so a Seq Scan in the plan means no index can
+# serve it at all (rather than the planner preferring a scan of a small table).
+# EXPLAIN without ANALYZE never runs the statement, so writes are safe to check too.
+
+import json
+from datetime import datetime, timezone
+
+# Placeholder values by parameter type; EXPLAIN only needs them to type-check the plan
+SAMPLE_VALUES = {
+    "int2": 1, "int4": 1, "int8": 1,
+    "text": "sample", "varchar": "sample", "bpchar": "sample",
+    "float4": 1.0, "float8": 1.0, "numeric": 1,
+    "bool": True,
+    "timestamptz": datetime.now(timezone.utc), "timestamp": datetime.now(),
+}
+
+def sample_value(param_type):
+    if param_type.kind == "array":
+        return [sample_value(param_type.element_type)]
+    return SAMPLE_VALUES.get(param_type.name, "sample")
+
+def seq_scans(plan: dict) -> list[str]:
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name", "?"))
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+async def explain_seq_scans(conn, query: str) -> list[str]:
+    # Tables the query would read with a sequential scan (empty when every read uses an index)
+    async with conn.transaction():
+        await conn.execute("SET LOCAL enable_seqscan = off")
+        stmt = await conn.prepare(f"EXPLAIN (FORMAT JSON) {query}")
+        args = [sample_value(p) for p in stmt.get_parameters()]
+        plan = json.loads(await stmt.fetchval(*args))[0]["Plan"]
+    return seq_scans(plan)
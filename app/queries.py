@@ -0,0 +1,306 @@
+# app/queries.py
+# Named registry of the hot SQL: the route handlers, GameState loads and write-behind,
+# the round-state store and statement bank draws.
+# A NamedQuery is still a plain SQL string, so it can be passed to fetchrow/fetch/execute
+# like any other query; app/db.py recognises it, prepares it once per pooled connection
+# and records per-query call counts and latency.
+
+REGISTRY: dict[str, "NamedQuery"] = {}
+
+class NamedQuery(str):
+    def __new__(cls, name: str, sql: str):
+        query = super().__new__(cls, sql)
+        query.name = name
+        REGISTRY[name] = query
+        return query
+
+# Users
+USER_ID_BY_USERNAME = NamedQuery("user_id_by_username", """
+    SELECT id FROM users WHERE username = $1
+""")
+
+USER_CREDENTIALS = NamedQuery("user_credentials", """
+    SELECT id, hash FROM users WHERE username = $1
+""")
+
+# Single round trip: no row back means the username is taken
+CREATE_USER = NamedQuery("create_user", """
+    INSERT INTO users (username, hash)
+    VALUES ($1, $2)
+    ON CONFLICT (username) DO NOTHING
+    RETURNING id
+""")
+
+# Sessions
+# The active session a user is in, for the dashboard card
+USER_ACTIVE_SESSION = NamedQuery("user_active_session", """
+    SELECT
+        s.*,
+        u2.username AS host_username,
+        (
+            SELECT COUNT(*)
+            FROM session_users
+            WHERE session_id = s.id
+        ) AS user_count
+    FROM sessions s
+    JOIN session_users su ON su.session_id = s.id
+    JOIN users u ON u.id = su.user_id
+    JOIN users u2 ON u2.id = s.host_id
+    WHERE u.username = $1 AND s.active = TRUE
+    LIMIT 1
+""")
+
+ACTIVE_SESSIONS = NamedQuery("active_sessions", """
+    SELECT
+        s.*,
+        u.username AS host_username,
+        COUNT(su.user_id) AS user_count,
+        BOOL_OR(su.user_id = $1) AS user_in
+    FROM sessions s
+    LEFT JOIN session_users su ON su.session_id = s.id
+    LEFT JOIN users u ON u.id = s.host_id
+    WHERE s.active = TRUE
+    GROUP BY s.id, u.username
+    ORDER BY s.id DESC
+""")
+
+USER_IN_ACTIVE_SESSION = NamedQuery("user_in_active_session", """
+    SELECT 1 FROM session_users
+    JOIN sessions ON session_users.session_id = sessions.id
+    WHERE session_users.user_id = $1
+    AND sessions.active = TRUE
+""")
+
+# The user's active session (if any) and whether they are in session $2, in one round trip
+USER_ACTIVE_SESSION_AND_MEMBERSHIP = NamedQuery("user_active_session_and_membership", """
+    SELECT
+        (SELECT session_id FROM session_users
+         JOIN sessions ON session_users.session_id = sessions.id
+         WHERE session_users.user_id = $1 AND sessions.active = TRUE LIMIT 1) AS active_session_id,
+        (SELECT 1 FROM session_users WHERE session_id = $2 AND user_id = $1 LIMIT 1) AS user_in_session
+""")
+
+SESSION_BY_ID = NamedQuery("session_by_id", """
+    SELECT * FROM sessions WHERE id = $1
+""")
+
+GAME_STARTED_BY_SESSION = NamedQuery("game_started_by_session", """
+    SELECT * FROM game_started WHERE session_id = $1
+""")
+
+SESSION_PLAYER_COUNT = NamedQuery("session_player_count", """
+    SELECT COUNT(*) AS count FROM session_users WHERE session_id = $1
+""")
+
+SESSION_PLAYERS = NamedQuery("session_players", """
+    SELECT users.username, session_users.is_host
+    FROM session_users
+    JOIN users ON session_users.user_id = users.id
+    WHERE session_users.session_id = $1
+""")
+
+SESSION_PLAYERS_WITH_SCORES = NamedQuery("session_players_with_scores", """
+    SELECT users.id AS user_id, users.username, session_users.is_host, user_scores.score, user_scores.winner
+    FROM session_users
+    JOIN users ON session_users.user_id = users.id
+    LEFT JOIN user_scores
+      ON session_users.user_id = user_scores.user_id
+     AND session_users.session_id = user_scores.session_id
+    WHERE session_users.session_id = $1
+""")
+
+SESSION_SENTENCES = NamedQuery("session_sentences", """
+    SELECT sentence FROM game_sentences WHERE session_id = $1 ORDER BY id
+""")
+
+# Loaded by GameState.load (app/game_state.py)
+SESSION_ROUNDS = NamedQuery("session_rounds", """
+    SELECT round, ended FROM rounds WHERE session_id = $1
+""")
+
+SESSION_SUBMISSIONS = NamedQuery("session_submissions", """
+    SELECT g.round, g.user_id, u.username, g.gif_url, g.is_n
+    FROM gif_urls g
+    JOIN users u ON g.user_id = u.id
+    WHERE g.session_id = $1
+""")
+
+SESSION_VOTES = NamedQuery("session_votes", """
+    SELECT round, user_id, voted_for_user_id FROM votes WHERE session_id = $1
+""")
+
+# Rounds
+# Current round = highest round not yet ended, else the last round; with its state, one round trip
+CURRENT_ROUND = NamedQuery("current_round", """
+    SELECT round, ended, state, state_start_at, state_end_at FROM rounds
+    WHERE session_id = $1
+    ORDER BY ended IS DISTINCT FROM FALSE, round DESC
+    LIMIT 1
+""")
+
+ROUND_BY_NUMBER = NamedQuery("round_by_number", """
+    SELECT * FROM rounds WHERE session_id = $1 AND round = $2
+""")
+
+SESSION_TIME_PER_QUESTION = NamedQuery("session_time_per_question", """
+    SELECT time_per_question FROM sessions WHERE id = $1
+""")
+
+START_ROUND = NamedQuery("start_round", """
+    UPDATE rounds
+    SET started = TRUE, paused = FALSE, start_at = $1, end_at = $2
+    WHERE session_id = $3 AND round = $4
+""")
+
+RESUME_ROUND = NamedQuery("resume_round", """
+    UPDATE rounds
+    SET paused = FALSE, resume_at = $1, end_at = $2
+    WHERE session_id = $3 AND round = $4
+""")
+
+PAUSE_ROUND = NamedQuery("pause_round", """
+    UPDATE rounds
+    SET paused = TRUE, pause_at = $1
+    WHERE session_id = $2 AND round = $3
+""")
+
+# Round state store (app/round_state.py, ROUND_STATE_STORE=postgres)
+ROUND_STATE = NamedQuery("round_state", """
+    SELECT state, state_start_at, state_end_at FROM rounds
+    WHERE session_id = $1 AND round = $2
+""")
+
+# Upsert: the rounds row for a brand-new round may still be in the write-behind queue
+SET_ROUND_STATE = NamedQuery("set_round_state", """
+    INSERT INTO rounds (session_id, round, started, ended, state, state_start_at, state_end_at)
+    VALUES ($1, $2, FALSE, FALSE, $3, $4, $5)
+    ON CONFLICT (session_id, round) DO UPDATE
+    SET state = EXCLUDED.state, state_start_at = EXCLUDED.state_start_at, state_end_at = EXCLUDED.state_end_at
+""")
+
+# Compare-and-set: $4 = expected states, $5 = whether "no state yet" is expected too
+TRANSITION_ROUND_STATE = NamedQuery("transition_round_state", """
+    WITH moved AS (
+        UPDATE rounds SET state = $3
+        WHERE session_id = $1 AND round = $2
+          AND (state = ANY($4::text[]) OR (state IS NULL AND $5))
+        RETURNING 1
+    )
+    SELECT COUNT(*) AS moved FROM moved
+""")
+
+# Write-behind statements queued by GameState (app/game_state.py)
+INSERT_SUBMISSION = NamedQuery("insert_submission", """
+    INSERT INTO gif_urls (session_id, user_id, gif_url, round, is_n)
+    VALUES ($1, $2, $3, $4, $5)
+    ON CONFLICT (session_id, user_id, round) DO NOTHING
+""")
+
+INSERT_NULL_SUBMISSIONS = NamedQuery("insert_null_submissions", """
+    INSERT INTO gif_urls (session_id, user_id, gif_url, round, is_n)
+    SELECT $1, u.user_id, NULL, $2, TRUE
+    FROM unnest($3::int[]) AS u(user_id)
+    ON CONFLICT (session_id, user_id, round) DO NOTHING
+""")
+
+INSERT_VOTE = NamedQuery("insert_vote", """
+    INSERT INTO votes (session_id, round, user_id, voted_for_user_id)
+    VALUES ($1, $2, $3, $4)
+    ON CONFLICT (session_id, user_id, round) DO NOTHING
+""")
+
+# Points only for the votes the INSERT actually added, so a replayed batch scores nothing
+INSERT_AUTO_VOTES = NamedQuery("insert_auto_votes", """
+    WITH inserted AS (
+        INSERT INTO votes (session_id, round, user_id, voted_for_user_id)
+        SELECT $1, $2, v.user_id, v.voted_for_user_id
+        FROM unnest($3::int[], $4::int[]) AS v(user_id, voted_for_user_id)
+        ON CONFLICT (session_id, user_id, round) DO NOTHING
+        RETURNING voted_for_user_id
+    )
+    UPDATE user_scores
+    SET score = score + 1
+    WHERE session_id = $1 AND user_id IN (SELECT voted_for_user_id FROM inserted)
+""")
+
+AWARD_POINTS = NamedQuery("award_points", """
+    UPDATE user_scores
+    SET score = score + 1
+    WHERE session_id = $1 AND user_id = ANY($2::int[])
+""")
+
+END_ROUND = NamedQuery("end_round", """
+    UPDATE rounds SET ended = TRUE, paused = FALSE WHERE session_id = $1 AND round = $2
+""")
+
+OPEN_ROUND = NamedQuery("open_round", """
+    INSERT INTO rounds (session_id, round, started, ended)
+    VALUES ($1, $2, FALSE, FALSE)
+    ON CONFLICT (session_id, round) DO NOTHING
+""")
+
+INSERT_SENTENCE = NamedQuery("insert_sentence", """
+    INSERT INTO game_sentences (session_id, sentence) VALUES ($1, $2)
+""")
+
+FINISH_SESSION = NamedQuery("finish_session", """
+    UPDATE sessions SET active = FALSE WHERE id = $1
+""")
+
+MARK_WINNER = NamedQuery("mark_winner", """
+    UPDATE user_scores
+    SET winner = TRUE
+    WHERE session_id = $1 AND user_id = $2
+""")
+
+PAUSE_GAME = NamedQuery("pause_game", """
+    UPDATE game_started SET paused = TRUE WHERE session_id = $1
+""")
+
+RESET_ROUND = NamedQuery("reset_round", """
+    UPDATE rounds SET started = FALSE, paused = FALSE WHERE session_id = $1 AND round = $2
+""")
+
+DELETE_ROUND_SUBMISSIONS = NamedQuery("delete_round_submissions", """
+    DELETE FROM gif_urls WHERE session_id = $1 AND round = $2
+""")
+
+DELETE_ROUND_VOTES = NamedQuery("delete_round_votes", """
+    DELETE FROM votes WHERE session_id = $1 AND round = $2
+""")
+
+# Statement bank (app/statement_bank.py)
+# Copy up to $3 random bank statements the session hasn't used yet into game_sentences
+DRAW_STATEMENTS = NamedQuery("draw_statements", """
+    INSERT INTO game_sentences (session_id, sentence)
+    SELECT $1, picked.sentence
+    FROM (
+        SELECT sentence FROM statement_bank
+        WHERE category_key = $2
+          AND sentence NOT IN (SELECT sentence FROM game_sentences WHERE session_id = $1)
+        ORDER BY random()
+        LIMIT $3
+    ) AS picked
+    RETURNING sentence
+""")
+
+STATEMENT_BANK_COUNT = NamedQuery("statement_bank_count", """
+    SELECT COUNT(*) AS count FROM statement_bank WHERE category_key = $1
+""")
+
+# Broadcast backplane (app/backplane.py, BROADCAST_BACKPLANE=postgres)
+# Store a message too large for NOTIFY, prune expired ones and notify its id, in one round trip.
+# $1 = channel, $2 = publishing worker id, $3 = message, $4 = seconds a stored message is kept
+PUBLISH_BACKPLANE_REFERENCE = NamedQuery("publish_backplane_reference", """
+    WITH pruned AS (
+        DELETE FROM backplane_messages WHERE created_at < NOW() - make_interval(secs => $4)
+    ), stored AS (
+        INSERT INTO backplane_messages (payload) VALUES ($3)
+        RETURNING id
+    )
+    SELECT pg_notify($1, json_build_object('origin', $2::text, 'ref', id)::text) FROM stored
+""")
+
+BACKPLANE_MESSAGE = NamedQuery("backplane_message", """
+    SELECT payload FROM backplane_messages WHERE id = $1
+""")
@@ -0,0 +1,90 @@
+# app/rate_limit.py
+# In-memory token-bucket limiter for the auth routes.
+# Each key gets `burst` tokens that refill at `rate_per_minute`; an event spends one.
+# Every attempt spends from its client IP's bucket before any work is done. Failed logins
+# spend from a bucket per (username, IP): a password guesser is locked out of that account
+# from that address only, so nobody can lock a user out by failing logins in their name. Buckets live in a bounded LRU, so a flood of distinct keys can't
+# grow memory without limit. Per worker process, like the other in-memory caches.
+# Behind a reverse proxy (Render, nginx) request.client is the proxy, so every user would share
+# one IP bucket: set TRUSTED_PROXY_HOPS to the number of proxies that append to X-Forwarded-For.
+
+import os
+import time
+from collections import OrderedDict
+
+LOGIN_RATE_PER_MINUTE = float(os.getenv("LOGIN_RATE_PER_MINUTE", "10"))
+LOGIN_BURST = int(os.getenv("LOGIN_BURST", "5"))
+IP_RATE_PER_MINUTE = float(os.getenv("IP_RATE_PER_MINUTE", "60"))
+IP_BURST = int(os.getenv("IP_BURST", "20"))
+RATE_LIMIT_KEYS = int(os.getenv("RATE_LIMIT_KEYS", "10000"))
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+
+class TokenBucketLimiter:
+    def __init__(self, rate_per_minute: float, burst: int, max_keys: int = RATE_LIMIT_KEYS):
+        self.rate = rate_per_minute / 60  # tokens per second
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets: "OrderedDict[str, list]" = OrderedDict()  # key => [tokens, last refill]
+        self.rejected = 0
+
+    def refill(self, key: str) -> list:
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [float(self.burst), now]
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        return bucket
+
+    def allow(self, key: str) -> bool:
+        bucket = self.refill(key)
+        if bucket[0] < 1:
+            self.rejected += 1
+            return False
+        bucket[0] -= 1
+        return True
+
+    def exhausted(self, key: str) -> bool:
+        # Like allow() without spending a token; keys never charged are never exhausted
+        if key not in self.buckets or self.refill(key)[0] >= 1:
+            return False
+        self.rejected += 1
+        return True
+
+failed_login_limiter = TokenBucketLimiter(LOGIN_RATE_PER_MINUTE, LOGIN_BURST)
+ip_limiter = TokenBucketLimiter(IP_RATE_PER_MINUTE, IP_BURST)
+
+def client_ip(request) -> str | None:
+    # The address the nearest untrusted hop connected from. Entries left of the trusted proxies
+    # in X-Forwarded-For are supplied by the client and can't be relied on.
+    if TRUSTED_PROXY_HOPS > 0:
+        forwarded = [part.strip() for part in request.headers.get("x-forwarded-for", "").split(",") if part.strip()]
+        if forwarded:
+            return forwarded[-min(TRUSTED_PROXY_HOPS, len(forwarded))]
+    return request.client.host if request.client else None
+
+def failed_login_key(username: str, ip: str | None) -> str:
+    return f"{(username or '').strip().lower()}|{ip or 'unknown'}"
+
+def allow_auth_attempt(ip: str | None) -> bool:
+    return ip_limiter.allow(ip or "unknown")
+
+def allow_login_attempt(username: str, ip: str | None) -> bool:
+    # The IP bucket is spent on every attempt; the account is only blocked for this IP once
+    # it has used up its failed logins
+    return allow_auth_attempt(ip) and not failed_login_limiter.exhausted(failed_login_key(username, ip))
+
+def record_failed_login(username: str, ip: str | None):
+    failed_login_limiter.allow(failed_login_key(username, ip))
+
+def get_rate_limit_stats() -> dict:
+    return {
+        "failed_login_rejected": failed_login_limiter.rejected,
+        "ip_rejected": ip_limiter.rejected,
+        "tracked_failed_logins": len(failed_login_limiter.buckets),
+        "tracked_ips": len(ip_limiter.buckets),
+    }
@@ -0,0 +1,105 @@
+# app/round_state.py
+# Where each round's state ("idle" | "new_round" | "started" | "paused" | "voting" | "results" | "ended" | "game_over")
+# and its display timestamps live. The in-memory store is per process and lost on restart;
+# the Postgres store keeps them on the rounds row, so a restart picks up where it left off.
+# Only this flag is stored there: scores, submissions and votes stay in the worker's GameState
+# (app/game_state.py). transition() is a compare-and-set, so two racing requests can't both
+# move a round out of the same state.
+
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+from app.db import fetchrow, execute
+from app.queries import CURRENT_ROUND, ROUND_STATE, SET_ROUND_STATE, TRANSITION_ROUND_STATE
+
+ROUND_STATE_STORE = os.getenv("ROUND_STATE_STORE", "memory")  # "memory" | "postgres"
+
+# States a round can be in while players are still submitting / voting (None = nothing recorded yet)
+SUBMITTING_STATES = (None, "idle", "new_round", "started", "paused")
+VOTING_STATES = SUBMITTING_STATES + ("voting",)
+
+class RoundStateStore(ABC):
+    # A store missing one of these fails when it is constructed, not on its first call
+    @abstractmethod
+    async def get(self, session_id: int, round: int) -> Optional[dict]:
+        # {"state", "start_at", "end_at"} or None if nothing was ever recorded for the round
+        ...
+
+    @abstractmethod
+    async def set(self, session_id: int, round: int, state: str, start_at: Optional[datetime] = None, end_at: Optional[datetime] = None):
+        ...
+
+    @abstractmethod
+    async def transition(self, session_id: int, round: int, expected: Iterable[Optional[str]], state: str) -> bool:
+        # Move to `state` only if the current state is one of `expected` (None = no state yet).
+        # Timestamps are kept. Returns whether this caller made the transition.
+        ...
+
+class InMemoryRoundStateStore(RoundStateStore):
+    def __init__(self):
+        self.flags: Dict[Tuple[int, int], dict] = {}
+
+    async def get(self, session_id, round):
+        flag = self.flags.get((session_id, round))
+        return dict(flag) if flag else None
+
+    async def set(self, session_id, round, state, start_at=None, end_at=None):
+        self.flags[(session_id, round)] = {"state": state, "start_at": start_at, "end_at": end_at}
+
+    async def transition(self, session_id, round, expected, state):
+        flag = self.flags.get((session_id, round))
+        current = flag["state"] if flag else None
+        if current not in set(expected):
+            return False
+        if flag:
+            flag["state"] = state
+        else:
+            self.flags[(session_id, round)] = {"state": state, "start_at": None, "end_at": None}
+        return True
+
+class PostgresRoundStateStore(RoundStateStore):
+    # The state columns on rounds are added by app/migrations/0002_round_state_columns.sql
+    async def get(self, session_id, round):
+        row = await fetchrow(ROUND_STATE, session_id, round)
+        if not row or row["state"] is None:
+            return None
+        return {"state": row["state"], "start_at": row["state_start_at"], "end_at": row["state_end_at"]}
+
+    async def set(self, session_id, round, state, start_at=None, end_at=None):
+        await execute(SET_ROUND_STATE, session_id, round, state, start_at, end_at)
+
+    async def transition(self, session_id, round, expected, state):
+        expected = list(expected)
+        row = await fetchrow(TRANSITION_ROUND_STATE, session_id, round, state, [s for s in expected if s is not None], None in expected)
+        return row["moved"] > 0
+
+def create_round_state_store() -> RoundStateStore:
+    if ROUND_STATE_STORE == "postgres":
+        return PostgresRoundStateStore()
+    return InMemoryRoundStateStore()
+
+round_states = create_round_state_store()
+
+async def resolve_current_round(state) -> dict:
+    # Current round of a loaded GameState with its state and timestamps:
+    # {"round", "state", "start_at", "end_at"}. Unrecorded rounds fall back to the derived state.
+    round = state.current_round
+    flag = await round_states.get(state.session_id, round)
+    if flag is None:
+        flag = {"state": state.derived_round_state(), "start_at": None, "end_at": None}
+    return {"round": round, **flag}
+
+async def fetch_current_round(session_id: int) -> Optional[dict]:
+    # Same answer straight from the database in one round trip, for callers without a GameState
+    row = await fetchrow(CURRENT_ROUND, session_id)
+    if not row:
+        return None
+    flag = None
+    if ROUND_STATE_STORE == "postgres" and row["state"] is not None:
+        flag = {"state": row["state"], "start_at": row["state_start_at"], "end_at": row["state_end_at"]}
+    elif ROUND_STATE_STORE != "postgres":
+        flag = await round_states.get(session_id, row["round"])
+    if flag is None:
+        flag = {"state": "idle" if not row["ended"] else "ended", "start_at": None, "end_at": None}
+    return {"round": row["round"], **flag}
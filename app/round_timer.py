@@ -0,0 +1,99 @@
+# app/round_timer.py
+# Server-side round deadlines.
+# One asyncio task per worker sleeps until the earliest deadline in a heap and then expires
+# that round (auto-submits a null GIF for everyone who hasn't submitted and moves the round
+# on to voting / results), so expiry no longer depends on every browser's own timer firing.
+# Rescheduling or cancelling a round just replaces its entry; stale heap entries are
+# skipped when they come up.
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from app.db import fetch
+from app.round_state import SUBMITTING_STATES
+from app.rounds import expire_round
+
+logger = logging.getLogger("round_timer")
+
+ROUND_EXPIRY_GRACE = float(os.getenv("ROUND_EXPIRY_GRACE", "1"))  # seconds after end_at for last-moment submissions
+
+_heap: List[Tuple[float, int, Tuple[int, int]]] = []  # (deadline, seq, (session_id, round))
+_deadlines: Dict[Tuple[int, int], int] = {}  # (session_id, round) => seq of the live entry
+_seq = itertools.count()
+_wakeup = asyncio.Event()
+_task: Optional[asyncio.Task] = None
+
+def schedule(session_id: int, round: int, end_at: datetime):
+    key = (session_id, round)
+    seq = next(_seq)
+    _deadlines[key] = seq
+    heapq.heappush(_heap, (end_at.timestamp() + ROUND_EXPIRY_GRACE, seq, key))
+    _wakeup.set()
+
+def cancel(session_id: int, round: int):
+    _deadlines.pop((session_id, round), None)
+
+async def _run():
+    while True:
+        # Drop entries that were cancelled or rescheduled
+        while _heap and _deadlines.get(_heap[0][2]) != _heap[0][1]:
+            heapq.heappop(_heap)
+
+        _wakeup.clear()
+        if not _heap:
+            await _wakeup.wait()
+            continue
+
+        delay = _heap[0][0] - time.time()
+        if delay > 0:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        _, seq, key = heapq.heappop(_heap)
+        if _deadlines.get(key) == seq:
+            del _deadlines[key]
+            asyncio.create_task(_expire(*key))
+
+async def _expire(session_id: int, round: int):
+    try:
+        await expire_round(session_id, round)
+    except Exception as e:
+        logger.error(f"Expiring round {round} of session {session_id} failed: {e}")
+
+async def restore():
+    # Re-arm rounds that were still collecting GIFs when the worker (re)started: the session is
+    # still active, the round hasn't moved past submitting (no recorded state beyond it, no votes)
+    # and not every player has submitted yet. Anything else was already finalized.
+    rows = await fetch("""
+        SELECT r.session_id, r.round, r.end_at FROM rounds r
+        JOIN sessions s ON s.id = r.session_id AND s.active = TRUE
+        WHERE r.started = TRUE AND r.ended IS DISTINCT FROM TRUE
+          AND r.paused IS DISTINCT FROM TRUE AND r.end_at IS NOT NULL
+          AND (r.state IS NULL OR r.state = ANY($1::text[]))
+          AND NOT EXISTS (SELECT 1 FROM votes v WHERE v.session_id = r.session_id AND v.round = r.round)
+          AND (SELECT COUNT(*) FROM gif_urls g WHERE g.session_id = r.session_id AND g.round = r.round)
+            < (SELECT COUNT(*) FROM session_users su WHERE su.session_id = r.session_id)
+    """, [s for s in SUBMITTING_STATES if s is not None])
+    for row in rows:
+        schedule(row["session_id"], row["round"], row["end_at"])
+    if rows:
+        logger.info(f"Restored {len(rows)} round timers")
+
+def start():
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_run())
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        _task = None
@@ -0,0 +1,86 @@
+# app/rounds.py
+# Round lifecycle steps shared by the route handlers.
+# finalize_round closes the submission phase once every player has a GIF in (real or null).
+# It is idempotent: the round-state compare-and-set lets exactly one caller do the
+# auto-votes / points and send the broadcast, however many submissions land at once, and the
+# points are tied to the auto-votes actually inserted, so a replay after a restart scores nothing.
+# expire_round is what the round timer (app/round_timer.py) calls at a round's deadline.
+
+from typing import Optional
+from app.game_state import get_game_state
+from app.round_state import round_states, SUBMITTING_STATES
+from app.routes.websock import broadcast
+
+async def finalize_round(session_id: int, round: int) -> Optional[dict]:
+    # Returns {"state", "round_results", "round_winners"} for the caller that finalized, else None
+    state = await get_game_state(session_id)
+    if state is None:
+        return None
+
+    submissions = state.round_submissions(round)
+    if len(submissions) < len(state.players):
+        return None
+
+    non_null_submissions = [r for r in submissions if not r["is_null"]]
+    next_state = "voting" if len(non_null_submissions) > 1 else "results"
+    if not await round_states.transition(session_id, round, SUBMITTING_STATES, next_state):
+        return None
+
+    user_ids = [r["user_id"] for r in submissions]
+    round_results = []
+    round_winners = []
+
+    if len(non_null_submissions) == 1:
+        # Only one real gif → everyone votes for it and that player gets the point
+        sole = non_null_submissions[0]
+        state.add_auto_votes(round, [(uid, sole["user_id"]) for uid in user_ids])
+        round_results = [{"username": sole["username"], "votes": len(user_ids)}]
+        round_winners = [sole["username"]]
+
+    elif len(non_null_submissions) == 0:
+        # Nobody found a gif → everyone votes for themselves and scores
+        state.add_auto_votes(round, [(uid, uid) for uid in user_ids])
+        round_winners = [r["username"] for r in submissions]
+        round_results = [{"username": u, "votes": 1} for u in round_winners]
+
+    state.commit()
+
+    if next_state == "results":
+        await broadcast(f"session_{session_id}", {
+            "type": "results",
+            "round_winners": round_winners,
+            "round_results": round_results
+        })
+    else:
+        await broadcast(f"session_{session_id}", {
+            "type": "start_voting",
+            "round": round
+        })
+
+    return {"state": next_state, "round_results": round_results, "round_winners": round_winners}
+
+async def expire_round(session_id: int, round: int):
+    # Time's up: a null GIF for everyone still searching, then close the submission phase
+    flag = await round_states.get(session_id, round)
+    if flag and flag["state"] != "started":
+        return
+
+    state = await get_game_state(session_id)
+    if state is None or not state.active or state.rounds.get(round) is not False:
+        return
+    if flag is None and (state.votes_cast(round) or len(state.round_submissions(round)) >= len(state.players)):
+        # No recorded state (e.g. the in-memory store after a restart): a round with votes, or
+        # with every GIF in, already left the submission phase
+        return
+
+    if state.auto_submit(round):
+        state.commit()
+        await broadcast(f"session_{session_id}", {
+            "type": "gif_submissions",
+            "submissions": [
+                {"username": r["username"], "gif_url": r["gif_url"], "is_null": r["is_null"]}
+                for r in state.round_submissions(round) if not r["is_null"]
+            ]
+        })
+
+    await finalize_round(session_id, round)
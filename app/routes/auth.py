@@ -1,7 +1,12 @@
-from fastapi import APIRouter, Form, Request, HTTPException
+from fastapi import APIRouter, Form, Request
 from fastapi.responses import RedirectResponse
-from app.db import connect_db, fetchrow, fetch, execute
-from app.auth_utils import hash_password, verify_password, create_session_cookie, get_current_user, is_password_complex
+from app.db import fetchrow
+from app.queries import USER_CREDENTIALS, CREATE_USER
+from app.rate_limit import allow_auth_attempt, allow_login_attempt, record_failed_login, client_ip
+from app.auth_utils import (
+    hash_password_async, verify_password_async, HashingOverloaded,
+    create_session_cookie, get_current_user, is_password_complex, remember_identity, SESSION_MAX_AGE
+)
 from fastapi.templating import Jinja2Templates
 import traceback
 
@@ -17,16 +22,34 @@ async def login_get(request: Request):
 
 @router.post("/login")
 async def login_post(request: Request, username: str = Form(...), password: str = Form(...)):
+    # Throttled before any database or bcrypt work
+    ip = client_ip(request)
+    if not allow_login_attempt(username, ip):
+        return templates.TemplateResponse(
+            "login.html",
+            {"request": request, "user": None, "error": "Too many attempts, please wait a minute and try again."},
+            status_code=429
+        )
+
     try:
-        user_row = await fetchrow("SELECT * FROM users WHERE username = $1", username)
+        user_row = await fetchrow(USER_CREDENTIALS, username)
 
-        if not user_row or not verify_password(password, user_row["hash"]):
+        if not user_row or not await verify_password_async(password, user_row["hash"]):
+            record_failed_login(username, ip)
             raise ValueError("Invalid credentials")
 
+        remember_identity(username, user_row["id"])
         response = RedirectResponse("/", status_code=302)
-        response.set_cookie("session", create_session_cookie(username))
+        response.set_cookie("session", create_session_cookie(username, user_row["id"]), max_age=SESSION_MAX_AGE)
         return response
 
+    except HashingOverloaded:
+        return templates.TemplateResponse(
+            "login.html",
+            {"request": request, "user": None, "error": "Too many sign-ins right now, please try again in a moment."},
+            status_code=503
+        )
+
     except Exception as e:
         print("\n[LOGIN ERROR]")
         traceback.print_exc()
@@ -64,19 +87,33 @@ async def register_post(request: Request, username: str = Form(...), password: s
             }
         )
 
-    existing = await fetchrow("SELECT * FROM users WHERE username = $1", username)
+    if not allow_auth_attempt(client_ip(request)):
+        return templates.TemplateResponse(
+            "register.html",
+            {"request": request, "user": None, "error": "Too many attempts, please wait a minute and try again."},
+            status_code=429
+        )
 
-    if existing:
+    try:
+        hashed = await hash_password_async(password)
+    except HashingOverloaded:
+        return templates.TemplateResponse(
+            "register.html",
+            {"request": request, "user": None, "error": "Too many sign-ups right now, please try again in a moment."},
+            status_code=503
+        )
+    # Existence check and insert in one statement (no race between two sign-ups for the same name)
+    inserted = await fetchrow(CREATE_USER, username, hashed)
+    if not inserted:
         return templates.TemplateResponse(
             "register.html",
             {"request": request, "user": None, "error": "User already exists"}
         )
+    user_id = inserted["id"]
 
-    hashed = hash_password(password)
-    await execute("INSERT INTO users (username, hash) VALUES ($1, $2)", username, hashed)
-
+    remember_identity(username, user_id)
     response = RedirectResponse("/", status_code=302)
-    response.set_cookie("session", create_session_cookie(username))
+    response.set_cookie("session", create_session_cookie(username, user_id), max_age=SESSION_MAX_AGE)
     return response
 
 @router.get("/logout")
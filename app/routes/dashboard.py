@@ -1,52 +1,50 @@
-import os
 from fastapi import APIRouter, Request, Depends, Form, HTTPException, Query
 from fastapi.responses import RedirectResponse, JSONResponse, Response
 from urllib.parse import urlencode
 from asyncio import gather
-from openai import OpenAI
-import httpx
-from dotenv import load_dotenv
 from collections import defaultdict
 from datetime import datetime, timedelta, timezone
-from app.auth_utils import get_current_user, auth_required, split_sentences
+from app.auth_utils import get_current_user, auth_required, Principal
 from fastapi.templating import Jinja2Templates
-from app.db import fetchrow, fetch, execute
-from app.routes.websock import broadcast, broadcast_presence, presence_by_room, round_flags, everyone_ready
+from app.db import fetchrow, fetch, execute, transaction
+from app.queries import (
+    ACTIVE_SESSIONS,
+    GAME_STARTED_BY_SESSION,
+    PAUSE_ROUND,
+    RESUME_ROUND,
+    ROUND_BY_NUMBER,
+    SESSION_BY_ID,
+    SESSION_PLAYERS,
+    SESSION_PLAYER_COUNT,
+    SESSION_TIME_PER_QUESTION,
+    START_ROUND,
+    USER_ACTIVE_SESSION,
+    USER_ACTIVE_SESSION_AND_MEMBERSHIP,
+    USER_IN_ACTIVE_SESSION,
+)
+from app.routes.websock import broadcast, broadcast_presence, presence_by_room, everyone_ready
+from app.game_state import get_game_state, invalidate_game_state
+from app.round_state import round_states, resolve_current_round, fetch_current_round, VOTING_STATES
+from app.rounds import finalize_round
+from app import round_timer
+from app import statement_bank, giphy, search_suggest
 
 
 router = APIRouter()
 
 templates = Jinja2Templates(directory="app/templates")
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-GIPHY_API_KEY = os.getenv("GIPHY_API_KEY")
-
-client = OpenAI(api_key=OPENAI_API_KEY)
 
 @router.get("/ping-time")
 async def ping_time():
     return {"server_time": datetime.now(timezone.utc).isoformat()}
 
 @router.get("/")
-async def dashboard(request: Request, user: str = Depends(auth_required)):
+async def dashboard(request: Request, principal: Principal = Depends(auth_required)):
+    user = principal.username
     # Get user id from users table
     error_message = request.query_params.get("error")
-    row = await fetchrow("""
-        SELECT 
-            s.*, 
-            u2.username AS host_username,
-            (
-                SELECT COUNT(*) 
-                FROM session_users 
-                WHERE session_id = s.id
-            ) AS user_count
-        FROM sessions s
-        JOIN session_users su ON su.session_id = s.id
-        JOIN users u ON u.id = su.user_id
-        JOIN users u2 ON u2.id = s.host_id
-        WHERE u.username = $1 AND s.active = TRUE
-        LIMIT 1
-    """, user)
+    row = await fetchrow(USER_ACTIVE_SESSION, user)
 
     if not row:
         return templates.TemplateResponse("dashboard.html", {
@@ -64,26 +62,11 @@ async def dashboard(request: Request, user: str = Depends(auth_required)):
     })
 
 @router.get("/sessions")
-async def sessions(request: Request, user: str = Depends(auth_required)):
+async def sessions(request: Request, principal: Principal = Depends(auth_required)):
+    user_id, user = principal
     error_message = request.query_params.get("error")
 
-    # Get user id from users table
-    user_id_row = await fetchrow("SELECT id FROM users WHERE username = $1", user)
-    user_id = user_id_row["id"]
-
-    session_rows = await fetch("""
-        SELECT
-            s.*,
-            u.username AS host_username,
-            COUNT(su.user_id) AS user_count,
-            BOOL_OR(su.user_id = $1) AS user_in
-        FROM sessions s
-        LEFT JOIN session_users su ON su.session_id = s.id
-        LEFT JOIN users u ON u.id = s.host_id
-        WHERE s.active = TRUE
-        GROUP BY s.id, u.username
-        ORDER BY s.id DESC
-    """, user_id)
+    session_rows = await fetch(ACTIVE_SESSIONS, user_id)
 
     sessions = [dict(row) for row in session_rows]
 
@@ -95,18 +78,20 @@ async def sessions(request: Request, user: str = Depends(auth_required)):
     })
 
 @router.get("/create-session")
-async def create_session(request: Request, user: str = Depends(auth_required)):
+async def create_session(request: Request, principal: Principal = Depends(auth_required)):
+    user = principal.username
     return templates.TemplateResponse("create_session.html", {"request": request, "user": user})
 
 @router.post("/create-session")
 async def create_session_post(
     request: Request, 
-    user: str = Depends(auth_required), 
+    principal: Principal = Depends(auth_required), 
     category: str = Form(...), 
     players: int = Form(...), 
     time_per_question: int = Form(...),
     points_to_win: int = Form(...)
 ):
+    user_id, user = principal
     players = int(players)
     # Input validation
     if not category or players < 3 or players > 8 or time_per_question < 5 or time_per_question > 60 or points_to_win < 1 or points_to_win > 10:
@@ -116,18 +101,8 @@ async def create_session_post(
             "error": "Invalid game session parameters"
         }, status_code=400)
     try:
-        # ✅ Fetch user_id AND check if they're in an active session concurrently
-        user_id_row, user_in_active_session = await gather(
-            fetchrow("SELECT id FROM users WHERE username = $1", user),
-            fetchrow("""
-                SELECT 1 FROM session_users
-                JOIN sessions ON session_users.session_id = sessions.id
-                WHERE session_users.user_id = (SELECT id FROM users WHERE username = $1)
-                AND sessions.active = TRUE
-            """, user)
-        )
-
-        user_id = user_id_row["id"]
+        # ✅ Check if they're already in an active session
+        user_in_active_session = await fetchrow(USER_IN_ACTIVE_SESSION, user_id)
 
         if user_in_active_session:
             return templates.TemplateResponse("create_session.html", {
@@ -136,26 +111,27 @@ async def create_session_post(
                 "error": "You are already in an active game session and cannot create a new one"
             }, status_code=400)
 
-        # ✅ Do inserts in a chain — session → users → rounds
-        session_result = await execute("""
-            INSERT INTO sessions (category, players, time_per_question, points_to_win, host_id, active)
-            VALUES ($1, $2, $3, $4, $5, TRUE)
-            RETURNING id
-        """, category, players, time_per_question, points_to_win, user_id)
+        # ✅ Session, host membership and host score are written in one transaction
+        async with transaction() as tx:
+            session_result = await tx.execute("""
+                INSERT INTO sessions (category, players, time_per_question, points_to_win, host_id, active)
+                VALUES ($1, $2, $3, $4, $5, TRUE)
+                RETURNING id
+            """, category, players, time_per_question, points_to_win, user_id)
 
-        session_id = session_result[0]["id"]
+            session_id = session_result[0]["id"]
 
-        # ✅ Insert host as player and insert a score for the host
-        await gather(
-            execute("""
+            await tx.execute("""
                 INSERT INTO session_users (session_id, user_id, is_host)
                 VALUES ($1, $2, TRUE)
-            """, session_id, user_id),
-            execute("""
+            """, session_id, user_id)
+            await tx.execute("""
                 INSERT INTO user_scores (session_id, user_id, score)
                 VALUES ($1, $2, 0)
             """, session_id, user_id)
-        )
+
+        # Warm the statement bank while the lobby fills up
+        statement_bank.request_refill(category)
 
         # ✅ Broadcast only after the inserts complete
         await broadcast("sessions", {
@@ -182,40 +158,28 @@ async def create_session_post(
         }, status_code=500)
 
 @router.post("/join/{session_id}")
-async def join_session(session_id: int, request: Request, user: str = Depends(auth_required)):
-    # Fetch user ID, session existence, and any active session concurrently
-    session_details, user_id_row, active_session_row, user_in_session_row, current_count_row = await gather(
-        fetchrow("SELECT * FROM sessions WHERE id = $1", session_id),
-        fetchrow("SELECT id FROM users WHERE username = $1", user),
-        fetchrow("""
-            SELECT session_users.session_id
-            FROM session_users
-            JOIN sessions ON session_users.session_id = sessions.id
-            WHERE session_users.user_id = (SELECT id FROM users WHERE username = $1)
-              AND sessions.active = TRUE
-        """, user),
-        fetchrow("""
-            SELECT 1 AS user_in_session FROM session_users WHERE session_id = $1 AND user_id = (SELECT id FROM users WHERE username = $2)
-        """, session_id, user),
-        fetchrow("""
-            SELECT COUNT(*) AS count FROM session_users WHERE session_id = $1
-        """, session_id)
+async def join_session(session_id: int, request: Request, principal: Principal = Depends(auth_required)):
+    user_id, user = principal
+    # Session, the user's active session and membership, and player count concurrently
+    session_details, membership, current_count_row = await gather(
+        fetchrow(SESSION_BY_ID, session_id),
+        fetchrow(USER_ACTIVE_SESSION_AND_MEMBERSHIP, user_id, session_id),
+        fetchrow(SESSION_PLAYER_COUNT, session_id)
     )
+    active_session_id = membership["active_session_id"]
 
     if not session_details:
         return RedirectResponse(
             url=f"/sessions?{urlencode({'error': 'Session not found'})}", status_code=303
         )
 
-    user_id = user_id_row["id"]
-
     # Block joining if user is in another active session
-    if active_session_row and active_session_row["session_id"] != session_id:
+    if active_session_id and active_session_id != session_id:
         return RedirectResponse(
             url=f"/sessions?{urlencode({'error': 'You are already in another active session'})}", status_code=303
         )
 
-    if not user_in_session_row:
+    if not membership["user_in_session"]:
         # Check current player count
         current_count = current_count_row["count"]
 
@@ -226,25 +190,20 @@ async def join_session(session_id: int, request: Request, user: str = Depends(au
             )
 
         try:
-            # Add user to the session
-            await gather(
-                execute("""
+            # Add user to the session and read back the player list on the same connection
+            async with transaction() as tx:
+                await tx.execute("""
                     INSERT INTO session_users (session_id, user_id) VALUES ($1, $2)
-                """, session_id, user_id),
-                execute("""
+                """, session_id, user_id)
+                await tx.execute("""
                     INSERT INTO user_scores (session_id, user_id, score)
                     VALUES ($1, $2, 0)
                     ON CONFLICT (session_id, user_id) DO UPDATE SET score = 0
                 """, session_id, user_id)
-            )
 
-            # Get updated player list
-            updated_players_rows = await fetch("""
-                SELECT users.username, session_users.is_host
-                FROM session_users
-                JOIN users ON users.id = session_users.user_id
-                WHERE session_users.session_id = $1
-            """, session_id)
+                updated_players_rows = await tx.fetch(SESSION_PLAYERS, session_id)
+
+            await invalidate_game_state(session_id)
 
             player_dicts = [
                 {"username": row["username"], "is_host": row["is_host"]}
@@ -278,16 +237,12 @@ async def join_session(session_id: int, request: Request, user: str = Depends(au
     return RedirectResponse(url=f"/waiting-area/{session_id}", status_code=302)
 
 @router.get("/waiting-area/{session_id}")
-async def waiting_area(session_id: int, request: Request, user: str = Depends(auth_required)):
+async def waiting_area(session_id: int, request: Request, principal: Principal = Depends(auth_required)):
+    user = principal.username
     session_row, user_rows, game_started = await gather(
-        fetchrow("SELECT * FROM sessions WHERE id = $1", session_id),
-        fetch("""
-            SELECT users.username, session_users.is_host
-            FROM session_users
-            JOIN users ON session_users.user_id = users.id
-            WHERE session_users.session_id = $1
-        """, session_id),
-        fetchrow("SELECT * FROM game_started WHERE session_id = $1", session_id)
+        fetchrow(SESSION_BY_ID, session_id),
+        fetch(SESSION_PLAYERS, session_id),
+        fetchrow(GAME_STARTED_BY_SESSION, session_id)
     )
 
     if not session_row:
@@ -319,36 +274,26 @@ async def waiting_area(session_id: int, request: Request, user: str = Depends(au
     })
 
 @router.post("/leave/{session_id}")
-async def leave_session(session_id: int, request: Request, user: str = Depends(auth_required)):
+async def leave_session(session_id: int, request: Request, principal: Principal = Depends(auth_required)):
+    user_id, user = principal
     form = await request.form()
     next_url = form.get("next") or "/sessions"
 
-    # Get session and user_id concurrently
-    user_row, session_row = await gather(
-        fetchrow("SELECT id FROM users WHERE username = $1", user),
-        fetchrow("SELECT * FROM sessions WHERE id = $1", session_id)
-    )
+    session_row = await fetchrow(SESSION_BY_ID, session_id)
 
     if not session_row:
         params = urlencode({"error": "Session not found or already deleted"})
         return RedirectResponse(url=f"{next_url}?{params}", status_code=303)
 
-    user_id = user_row["id"]
-
     try:
-        # Remove user from session
-        await gather(
-            execute("DELETE FROM session_users WHERE session_id = $1 AND user_id = $2",session_id, user_id),
-            execute("DELETE FROM user_scores WHERE session_id = $1 and user_id = $2", session_id, user_id)
-        )
+        # Remove user from session and fetch the remaining players in one transaction
+        async with transaction() as tx:
+            await tx.execute("DELETE FROM session_users WHERE session_id = $1 AND user_id = $2", session_id, user_id)
+            await tx.execute("DELETE FROM user_scores WHERE session_id = $1 and user_id = $2", session_id, user_id)
 
-        # Fetch updated players
-        updated_players = await fetch("""
-            SELECT users.username, session_users.is_host
-            FROM session_users
-            JOIN users ON users.id = session_users.user_id
-            WHERE session_users.session_id = $1
-        """, session_id)
+            updated_players = await tx.fetch(SESSION_PLAYERS, session_id)
+
+        await invalidate_game_state(session_id)
 
         player_dicts = [
             {"username": row["username"], "is_host": row["is_host"]}
@@ -381,21 +326,16 @@ async def leave_session(session_id: int, request: Request, user: str = Depends(a
         return RedirectResponse(url=f"{next_url}?{params}", status_code=303)
     
 @router.post("/delete/{session_id}")
-async def delete_session(session_id: int, request: Request, user: str = Depends(auth_required)):
+async def delete_session(session_id: int, request: Request, principal: Principal = Depends(auth_required)):
+    user_id, user = principal
     form = await request.form()
     next_url = form.get("next") or "/sessions"
 
-    # Fetch user_id and session concurrently
-    user_row, session = await gather(
-        fetchrow("SELECT id FROM users WHERE username = $1", user),
-        fetchrow("SELECT * FROM sessions WHERE id = $1", session_id)
-    )
+    session = await fetchrow(SESSION_BY_ID, session_id)
 
     if not session:
         params = urlencode({"error": "Session not found or already deleted"})
         return RedirectResponse(url=f"{next_url}?{params}", status_code=303)
-    
-    user_id = user_row["id"]
 
     if session["host_id"] != user_id:
         params = urlencode({"error": "Only the host can delete this session"})
@@ -403,18 +343,23 @@ async def delete_session(session_id: int, request: Request, user: str = Depends(
 
     try:
         # Check player count quickly
-        count_row = await fetchrow(
-            "SELECT COUNT(*) AS count FROM session_users WHERE session_id = $1", session_id
-        )
+        count_row = await fetchrow(SESSION_PLAYER_COUNT, session_id)
         if count_row["count"] > 1:
             params = urlencode({"error": "Cannot delete session with multiple users"})
             return RedirectResponse(url=f"{next_url}?{params}", status_code=303)
 
-        await execute("DELETE FROM game_sentences WHERE session_id = $1", session_id)
-        await execute("DELETE FROM session_users WHERE session_id = $1", session_id)
-        await execute("DELETE FROM rounds WHERE session_id = $1", session_id)
-        await execute("DELETE FROM sessions WHERE id = $1", session_id)
+        # All-or-nothing: a failure part way through must not leave orphaned rows
+        async with transaction() as tx:
+            await tx.execute("DELETE FROM votes WHERE session_id = $1", session_id)
+            await tx.execute("DELETE FROM gif_urls WHERE session_id = $1", session_id)
+            await tx.execute("DELETE FROM game_sentences WHERE session_id = $1", session_id)
+            await tx.execute("DELETE FROM game_started WHERE session_id = $1", session_id)
+            await tx.execute("DELETE FROM user_scores WHERE session_id = $1", session_id)
+            await tx.execute("DELETE FROM session_users WHERE session_id = $1", session_id)
+            await tx.execute("DELETE FROM rounds WHERE session_id = $1", session_id)
+            await tx.execute("DELETE FROM sessions WHERE id = $1", session_id)
 
+        await invalidate_game_state(session_id)
 
         await broadcast("sessions", {
             "type": "session_deleted",
@@ -430,29 +375,21 @@ async def delete_session(session_id: int, request: Request, user: str = Depends(
         return RedirectResponse(url=redirect_url, status_code=303)    
 
 @router.get("/host-lobby/{session_id}")
-async def host_lobby(session_id: int, request: Request, user: str = Depends(auth_required)):
+async def host_lobby(session_id: int, request: Request, principal: Principal = Depends(auth_required)):
+    user_id, user = principal
     error_message = request.query_params.get("error")
 
-    user_id_row, session_details, game_started = await gather(
-        fetchrow("SELECT id FROM users WHERE username = $1", user),
-        fetchrow("SELECT * FROM sessions WHERE id = $1", session_id),
-        fetchrow("SELECT * FROM game_started WHERE session_id = $1", session_id)
+    session_details, game_started = await gather(
+        fetchrow(SESSION_BY_ID, session_id),
+        fetchrow(GAME_STARTED_BY_SESSION, session_id)
     )
 
     if not session_details:
         params = urlencode({"error": "Session not found or already deleted"})
         return RedirectResponse(url=f"/sessions?{params}", status_code=303)
-    
-    user_id = user_id_row["id"]
-    
+
     # Combine active session and user_in_session check in one query
-    active_and_user_session = await fetchrow("""
-        SELECT 
-            (SELECT session_id FROM session_users 
-             JOIN sessions ON session_users.session_id = sessions.id
-             WHERE session_users.user_id = $1 AND sessions.active = TRUE LIMIT 1) AS active_session_id,
-            (SELECT 1 FROM session_users WHERE session_id = $2 AND user_id = $1 LIMIT 1) AS user_in_session
-    """, user_id, session_id)
+    active_and_user_session = await fetchrow(USER_ACTIVE_SESSION_AND_MEMBERSHIP, user_id, session_id)
 
     active_session_id = active_and_user_session["active_session_id"]
     user_in_session = active_and_user_session["user_in_session"]
@@ -468,12 +405,7 @@ async def host_lobby(session_id: int, request: Request, user: str = Depends(auth
         return RedirectResponse(url=f"/sessions?{params}", status_code=303)
 
     # Fetch users in the session
-    users_in_session = await fetch("""
-        SELECT users.username, session_users.is_host
-        FROM session_users
-        JOIN users ON session_users.user_id = users.id
-        WHERE session_users.session_id = $1
-    """, session_id)
+    users_in_session = await fetch(SESSION_PLAYERS, session_id)
 
     user_count = len(users_in_session)
 
@@ -502,7 +434,8 @@ async def host_lobby(session_id: int, request: Request, user: str = Depends(auth
     })
 
 @router.post("/submit-changes/{session_id}")
-async def submit_changes(session_id: int, request: Request, user: str = Depends(auth_required)):
+async def submit_changes(session_id: int, request: Request, principal: Principal = Depends(auth_required)):
+    user_id, user = principal
     form_data = await request.form()
 
     category = form_data.get("category")
@@ -510,10 +443,9 @@ async def submit_changes(session_id: int, request: Request, user: str = Depends(
     time_per_question = int(form_data.get("time_per_question"))
     points_to_win = int(form_data.get("points_to_win"))
 
-    user_row, session, user_count_row, sentence_check = await gather(
-        fetchrow("SELECT id FROM users WHERE username = $1", user),
-        fetchrow("SELECT * FROM sessions WHERE id = $1", session_id),
-        fetchrow("SELECT COUNT(*) AS count FROM session_users WHERE session_id = $1", session_id),
+    session, user_count_row, sentence_check = await gather(
+        fetchrow(SESSION_BY_ID, session_id),
+        fetchrow(SESSION_PLAYER_COUNT, session_id),
         fetchrow("SELECT COUNT(*) AS count FROM game_sentences WHERE session_id = $1", session_id)
     )
 
@@ -521,7 +453,6 @@ async def submit_changes(session_id: int, request: Request, user: str = Depends(
         params = urlencode({"error": "Session not found or already deleted"})
         return RedirectResponse(url=f"/sessions?{params}", status_code=303)
 
-    user_id = user_row["id"]
     if session["host_id"] != user_id:
         params = urlencode({"error": "Only the host can edit the session"})
         return RedirectResponse(url=f"/sessions?{params}", status_code=303)
@@ -551,6 +482,8 @@ async def submit_changes(session_id: int, request: Request, user: str = Depends(
         SET category = $1, players = $2, time_per_question = $3, points_to_win = $4
         WHERE id = $5
     """, category, players, time_per_question, points_to_win, session_id)
+    await invalidate_game_state(session_id)
+    statement_bank.request_refill(category)
 
     # Broadcast updates
     await gather(
@@ -575,10 +508,8 @@ async def submit_changes(session_id: int, request: Request, user: str = Depends(
     return RedirectResponse(url=f"/host-lobby/{session_id}", status_code=303)
 
 @router.get("/history")
-async def history(request: Request, user: str = Depends(auth_required)):
-    user_row = await fetchrow("SELECT id FROM users WHERE username = $1", user)
-    user_id = user_row["id"]
-
+async def history(request: Request, principal: Principal = Depends(auth_required)):
+    user_id, user = principal
     session_data = await fetch("""
         SELECT 
             s.*, 
@@ -635,10 +566,10 @@ async def history(request: Request, user: str = Depends(auth_required)):
     })
 
 @router.post("/start-game/{session_id}")
-async def start_game(session_id: int, user: str = Depends(auth_required)):
-    user_row, session, players = await gather(
-        fetchrow("SELECT id FROM users WHERE username = $1", user),
-        fetchrow("SELECT * FROM sessions WHERE id = $1", session_id),
+async def start_game(session_id: int, principal: Principal = Depends(auth_required)):
+    user_id, user = principal
+    session, players = await gather(
+        fetchrow(SESSION_BY_ID, session_id),
         fetch("""
             SELECT users.id AS user_id, users.username, session_users.is_host
             FROM session_users
@@ -650,7 +581,7 @@ async def start_game(session_id: int, user: str = Depends(auth_required)):
         params = urlencode({"error": "Session not found or already deleted"})
         return RedirectResponse(url=f"/sessions?{params}", status_code=303)
 
-    if session["host_id"] != user_row["id"]:
+    if session["host_id"] != user_id:
         params = urlencode({"error": "Only the host can start the game"})
         return RedirectResponse(url=f"/sessions?{params}", status_code=303)
 
@@ -674,20 +605,23 @@ async def start_game(session_id: int, user: str = Depends(auth_required)):
             }
         )
     
-    started_game = await fetchrow("SELECT * FROM game_started WHERE session_id = $1", session_id)
+    # Flush queued game writes so the reads below see current scores and rounds
+    await invalidate_game_state(session_id)
+    started_game = await fetchrow(GAME_STARTED_BY_SESSION, session_id)
     print(started_game)
 
     if not started_game:
         try:
-            await execute("DELETE FROM gif_urls WHERE session_id = $1", session_id)
-            await execute("DELETE FROM rounds WHERE session_id = $1", session_id)
+            async with transaction() as tx:
+                await tx.execute("DELETE FROM gif_urls WHERE session_id = $1", session_id)
+                await tx.execute("DELETE FROM rounds WHERE session_id = $1", session_id)
 
-            await execute("""
-                INSERT INTO game_started (session_id, started, paused)
-                VALUES ($1, TRUE, FALSE)
-            """, session_id)
+                await tx.execute("""
+                    INSERT INTO game_started (session_id, started, paused)
+                    VALUES ($1, TRUE, FALSE)
+                """, session_id)
 
-            await execute("INSERT INTO rounds (session_id, round) VALUES ($1, 1)", session_id)
+                await tx.execute("INSERT INTO rounds (session_id, round) VALUES ($1, 1)", session_id)
 
         except Exception as e:
             print("❌ Error during initial game start DB setup:", e)
@@ -696,13 +630,9 @@ async def start_game(session_id: int, user: str = Depends(auth_required)):
         current_round = 1
 
     elif started_game["paused"]:
-        # Game is paused — resume from last round
-        last_round = await fetchrow("""
-            SELECT round FROM rounds
-            WHERE session_id = $1 AND started = TRUE AND ended IS DISTINCT FROM TRUE
-            ORDER BY round DESC LIMIT 1
-        """, session_id)
-        current_round = last_round["round"] if last_round else 1
+        # Game is paused — resume from the current round
+        current = await fetch_current_round(session_id)
+        current_round = current["round"] if current else 1
 
         await execute("UPDATE game_started SET paused = FALSE WHERE session_id = $1", session_id)
 
@@ -739,30 +669,18 @@ async def start_game(session_id: int, user: str = Depends(auth_required)):
             need_to_generate = False
 
     if need_to_generate:
-        # Generate statements with OpenAI
+        # Draw from the statement bank; OpenAI is only called for what the bank can't cover
         try:
-            category = session["category"]
-            prompt = f"Give me {required} statements about {category} for a GIF reaction game."
-            completion = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are playing a GIF reaction game where users search for a GIF that best describes a statement."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-
-            response_text = completion.choices[0].message.content.strip()
-            sentences = split_sentences(response_text)
-            cleaned = [s.strip('. "').strip() for s in sentences if s.strip()]
-
-            await gather(*[
-                execute("INSERT INTO game_sentences (session_id, sentence) VALUES ($1, $2)", session_id, sentence)
-                for sentence in cleaned
-            ])
+            # Round 1 (or the resumed round) only has to wait for its own statement
+            needed_now = max(0, current_round - sentence_count)
+            await statement_bank.fill_session(session_id, session["category"], required, needed_now)
 
         except Exception as e:
             return JSONResponse(status_code=500, content={"detail": f"Failed to generate statements: {str(e)}"})
 
+    # Game rows and sentences changed underneath any cached state
+    await invalidate_game_state(session_id)
+
     countdown_seconds = 5
     start_at = datetime.now(timezone.utc) + timedelta(seconds=countdown_seconds)
     
@@ -776,85 +694,37 @@ async def start_game(session_id: int, user: str = Depends(auth_required)):
     return Response(status_code=204)
 
 @router.get("/game/{session_id}")
-async def game_page(request: Request, session_id: int, user: str = Depends(auth_required)):
-    user_row, session, game_started, is_host_row = await gather(
-        fetchrow("SELECT id FROM users WHERE username = $1", user),
-        fetchrow("SELECT * FROM sessions WHERE id = $1", session_id),
-        fetchrow("SELECT * FROM game_started WHERE session_id = $1", session_id),
-        fetchrow("""
-            SELECT is_host FROM session_users 
-            JOIN users ON users.id = session_users.user_id
-            WHERE users.username = $1 AND session_users.session_id = $2
-        """, user, session_id)
-    )
+async def game_page(request: Request, session_id: int, principal: Principal = Depends(auth_required)):
+    user_id, user = principal
+    state = await get_game_state(session_id)
+    is_host = state.is_host(user) if state else None
 
-    if not session or not is_host_row:
+    if state is None or is_host is None:
         params = urlencode({"error": "Session not found"})
         return RedirectResponse(url=f"/sessions?{params}", status_code=303)
     
-    if not game_started:
-        page = "host-lobby" if is_host_row["is_host"] else "waiting-area"
+    if not state.game_started:
+        page = "host-lobby" if is_host else "waiting-area"
         return RedirectResponse(f"/{page}/{session_id}?error=Game has not started!", status_code=303)
-    if game_started["paused"]:
-        page = "host-lobby" if is_host_row["is_host"] else "waiting-area"
+    if state.is_paused:
+        page = "host-lobby" if is_host else "waiting-area"
         return RedirectResponse(f"/{page}/{session_id}?error=Game is currently paused!", status_code=303)
     
-    latest_round = await fetchrow("""
-            SELECT round FROM rounds 
-            WHERE session_id = $1 AND started = TRUE AND ended = FALSE
-            ORDER BY round DESC LIMIT 1
-        """, session_id)
-    if latest_round:
-        current_round = latest_round["round"]
-    else:
-        last_round_row = await fetchrow("""
-            SELECT round FROM rounds
-            WHERE session_id = $1
-            ORDER BY round DESC LIMIT 1
-        """, session_id)
-        current_round = last_round_row["round"]
+    current = await resolve_current_round(state)
+    current_round = current["round"]
+    users_in_session = state.player_list()
+    current_sentence = state.sentence_for(current_round)
 
-    users_in_session, game_sentences_raw, submitted_gifs_raw, votes_cast_row, user_voted_row, winners_row = await gather(
-        fetch("""
-            SELECT users.username, session_users.is_host, user_scores.score, user_scores.winner
-            FROM session_users
-            JOIN users ON session_users.user_id = users.id
-            LEFT JOIN user_scores 
-              ON session_users.user_id = user_scores.user_id 
-             AND session_users.session_id = user_scores.session_id
-            WHERE session_users.session_id = $1
-        """, session_id),
-        fetch("SELECT sentence FROM game_sentences WHERE session_id = $1", session_id),
-        fetch("""
-            SELECT u.username, g.gif_url, g.is_n 
-            FROM gif_urls g
-            JOIN users u ON g.user_id = u.id
-            WHERE g.session_id = $1 AND g.round = $2
-        """, session_id, current_round),
-        fetchrow("SELECT COUNT(*) AS count FROM votes WHERE session_id = $1 AND round = $2", session_id, current_round),
-        fetchrow("""
-            SELECT 1 FROM votes
-            JOIN users ON votes.user_id = users.id
-            WHERE votes.session_id = $1 AND votes.round = $2 AND users.username = $3
-        """, session_id, current_round, user),
-        fetch("""
-            SELECT username AS winners
-            FROM users
-            JOIN user_scores ON users.id = user_scores.user_id
-            WHERE user_scores.session_id = $1 AND user_scores.score = $2
-        """, session_id, session["points_to_win"])
-    )
-    
-    game_sentences = [row["sentence"] for row in game_sentences_raw]
-    current_sentence = game_sentences[current_round - 1] if current_round - 1 < len(game_sentences) else "Statement unavailable"
-
-    submitted_gifs = [{"username": r["username"], "gif_url": r["gif_url"], "is_null": r["is_n"]} for r in submitted_gifs_raw]
+    submitted_gifs = [
+        {"username": r["username"], "gif_url": r["gif_url"], "is_null": r["is_null"]}
+        for r in state.round_submissions(current_round)
+    ]
     submitted_usernames = {row["username"] for row in submitted_gifs}
-    all_usernames = {player["username"] for player in users_in_session}
+    all_usernames = set(state.players)
 
     user_has_submitted = user in submitted_usernames
-    user_has_voted = bool(user_voted_row)
-    votes_cast = votes_cast_row["count"]
+    user_has_voted = state.has_voted(current_round, user_id)
+    votes_cast = state.votes_cast(current_round)
     total_players = len(users_in_session)
     all_votes_submitted = votes_cast == total_players
     all_gifs_submitted = submitted_usernames == all_usernames
@@ -865,59 +735,38 @@ async def game_page(request: Request, session_id: int, user: str = Depends(auth_
     for player in users_in_session:
         presence_state.setdefault(player["username"], "offline")
 
-    flag = round_flags.get((session_id, current_round), {"state": "idle", "start_at": None, "end_at": None})
-    print(flag)
-    round_state = flag["state"]
-    round_start_at = flag["start_at"] if flag["start_at"] else None
-    round_end_at = flag["end_at"] if flag["end_at"] else None
+    print(current)
+    round_state = current["state"]
+    round_start_at = current["start_at"]
+    round_end_at = current["end_at"]
 
     round_results = []
     round_winners = []
     winners = []
     leaderboard = []
 
-    if winners_row:
-        winners = [row["winners"] for row in winners_row]
-        leaderboard_rows = await fetch("""
-            SELECT users.username, user_scores.score
-            FROM users
-            JOIN user_scores ON users.id = user_scores.user_id
-            WHERE user_scores.session_id = $1
-        """, session_id)
-        leaderboard = [{"username": row["username"], "score": row["score"]} for row in leaderboard_rows]
+    if state.winners():
+        winners = state.winners()
+        leaderboard = state.leaderboard()
         round_state = "game_over"
     elif all_votes_submitted:
         round_state = "results"
 
-        round_results_raw = await fetch("""
-            SELECT users.username, COUNT(*) as votes
-            FROM votes
-            JOIN users ON votes.voted_for_user_id = users.id
-            WHERE votes.session_id = $1 AND votes.round = $2
-            GROUP BY users.username
-            ORDER BY votes DESC
-        """, session_id, current_round)
-
-        round_results = [{"username": row["username"], "votes": row["votes"]} for row in round_results_raw]
+        round_results = state.vote_tally(current_round)
         if round_results:
             max_votes = round_results[0]["votes"]
             round_winners = [row["username"] for row in round_results if row["votes"] == max_votes]
     elif all_gifs_submitted:
         round_state = "voting"
-    
-    round_flags[(session_id, current_round)] = {
-        "state": round_state,
-        "start_at": round_start_at,
-        "end_at": round_end_at
-    }
+    # Display only: the transitions themselves belong to save_gif / vote / next_round
 
     return templates.TemplateResponse("game.html", {
         "request": request,
         "session_id": session_id,
         "round": current_round,
         "user": user,
-        "is_host": is_host_row["is_host"],
-        "time_per_question": session["time_per_question"],
+        "is_host": is_host,
+        "time_per_question": state.time_per_question,
         "users": users_in_session,
         "user_count": total_players,
         "presence": presence_state,
@@ -938,66 +787,30 @@ async def game_page(request: Request, session_id: int, user: str = Depends(auth_
     })
 
 @router.post("/pause-game/{session_id}")
-async def pause_game(session_id: int, user: str = Depends(auth_required)):
-    user_row = await fetchrow("SELECT id FROM users WHERE username = $1", user)
-    session = await fetchrow("SELECT * FROM sessions WHERE id = $1", session_id)
+async def pause_game(session_id: int, principal: Principal = Depends(auth_required)):
+    user_id, user = principal
+    state = await get_game_state(session_id)
 
-    if not session["active"]:
+    if state is None or not state.active:
         return JSONResponse(status_code=403, content={"detail": "The session is no longer active."})
     
-    if session["host_id"] != user_row["id"]:
+    if state.host_id != user_id:
         return JSONResponse(status_code=403, content={"detail": "Only the host can pause the game."})
     
-    round_row = await fetchrow("""
-            SELECT round FROM rounds
-            WHERE session_id = $1 AND started = TRUE AND ended IS DISTINCT FROM TRUE
-            ORDER BY round DESC LIMIT 1
-        """, session_id)
-    if round_row:
-        current_round = round_row["round"]
-    else:
-        last_round_row = await fetchrow("""
-            SELECT round FROM rounds
-            WHERE session_id = $1
-            ORDER BY round DESC LIMIT 1
-        """, session_id)
-
-        if last_round_row:
-            current_round = last_round_row["round"]
-        else:
-            current_round = 1  # Brand new game
+    current = await resolve_current_round(state)
+    current_round = current["round"]
+    round_state = current["state"]
 
-    flag = round_flags.get((session_id, current_round))
-    if flag:
-        round_state = flag["state"]
-    else:
-        if round_row:
-            round_state = "idle"
-        else:
-            winners_exist = await fetchrow("""
-                SELECT COUNT(*) FROM user_scores
-                WHERE session_id = $1 AND score = $2
-            """, session_id, session["points_to_win"])
-            
-            if winners_exist:
-                round_state = "game_over"
-            else:
-                round_state = "ended"
-    
-    if round_state in {"idle", "new_round", "results", "ended", "game_over"}:
+    # Only a round in progress can be paused; the compare-and-set keeps a racing transition from being undone
+    if round_state in {"idle", "new_round", "results", "ended", "game_over"} or \
+            not await round_states.transition(session_id, current_round, {"started", "paused", "voting"}, "idle"):
         return JSONResponse(status_code=403, content={"detail": f"The session can't be paused due to its state: {round_state}"})
 
-    await execute("UPDATE game_started SET paused = TRUE WHERE session_id = $1", session_id)
-    await execute ("UPDATE rounds SET started = FALSE, paused = FALSE WHERE session_id = $1 AND round = $2", session_id, current_round)
+    state.pause(current_round)
+    state.commit()
 
-    await execute("DELETE FROM gif_urls WHERE session_id = $1 AND round = $2", session_id, current_round)
-    await execute("DELETE FROM votes WHERE session_id = $1 AND round = $2", session_id, current_round)
-
-    round_flags[(session_id, current_round)] = {
-        "state": "idle",
-        "start_at": None,
-        "end_at": None
-    }
+    await round_states.set(session_id, current_round, "idle")
+    round_timer.cancel(session_id, current_round)
 
     # Broadcast pause countdown
     countdown_seconds = 5
@@ -1011,15 +824,16 @@ async def pause_game(session_id: int, user: str = Depends(auth_required)):
     return JSONResponse({"status": "paused"})
 
 @router.post("/start-round/{session_id}/{round}")
-async def start_round(session_id: int, round: int, user: str = Depends(auth_required)):
+async def start_round(session_id: int, round: int, principal: Principal = Depends(auth_required)):
+    user = principal.username
     room_id = f"session_{session_id}"
 
     if not everyone_ready(room_id):
         return Response(status_code=409)
     
     round_row, session_row = await gather(
-        fetchrow("SELECT * FROM rounds WHERE session_id = $1 AND round = $2", session_id, round),
-        fetchrow("SELECT time_per_question FROM sessions WHERE id = $1", session_id)
+        fetchrow(ROUND_BY_NUMBER, session_id, round),
+        fetchrow(SESSION_TIME_PER_QUESTION, session_id)
     )
     if not round_row or not session_row:
         return Response(status_code=404)
@@ -1032,17 +846,10 @@ async def start_round(session_id: int, round: int, user: str = Depends(auth_requ
         start_at = now + timedelta(seconds=countdown_seconds)
         end_at = start_at + timedelta(seconds=time_per_question)
 
-        await execute("""
-            UPDATE rounds
-            SET started = TRUE, paused = FALSE, start_at = $1, end_at = $2
-            WHERE session_id = $3 AND round = $4
-        """, start_at, end_at, session_id, round)
+        await execute(START_ROUND, start_at, end_at, session_id, round)
 
-        round_flags[(session_id, round)] = {
-            "state": "started",
-            "start_at": start_at,
-            "end_at": end_at
-        }
+        await round_states.set(session_id, round, "started", start_at, end_at)
+        round_timer.schedule(session_id, round, end_at)
 
         await broadcast(room_id, {
             "type": "start_round",
@@ -1066,17 +873,10 @@ async def start_round(session_id: int, round: int, user: str = Depends(auth_requ
         resume_at = now + timedelta(seconds=5)
         new_end_at = resume_at + timedelta(seconds=remaining)
 
-        await execute("""
-            UPDATE rounds
-            SET paused = FALSE, resume_at = $1, end_at = $2
-            WHERE session_id = $3 AND round = $4
-        """, resume_at, new_end_at, session_id, round)
+        await execute(RESUME_ROUND, resume_at, new_end_at, session_id, round)
 
-        round_flags[(session_id, round)] = {
-            "state": "started",
-            "start_at": resume_at,
-            "end_at": new_end_at
-        }
+        await round_states.set(session_id, round, "started", resume_at, new_end_at)
+        round_timer.schedule(session_id, round, new_end_at)
 
         await broadcast(room_id, {
             "type": "resume_round",
@@ -1092,13 +892,14 @@ async def start_round(session_id: int, round: int, user: str = Depends(auth_requ
     
 
 @router.post("/pause-round/{session_id}/{round}")
-async def pause_round(session_id: int, round: int, user: str = Depends(auth_required)):
+async def pause_round(session_id: int, round: int, principal: Principal = Depends(auth_required)):
+    user = principal.username
     room_id = f"session_{session_id}"
 
     if everyone_ready(room_id):
         return Response(status_code=204)
     
-    round_row = await fetchrow("SELECT * FROM rounds WHERE session_id = $1 AND round = $2", session_id, round)
+    round_row = await fetchrow(ROUND_BY_NUMBER, session_id, round)
     if not round_row:
         return Response(status_code=404)
 
@@ -1107,17 +908,10 @@ async def pause_round(session_id: int, round: int, user: str = Depends(auth_requ
 
     now = datetime.now(timezone.utc)
 
-    await execute("""
-        UPDATE rounds
-        SET paused = TRUE, pause_at = $1
-        WHERE session_id = $2 AND round = $3
-    """, now, session_id, round)
+    await execute(PAUSE_ROUND, now, session_id, round)
 
-    round_flags[(session_id, round)] = {
-        "state": "paused",
-        "start_at": None,
-        "end_at": None
-    }
+    await round_states.set(session_id, round, "paused")
+    round_timer.cancel(session_id, round)
 
     await broadcast(room_id, {
         "type": "pause_round",
@@ -1126,214 +920,116 @@ async def pause_round(session_id: int, round: int, user: str = Depends(auth_requ
     })
     return Response(status_code=204)
 
+async def searchable_round(session_id: int | None, round: int | None, user: str) -> tuple:
+    # Searches only feed a round's suggestions when the player is in that game and the round
+    # is the one being played; anything else counts towards the global index only
+    if session_id is None or round is None:
+        return None, None
+    state = await get_game_state(session_id)
+    if state is None or user not in state.players or round != state.current_round:
+        return None, None
+    return session_id, round
+
 @router.get("/search-gifs")
-async def search_gifs(query: str = Query(...), user: str = Depends(auth_required)):
-    async with httpx.AsyncClient() as client:
-        response = await client.get("https://api.giphy.com/v1/gifs/search", params={
-            "api_key": GIPHY_API_KEY,
-            "q": query,
-            "limit": 25
-        })
-    gifs = response.json().get("data", [])
-    return JSONResponse(content={"gifs": gifs})
+async def search_gifs(
+    query: str = Query(...),
+    offset: int = Query(0, ge=0),
+    renditions: str = Query("default"),
+    session_id: int | None = Query(None),
+    round: int | None = Query(None),
+    principal: Principal = Depends(auth_required)
+):
+    user = principal.username
+    if renditions not in giphy.RENDITION_SETS:
+        return JSONResponse(status_code=400, content={"gifs": [], "detail": f"Unknown rendition set: {renditions}"})
+    try:
+        page = await giphy.search(query, offset, renditions)
+    except Exception:
+        return JSONResponse(status_code=502, content={"gifs": [], "detail": "GIF search is unavailable right now"})
+    if offset == 0:
+        search_suggest.record_search(query, *await searchable_round(session_id, round, user))
+    return JSONResponse(content=page)
+
+@router.get("/search-gifs/suggest")
+async def suggest_gif_searches(
+    prefix: str = Query(...),
+    session_id: int | None = Query(None),
+    round: int | None = Query(None),
+    principal: Principal = Depends(auth_required)
+):
+    # Also warms the search cache with the top suggestions
+    session_id, round = await searchable_round(session_id, round, principal.username)
+    return JSONResponse(content={"suggestions": search_suggest.suggest(prefix, session_id, round)})
 
 @router.post("/save-gif/{session_id}/{round}")
-async def save_gif(session_id: int, round: int, selected_gif: str = Form(None), request: Request = None, user: dict = Depends(auth_required)):
-    user_row, existing = await gather(
-        fetchrow("SELECT id FROM users WHERE username = $1", user),
-        fetchrow("SELECT 1 FROM gif_urls WHERE session_id = $1 AND user_id = (SELECT id FROM users WHERE username = $2) AND round = $3", session_id, user, round)
-    )
-    user_id = user_row["id"]
+async def save_gif(session_id: int, round: int, selected_gif: str = Form(None), request: Request = None, principal: Principal = Depends(auth_required)):
+    user_id, user = principal
+    state = await get_game_state(session_id)
+    if state is None:
+        return JSONResponse({"status": "error", "message": "Session not found"}, status_code=404)
 
-    if existing:
+    if not state.add_submission(round, user_id, user, selected_gif):
         return JSONResponse({"status": "already_submitted"}, status_code=200)
-    
-    await execute(
-        "INSERT INTO gif_urls (session_id, user_id, gif_url, round, is_n) VALUES ($1, $2, $3, $4, $5)",
-        session_id, user_id, selected_gif, round, selected_gif is None
-    )
-
-    # Fetch all current submissions
-    submissions_raw, total_players_row = await gather(
-        fetch("""
-            SELECT users.id AS user_id, users.username, gif_urls.gif_url, gif_urls.is_n
-            FROM gif_urls
-            JOIN users ON gif_urls.user_id = users.id
-            WHERE gif_urls.session_id = $1 AND gif_urls.round = $2
-        """, session_id, round),
-        fetchrow("""
-            SELECT COUNT(*) AS count FROM session_users
-            WHERE session_id = $1
-        """, session_id)
-    )
 
-    submissions = [{"user_id": r["user_id"], "username": r["username"], "gif_url": r["gif_url"], "is_null": r["is_n"]} for r in submissions_raw]
-    total_players = total_players_row["count"]
+    # All current submissions, straight from memory
+    submissions = state.round_submissions(round)
+    total_players = len(state.players)
     all_submitted = len(submissions) == total_players
 
     public_submissions = [
         {"username": r["username"], "gif_url": r["gif_url"], "is_null": r["is_null"]}
         for r in submissions if not r["is_null"]
     ]
+
+    state.commit()
+
     # Broadcast updated submissions
     await broadcast(f"session_{session_id}", {
         "type": "gif_submissions",
         "submissions": public_submissions
     })
 
-    flag = round_flags.get((session_id, round), {})
-    if all_submitted and flag.get("state") not in {"voting", "results", "ended"}:
-        # Everyone has submitted → start voting
-        non_null_submissions = [r for r in submissions if not r["is_null"]]
-        user_ids = [r["user_id"] for r in submissions]
-
-        existing_votes = await fetch("""
-            SELECT user_id FROM votes
-            WHERE session_id = $1 AND round = $2
-        """, session_id, round)
-        already_voted = {row["user_id"] for row in existing_votes}
-    
-        round_results = []
-        round_winners = []
-
-        if len(non_null_submissions) == 1:
-            # Only one real gif → give that player a point
-            sole_user_id = non_null_submissions[0]["user_id"]
-            sole_username = non_null_submissions[0]["username"]
-
-            await gather(*[
-                execute("""
-                    INSERT INTO votes (session_id, round, user_id, voted_for_user_id)
-                    VALUES ($1, $2, $3, $4)
-                """, session_id, round, uid, sole_user_id)
-                for uid in user_ids if uid not in already_voted
-            ])
-
-            await execute("""
-                UPDATE user_scores
-                SET score = score + 1
-                WHERE session_id = $1 AND user_id = $2
-            """, session_id, sole_user_id)
-
-            round_results = [{"username": sole_username, "votes": total_players}]
-            round_winners = [sole_username]
-
-            round_flags[(session_id, round)]["state"] = "results"
-            await broadcast(f"session_{session_id}", {
-                "type": "results",
-                "round_winners": round_winners,
-                "round_results": round_results
-            })
-        
-        elif len(non_null_submissions) == 0:
-            await gather(*[
-                execute("""
-                    INSERT INTO votes (session_id, round, user_id, voted_for_user_id)
-                    VALUES ($1, $2, $3, $4)
-                """, session_id, round, uid, uid)
-                for uid in user_ids if uid not in already_voted
-            ])
-            await gather(*[
-                execute("""
-                    UPDATE user_scores
-                    SET score = score + 1
-                    WHERE session_id = $1 AND user_id = $2
-                """, session_id, uid)
-                for uid in user_ids
-            ])
-            usernames = [r["username"] for r in submissions]
-            round_results = [{"username": u, "votes": 1} for u in usernames]
-            round_winners = usernames
-
-            round_flags[(session_id, round)]["state"] = "results"
-            await broadcast(f"session_{session_id}", {
-                "type": "results",
-                "round_winners": round_winners,
-                "round_results": round_results
-            })
-
-        else:
-            round_flags[(session_id, round)]["state"] = "voting"
-            await broadcast(f"session_{session_id}", {
-                "type": "start_voting",
-                "round": round
-            })
+    # Last one in closes the submission phase (no-op for everyone else)
+    if all_submitted:
+        await finalize_round(session_id, round)
 
     return JSONResponse({"status": "success", "submissions": public_submissions, "all_submitted": all_submitted}, status_code=200)
 
 @router.post("/vote/{session_id}/{round}")
-async def vote(session_id: int, round: int, voted_for_user: str = Form(...), user: dict = Depends(auth_required)):
-    voter, voted = await gather(
-        fetchrow("SELECT id FROM users WHERE username = $1", user),
-        fetchrow("SELECT id FROM users WHERE username = $1", voted_for_user)
-    )
+async def vote(session_id: int, round: int, voted_for_user: str = Form(...), principal: Principal = Depends(auth_required)):
+    user_id, user = principal
+    state = await get_game_state(session_id)
+    voted_id = state.user_id_of(voted_for_user) if state else None
 
-    if not voter or not voted:
+    if voted_id is None or user not in state.players:
         return JSONResponse({"status": "error", "message": "Invalid users"}, status_code=400)
-    
-    voter_id, voted_id = voter["id"], voted["id"]
-
-    # Check if already voted
-    existing = await fetchrow("""
-        SELECT 1 FROM votes
-        WHERE session_id = $1 AND round = $2 AND user_id = $3
-    """, session_id, round, voter_id)
-    if existing:
-        return JSONResponse({"status": "already_voted"}, status_code=200)
 
-    # Save vote
-    await execute("""
-        INSERT INTO votes (session_id, round, user_id, voted_for_user_id)
-        VALUES ($1, $2, $3, $4)
-    """, session_id, round, voter_id, voted_id)
-
-    votes_cast_row, total_players_row = await gather(
-        fetchrow("""
-            SELECT COUNT(*) AS count FROM votes
-            WHERE session_id = $1 AND round = $2
-        """, session_id, round),
-        fetchrow("""
-            SELECT COUNT(*) AS count FROM session_users
-            WHERE session_id = $1
-        """, session_id)
-    )
+    # Save vote (False if already voted)
+    if not state.add_vote(round, user_id, voted_id):
+        return JSONResponse({"status": "already_voted"}, status_code=200)
 
-    votes_cast = votes_cast_row["count"]
-    total_players = total_players_row["count"]
+    votes_cast = state.votes_cast(round)
+    total_players = len(state.players)
     all_voted = votes_cast == total_players
 
-    current_flag = round_flags.get((session_id, round), {})
-    if current_flag.get("state") in {"results", "ended", "game_over"}:
+    # Last vote in moves the round to "results"; if someone else already did, just record the vote
+    if all_voted and not await round_states.transition(session_id, round, VOTING_STATES, "results"):
+        state.commit()
         return JSONResponse({"status": "success", "all_voted": all_voted})
     
     round_results = []
     round_winners = []
     # 🔧 If all voted, tally results
-    if all_voted and current_flag.get("state") not in {"results", "ended", "game_over"}:
-        round_results_raw = await fetch("""
-            SELECT users.username, COUNT(*) as votes
-            FROM votes
-            JOIN users ON votes.voted_for_user_id = users.id
-            WHERE votes.session_id = $1 AND votes.round = $2
-            GROUP BY users.username
-            ORDER BY votes DESC
-        """, session_id, round)
-
-        round_results = [{"username": row["username"], "votes": row["votes"]} for row in round_results_raw]
+    if all_voted:
+        round_results = state.vote_tally(round)
         max_votes = round_results[0]["votes"] if round_results else 0
         round_winners = [r["username"] for r in round_results if r["votes"] == max_votes]
 
-        await gather(*[
-            execute("""
-                UPDATE user_scores
-                SET score = score + 1
-                WHERE session_id = $1 AND user_id = (SELECT id FROM users WHERE username = $2)
-            """, session_id, username)
-            for username in round_winners
-        ])
-
-        # 🔧 Update round state to "results"
-        round_flags[(session_id, round)]["state"] = "results"
+        state.award_points([state.user_id_of(username) for username in round_winners])
+
+    state.commit()
+
+    if all_voted:
         await broadcast(f"session_{session_id}", {
             "type": "results",
             "round_winners": round_winners,
@@ -1343,68 +1039,34 @@ async def vote(session_id: int, round: int, voted_for_user: str = Form(...), use
     return JSONResponse({"status": "success", "all_voted": all_voted, "round_results": round_results, "round_winners": round_winners})
 
 @router.post("/next-round/{session_id}/{round}")
-async def next_round(session_id: int, round: int, user: str = Depends(auth_required)):
-    is_host_row = await fetchrow("""
-        SELECT is_host FROM session_users 
-        JOIN users ON users.id = session_users.user_id
-        WHERE users.username = $1 AND session_users.session_id = $2
-    """, user, session_id)
-    if not is_host_row or not is_host_row["is_host"]:
+async def next_round(session_id: int, round: int, principal: Principal = Depends(auth_required)):
+    user = principal.username
+    state = await get_game_state(session_id)
+    if state is None:
+        return JSONResponse({"error": "Session not found"}, status_code=404)
+
+    if not state.is_host(user):
         return JSONResponse({"error": "Only the host can start next round"}, status_code=403)
 
-    flag = round_flags.get((session_id, round))
-    if not flag or flag.get("state") != "results":
+    if not await round_states.transition(session_id, round, {"results"}, "ended"):
         return JSONResponse({"error": "Current round not in results state"}, status_code=400)
 
-    await execute("""
-        UPDATE rounds SET ended = TRUE, paused = FALSE WHERE session_id = $1 AND round = $2
-    """, session_id, round)
-    round_flags[(session_id, round)] = {
-        "state": "ended",
-        "start_at": None,
-        "end_at": None
-    }
-
-    session = await fetchrow("SELECT points_to_win FROM sessions WHERE id = $1", session_id)
-    if not session:
-        return JSONResponse({"error": "Session not found"}, status_code=404)
-
-    points_to_win = session["points_to_win"]
+    next_round_number = round + 1
 
-    winners_row = await fetch("""
-        SELECT username AS winners
-        FROM users
-        JOIN user_scores ON user_scores.user_id = users.id
-        WHERE user_scores.session_id = $1 AND user_scores.score = $2
-    """, session_id, points_to_win)
-
-    if winners_row:
-        winners = [row["winners"] for row in winners_row]
-        leaderboard_rows = await fetch("""
-            SELECT users.username, user_scores.score
-            FROM users
-            JOIN user_scores ON users.id = user_scores.user_id
-            WHERE user_scores.session_id = $1
-        """, session_id)
-        leaderboard = [{"username": row["username"], "score": row["score"]} for row in leaderboard_rows]
+    # End the round and either close the game or open the next round in one write
+    state.end_round(round)
+    winners = state.winners()
+    if winners:
+        state.finish_game(winners)
+    else:
+        # ✅ Prepare next round
+        state.open_new_round(next_round_number)
+    state.commit()
 
-        round_flags[(session_id, round)] = {
-            "state": "game_over",
-            "start_at": None,
-            "end_at": None
-        }
+    if winners:
+        leaderboard = state.leaderboard()
 
-        await gather(
-            execute("UPDATE sessions SET active = FALSE WHERE id = $1", session_id),
-            *[
-                execute("""
-                    UPDATE user_scores
-                    SET winner = TRUE
-                    WHERE session_id = $1 AND user_id = (SELECT id FROM users WHERE username = $2)
-                """, session_id, winner)
-                for winner in winners
-            ],
-        )
+        await round_states.set(session_id, round, "game_over")
 
         await broadcast("sessions", {
             "type": "session_deactivated",
@@ -1421,33 +1083,20 @@ async def next_round(session_id: int, round: int, user: str = Depends(auth_requi
 
         return JSONResponse({"status": "game_over", "winners": winners, "leaderboard": leaderboard})
 
-    # ✅ Prepare next round
-    next_round_number = round + 1
-    await execute("""
-        INSERT INTO rounds (session_id, round, started, ended)
-        VALUES ($1, $2, FALSE, FALSE)
-    """, session_id, next_round_number)
+    await round_states.set(session_id, round, "ended")
 
     # ✅ Init round state
-    round_flags[(session_id, next_round_number)] = {
-        "state": "new_round",
-        "start_at": None,
-        "end_at": None
-    }
+    await round_states.set(session_id, next_round_number, "new_round")
 
     await broadcast(f"session_{session_id}", {
         "type": "round_ended",
         "next_round": next_round_number
     })
 
-    game_sentences_raw = await fetch("SELECT sentence FROM game_sentences WHERE session_id = $1", session_id)
-    game_sentences = [row["sentence"] for row in game_sentences_raw]
-    next_round_sentence = game_sentences[next_round_number - 1] if next_round_number - 1 < len(game_sentences) else "Statement unavailable"
-
     await broadcast(f"session_{session_id}", {
         "type": "new_round",
         "round": next_round_number,
-        "next_round_sentence": next_round_sentence,
+        "next_round_sentence": state.sentence_for(next_round_number),
         "next_round_state": "new_round"
     })
 
@@ -1,14 +1,22 @@
 # app/routes/websock.py
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import Dict, List
+from typing import Dict, List, Optional
+from collections import deque
 import json
 import logging
 import asyncio
-from app.db import fetch, fetchrow
-from collections import defaultdict
+import os
+from app.game_state import get_game_state
+from app.round_state import resolve_current_round
+from app.backplane import backplane
 from datetime import datetime, timedelta, timezone
 
+try:
+    import orjson
+except ImportError:  # optional fast encoder
+    orjson = None
+
 
 router = APIRouter()
 logger = logging.getLogger("websocket")
@@ -18,17 +26,143 @@ presence_by_room: Dict[str, Dict[str, str]] = {}  # room_id => {username: page o
 usernames_by_websocket: Dict[WebSocket, str] = {}
 pending_disconnects: Dict[str, asyncio.Task] = {}  # room:username => task
 
-# Round status tracking: "idle" | "started" | "paused"
-round_flags = defaultdict(lambda: {"state": "idle", "start_at": None})
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "2"))  # seconds before a slow socket is dropped
+
+# Outbound queue per socket: handlers enqueue, a writer task per socket does the sending
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "64"))
+# What a full queue does: "coalesce" replaces queued updates of the same session, then falls back to
+# "drop_oldest", which drops the oldest session update (never a game event); "disconnect" drops the socket
+WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "coalesce")  # "drop_oldest" | "coalesce" | "disconnect"
+SESSION_MESSAGE_TYPES = {"session_update", "session_delta"}
+
+# Presence broadcasts are coalesced per room and sent as deltas against the last snapshot
+PRESENCE_COALESCE_SECONDS = float(os.getenv("PRESENCE_COALESCE_MS", "250")) / 1000
+NOTIFY_EVENTS = {"joined", "left"}  # events the clients show a notification for
+pending_presence: Dict[str, dict] = {}  # room_id => {"trigger_user", "trigger_event", "notify"}
+presence_tasks: Dict[str, asyncio.Task] = {}  # room_id => scheduled flush
+last_presence_payload: Dict[str, dict] = {}  # room_id => last payload sent
+rooms_needing_snapshot = set()  # rooms with a new socket that still needs a full session_update
 
 def everyone_ready(room_id: str) -> bool:
     presence = presence_by_room.get(room_id, {})
     return presence and all(page == "game_page" for page in presence.values())
 
+def session_key(message: dict):
+    # The session a session_update / session_delta describes. The lobby room carries updates for
+    # every session on the same socket, so only messages about the same session may replace each other.
+    if message.get("type") not in SESSION_MESSAGE_TYPES:
+        return None
+    payload = message.get("payload") or {}
+    if "session_id" in payload:
+        return payload["session_id"]
+    return (payload.get("player_count") or {}).get("session_id")
+
+class Outbox:
+    def __init__(self, room: str, websocket: WebSocket):
+        self.room = room
+        self.websocket = websocket
+        self.queue = deque()  # (message type, session key, encoded text, encoded full snapshot or None)
+        self.ready = asyncio.Event()
+        self.dropped = 0
+        self.needs_snapshot = False  # a session message was dropped; the next delta goes out as a full snapshot
+        self.closed = False
+        self.task = asyncio.create_task(self.writer())
+
+    def put(self, kind: str, text: str, snapshot_text: str | None = None, key=None) -> bool:
+        # Returns False when the socket should be disconnected
+        if self.closed:
+            return False
+        if len(self.queue) >= WS_QUEUE_SIZE:
+            if WS_OVERFLOW_POLICY == "disconnect":
+                return False
+            if WS_OVERFLOW_POLICY == "coalesce" and self.coalesce(kind, key, text, snapshot_text):
+                return True
+            # Only session messages are dropped; game events (start_voting, results, new_round, ...) never are
+            if not self.drop_oldest_session_message():
+                if kind not in SESSION_MESSAGE_TYPES:
+                    # Nothing but game events queued: the client reloads its state when it reconnects
+                    return False
+                self.dropped += 1
+                self.needs_snapshot = True
+                return True
+
+        if kind == "session_delta" and self.needs_snapshot and snapshot_text:
+            # The client missed a message this delta builds on
+            kind, text = "session_update", snapshot_text
+        if kind == "session_update":
+            self.needs_snapshot = False
+
+        self.queue.append((kind, key, text, snapshot_text))
+        self.ready.set()
+        return True
+
+    def coalesce(self, kind: str, key, text: str, snapshot_text: str | None) -> bool:
+        # Queue full: a full snapshot of a session replaces that session's queued updates
+        full = text if kind == "session_update" else snapshot_text
+        if kind not in SESSION_MESSAGE_TYPES or key is None or full is None:
+            return False
+        kept = deque(m for m in self.queue if not (m[0] in SESSION_MESSAGE_TYPES and m[1] == key))
+        if len(kept) == len(self.queue):
+            return False
+        self.queue = kept
+        self.queue.append(("session_update", key, full, full))
+        self.needs_snapshot = False
+        self.ready.set()
+        return True
+
+    def drop_oldest_session_message(self) -> bool:
+        for i, (kind, key, _, _) in enumerate(self.queue):
+            if kind in SESSION_MESSAGE_TYPES:
+                del self.queue[i]
+                self.dropped += 1
+                self.resync(key)
+                return True
+        return False
+
+    def resync(self, key):
+        # A dropped session message leaves the client's deltas without a base: send the newest
+        # queued one for that session as a full snapshot, or the next one if none is queued
+        for i in range(len(self.queue) - 1, -1, -1):
+            kind, queued_key, text, snapshot_text = self.queue[i]
+            if kind not in SESSION_MESSAGE_TYPES or queued_key != key:
+                continue
+            if kind == "session_update" or snapshot_text:
+                self.queue[i] = ("session_update", key, snapshot_text or text, snapshot_text)
+                return
+            break
+        self.needs_snapshot = True
+
+    async def writer(self):
+        while not self.closed:
+            await self.ready.wait()
+            while self.queue and not self.closed:
+                _, _, text, _ = self.queue.popleft()
+                if not await send_or_fail(self.websocket, text):
+                    logger.debug(f"[{self.room}] Dropping socket after failed or slow send")
+                    await disconnect_from_room(self.room, self.websocket)
+                    await close_quietly(self.websocket)
+                    return
+            self.ready.clear()
+
+    def close(self):
+        # Nothing queued is sent after this, even if the writer's current send completes
+        self.closed = True
+        self.queue.clear()
+        if self.task is not asyncio.current_task():
+            self.task.cancel()
+
+outboxes: Dict[WebSocket, Outbox] = {}
+
 async def connect_to_room(room: str, websocket: WebSocket):
     rooms.setdefault(room, []).append(websocket)
+    outboxes[websocket] = Outbox(room, websocket)
+    rooms_needing_snapshot.add(room)
 
 async def disconnect_from_room(room: str, websocket: WebSocket):
+    outbox = outboxes.pop(websocket, None)
+    if outbox:
+        outbox.close()
+
     if room not in rooms or websocket not in rooms[room]:
         return
 
@@ -60,143 +194,172 @@ async def disconnect_from_room(room: str, websocket: WebSocket):
     if not rooms[room]:
         rooms.pop(room)
         presence_by_room.pop(room, None)
-        
-async def broadcast(room: str, message: dict):
+        last_presence_payload.pop(room, None)
+        rooms_needing_snapshot.discard(room)
+
+def encode_message(message: dict) -> str:
+    if orjson is not None:
+        return orjson.dumps(message).decode()
+    return json.dumps(message)
+
+async def send_or_fail(ws: WebSocket, text: str) -> bool:
+    try:
+        if ws.client_state.name != "CONNECTED":
+            raise RuntimeError("WebSocket not connected")
+        await asyncio.wait_for(ws.send_text(text), timeout=WS_SEND_TIMEOUT)
+        return True
+    except Exception:
+        return False
+
+async def close_quietly(ws: WebSocket):
+    try:
+        await asyncio.wait_for(ws.close(), timeout=WS_SEND_TIMEOUT)
+    except Exception:
+        pass
+
+async def broadcast(room: str, message: dict, snapshot: dict | None = None):
+    # Encode once, deliver to this worker's sockets and publish for the other workers.
+    # snapshot is the full equivalent of a delta message, used when queued updates are coalesced.
+    kind = message.get("type")
+    key = session_key(message)
+    text = encode_message(message)
+    snapshot_text = encode_message(snapshot) if snapshot else None
+    await deliver_local(room, kind, text, snapshot_text, key)
+    try:
+        await backplane.publish(room, kind, text, snapshot_text, key)
+    except Exception as e:
+        logger.error(f"[{room}] Failed to publish {kind} to the backplane: {e}")
+
+async def deliver_local(room: str, kind: str, text: str, snapshot_text: str | None = None, key=None):
+    # Enqueue on every socket this worker holds for the room; the per-socket writers do the sending
     if room not in rooms:
         return
-    
-    dead = []
-    for ws in rooms[room]:
-        try:
-            if ws.client_state.name != "CONNECTED":
-                raise RuntimeError("WebSocket not connected")
-            await ws.send_text(json.dumps(message))
-        except Exception as e:
-            dead.append(ws)
-
-    for ws in dead:
+
+    overflowed = []
+    for ws in list(rooms[room]):
+        outbox = outboxes.get(ws)
+        if outbox is None or not outbox.put(kind, text, snapshot_text, key):
+            overflowed.append(ws)
+
+    for ws in overflowed:
         await disconnect_from_room(room, ws)
+        asyncio.create_task(close_quietly(ws))
+
+def send_to(websocket: WebSocket, message: dict):
+    outbox = outboxes.get(websocket)
+    if outbox:
+        outbox.put(message.get("type"), encode_message(message), key=session_key(message))
 
 async def broadcast_presence(room: str, trigger_user: str, trigger_event: str):
+    # Coalesce: everything requested for a room within the window goes out as one message.
+    # Every join/leave in the window is kept in "notify", so none of them is lost to a later one.
+    pending = pending_presence.get(room)
+    if pending is None:
+        pending = pending_presence[room] = {"trigger_user": trigger_user, "trigger_event": trigger_event, "notify": []}
+    elif pending["trigger_event"] not in NOTIFY_EVENTS or trigger_event in NOTIFY_EVENTS:
+        pending["trigger_user"], pending["trigger_event"] = trigger_user, trigger_event
+    notification = {"user": trigger_user, "event": trigger_event}
+    if trigger_event in NOTIFY_EVENTS and notification not in pending["notify"]:
+        pending["notify"].append(notification)
+
+    if room not in presence_tasks:
+        presence_tasks[room] = asyncio.create_task(flush_presence(room))
+
+async def flush_presence(room: str):
+    try:
+        await asyncio.sleep(PRESENCE_COALESCE_SECONDS)
+    finally:
+        presence_tasks.pop(room, None)
+        pending = pending_presence.pop(room, None)
+    if not pending:
+        return
+
+    try:
+        payload = await build_presence_payload(room, pending["trigger_user"], pending["trigger_event"], pending["notify"])
+    except Exception as e:
+        # Skip this flush; the next presence change builds a fresh payload
+        logger.error(f"[{room}] Failed to build presence payload: {e}")
+        return
+    if payload is None:
+        return
+
+    last = last_presence_payload.get(room)
+    last_presence_payload[room] = payload
+
+    # Sockets that lost a queued message get this delta as a full snapshot (see Outbox.put)
+    if last is None or room in rooms_needing_snapshot:
+        rooms_needing_snapshot.discard(room)
+        await broadcast(room, {"type": "session_update", "payload": payload})
+        return
+
+    changed = {
+        key: value for key, value in payload.items()
+        if key not in ("trigger_user", "trigger_event", "notify") and last.get(key) != value
+    }
+    if not changed and not pending["notify"]:
+        # Heartbeat that changed nothing
+        return
+
+    await broadcast(room, {
+        "type": "session_delta",
+        "payload": {
+            "session_id": payload["session_id"],
+            "trigger_user": payload["trigger_user"],
+            "trigger_event": payload["trigger_event"],
+            "notify": payload["notify"],
+            **changed,
+        }
+    }, snapshot={"type": "session_update", "payload": payload})
+
+async def build_presence_payload(room: str, trigger_user: str, trigger_event: str, notify: Optional[List[dict]] = None):
     session_id = int(room.split("_")[1])
-    session_row = await fetchrow("SELECT players FROM sessions WHERE id = $1", session_id)
-    max_players = session_row["players"]
-
-    user_rows = await fetch("""
-        SELECT users.username, session_users.is_host, user_scores.score, user_scores.winner
-        FROM session_users
-        JOIN users ON session_users.user_id = users.id
-        LEFT JOIN user_scores ON session_users.user_id = user_scores.user_id AND session_users.session_id = user_scores.session_id
-        WHERE session_users.session_id = $1
-    """, session_id)
-
-    players = [{"username": us["username"], "is_host": us["is_host"], "score": us["score"], "winner": us["winner"]} for us in user_rows]
+    state = await get_game_state(session_id)
+    if state is None:
+        return None
+
+    players = state.player_list()
     raw_presence = presence_by_room.get(room, {})
     presence = {u: page for u, page in raw_presence.items() if u}
 
     # Ensure all players have a presence state
-    all_usernames = {u["username"] for u in user_rows}
-    for name in all_usernames:
+    for name in state.players:
         presence.setdefault(name, "offline")
 
-    # Determine current round number (highest round not yet ended)
-    round_row = await fetchrow("""
-        SELECT round FROM rounds
-        WHERE session_id = $1 AND ended = FALSE
-        ORDER BY round DESC LIMIT 1
-    """, session_id)
-
-    if round_row:
-        # ✅ Ongoing round found
-        current_round = round_row["round"]
-    else:
-        # 🟡 No active round — check if any rounds exist
-        last_round_row = await fetchrow("""
-            SELECT round FROM rounds
-            WHERE session_id = $1
-            ORDER BY round DESC LIMIT 1
-        """, session_id)
-
-        if last_round_row:
-            current_round = last_round_row["round"]
-        else:
-            current_round = 1  # Brand new game
-
-    # Determine round state
-    flag = round_flags.get((session_id, current_round))
-
-    if flag:
-        round_state = flag["state"]
-        round_start_at = flag["start_at"]
-        round_end_at = flag["end_at"]
-    else:
-        # 🧼 Memory wiped OR first time round — fallback logic
-        if round_row:  # An active round was just found, but no entry in memory
-            round_state = "idle"
-            round_start_at = None
-            round_end_at = None
-        elif last_round_row:
-            # 🟠 All rounds ended, check for winner to show game over
-            points_to_win_row = await fetchrow("SELECT points_to_win FROM sessions WHERE id = $1", session_id)
-            winners_exist = await fetchrow("""
-                SELECT * FROM user_scores
-                WHERE session_id = $1 AND score = $2
-            """, session_id, points_to_win_row["points_to_win"])
-            if winners_exist:
-                round_state = "game_over"
-            else:
-                round_state = "ended"  # fallback if game ended but no winner (shouldn't happen)
-            round_start_at = None
-            round_end_at = None
-        else:
-            round_state = "idle"
-            round_start_at = None
-            round_end_at = None
+    # Current round (highest round not yet ended, else the last round, else 1) and its state
+    current = await resolve_current_round(state)
+    current_round = current["round"]
+    round_state = current["state"]
+    round_start_at = current["start_at"]
+    round_end_at = current["end_at"]
 
     print(f"({session_id}, {current_round}): State: {round_state}, Start: {round_start_at}, End: {round_end_at}")
 
-    game_started = await fetchrow("SELECT * FROM game_started WHERE session_id = $1", session_id)
-    is_paused = game_started["paused"] if game_started else False
-    
     round_results = []
     round_winners = []
 
     if round_state == "results":
-        round_results_raw = await fetch("""
-            SELECT users.username, COUNT(*) as votes
-            FROM votes
-            JOIN users ON votes.voted_for_user_id = users.id
-            WHERE votes.session_id = $1 AND votes.round = $2
-            GROUP BY users.username
-            ORDER BY votes DESC
-        """, session_id, current_round)
-
-        round_results = [{"username": row["username"], "votes": row["votes"]} for row in round_results_raw]
+        round_results = state.vote_tally(current_round)
         if round_results:
             max_votes = round_results[0]["votes"]
             round_winners = [row["username"] for row in round_results if row["votes"] == max_votes]
 
-    message = {
-        "type": "session_update",
-        "payload": {
-            "session_id": session_id,
-            "players": players,
-            "presence": presence,
-            "max_players": max_players,
-            "is_paused": is_paused,
-            "game_has_been_started": bool(game_started),
-            "trigger_user": trigger_user,
-            "trigger_event": trigger_event,
-            "current_round": current_round,
-            "round_state": round_state,
-            "round_start_at": round_start_at.isoformat() if round_start_at else None,
-            "round_end_at": round_end_at.isoformat() if round_end_at else None,
-            "round_results": round_results,
-            "round_winners": round_winners,
-        }
+    return {
+        "session_id": session_id,
+        "players": players,
+        "presence": presence,
+        "max_players": state.max_players,
+        "is_paused": state.is_paused,
+        "game_has_been_started": state.game_started is not None,
+        "trigger_user": trigger_user,
+        "trigger_event": trigger_event,
+        "notify": notify or [],  # [{"user", "event"}] joins/leaves to show, in order
+        "current_round": current_round,
+        "round_state": round_state,
+        "round_start_at": round_start_at.isoformat() if round_start_at else None,
+        "round_end_at": round_end_at.isoformat() if round_end_at else None,
+        "round_results": round_results,
+        "round_winners": round_winners,
     }
-    # print(message)
-    await broadcast(room, message)
 
 @router.websocket("/ws/{room}")
 async def websocket_endpoint(websocket: WebSocket, room: str):
@@ -230,10 +393,10 @@ async def websocket_endpoint(websocket: WebSocket, room: str):
                 await broadcast_presence(room, trigger_user=username, trigger_event="presence_update")
 
             else:
-                await websocket.send_text(json.dumps({
+                send_to(websocket, {
                     "type": "echo",
                     "message": data
-                }))
+                })
 
     except WebSocketDisconnect:
         await disconnect_from_room(room, websocket)
@@ -0,0 +1,105 @@
+# app/search_suggest.py
+# Search-as-you-type suggestions for /search-gifs/suggest.
+# Every search is recorded in a prefix index for its round (session + round, i.e. one
+# sentence) and in a global index of popular queries. Each index is a sorted array of
+# normalized queries searched with bisect, plus a count per query. Asking for suggestions
+# also prefetches the top few into the GIPHY cache, so the search the player is most likely
+# to run next is already in memory.
+
+import asyncio
+import bisect
+import logging
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+from app import giphy
+
+logger = logging.getLogger("search_suggest")
+
+SUGGEST_LIMIT = int(os.getenv("SUGGEST_LIMIT", "8"))
+SUGGEST_PREFETCH = int(os.getenv("SUGGEST_PREFETCH", "3"))  # top suggestions fetched ahead of time
+SUGGEST_MAX_QUERIES = int(os.getenv("SUGGEST_MAX_QUERIES", "2000"))  # per index
+SUGGEST_MAX_ROUNDS = int(os.getenv("SUGGEST_MAX_ROUNDS", "512"))  # round indexes kept
+
+class PrefixIndex:
+    def __init__(self, max_queries: int):
+        self.max_queries = max_queries
+        self.queries: List[str] = []  # sorted
+        self.counts: Dict[str, int] = {}
+
+    def add(self, query: str):
+        if query in self.counts:
+            self.counts[query] += 1
+            return
+        if len(self.queries) >= self.max_queries:
+            self.evict()
+        bisect.insort(self.queries, query)
+        self.counts[query] = 1
+
+    def evict(self):
+        # Drop the least searched query
+        victim = min(self.counts, key=self.counts.get)
+        del self.counts[victim]
+        self.queries.pop(bisect.bisect_left(self.queries, victim))
+
+    def suggest(self, prefix: str, limit: int) -> List[Tuple[str, int]]:
+        start = bisect.bisect_left(self.queries, prefix)
+        end = bisect.bisect_left(self.queries, prefix + "\uffff")
+        matches = [(q, self.counts[q]) for q in self.queries[start:end]]
+        matches.sort(key=lambda m: (-m[1], m[0]))
+        return matches[:limit]
+
+popular_index = PrefixIndex(SUGGEST_MAX_QUERIES)
+round_indexes: "OrderedDict[Tuple[int, int], PrefixIndex]" = OrderedDict()
+prefetch_tasks: Set[asyncio.Task] = set()
+
+def round_index(session_id: Optional[int], round: Optional[int], create: bool = False) -> Optional[PrefixIndex]:
+    if session_id is None or round is None:
+        return None
+    key = (session_id, round)
+    index = round_indexes.get(key)
+    if index is None and create:
+        index = round_indexes[key] = PrefixIndex(SUGGEST_MAX_QUERIES)
+        while len(round_indexes) > SUGGEST_MAX_ROUNDS:
+            round_indexes.popitem(last=False)
+    if index is not None:
+        round_indexes.move_to_end(key)
+    return index
+
+def record_search(query: str, session_id: Optional[int] = None, round: Optional[int] = None):
+    query = giphy.normalize_query(query)
+    if not query:
+        return
+    popular_index.add(query)
+    index = round_index(session_id, round, create=True)
+    if index is not None:
+        index.add(query)
+
+def suggest(prefix: str, session_id: Optional[int] = None, round: Optional[int] = None, limit: int = SUGGEST_LIMIT) -> List[str]:
+    # Queries for this round's sentence first, then globally popular ones
+    prefix = giphy.normalize_query(prefix)
+    if not prefix:
+        return []
+    suggestions = []
+    index = round_index(session_id, round)
+    for source in ([index] if index else []) + [popular_index]:
+        for query, _ in source.suggest(prefix, limit):
+            if query not in suggestions:
+                suggestions.append(query)
+    suggestions = suggestions[:limit]
+    prefetch(suggestions[:SUGGEST_PREFETCH])
+    return suggestions
+
+def prefetch(queries: List[str]):
+    for query in queries:
+        if giphy.cached_search((query, 0)) is not None or (query, 0) in giphy.in_flight:
+            continue
+        task = asyncio.create_task(prefetch_one(query))
+        prefetch_tasks.add(task)
+        task.add_done_callback(prefetch_tasks.discard)
+
+async def prefetch_one(query: str):
+    try:
+        await giphy.search_page(query, 0)
+    except Exception as e:
+        logger.debug(f"Prefetch of '{query}' failed: {e}")
@@ -0,0 +1,165 @@
+# app/statement_bank.py
+# Persistent bank of generated statements, keyed by normalized category.
+# start_game draws a session's statements from here in one query; a background worker keeps
+# each category topped up, so the model is only on the critical path when a category is new
+# or has run dry.
+
+import asyncio
+import logging
+import os
+import re
+from typing import Optional, Set
+from app.db import fetch, fetchrow, transaction
+from app.queries import DRAW_STATEMENTS, STATEMENT_BANK_COUNT
+from app.statements import generate_statements, stream_statements
+from app.game_state import get_game_state, invalidate_game_state
+
+logger = logging.getLogger("statement_bank")
+
+STATEMENT_BANK_MIN = int(os.getenv("STATEMENT_BANK_MIN", "50"))  # refill a category below this many statements
+STATEMENT_BANK_BATCH = int(os.getenv("STATEMENT_BANK_BATCH", "30"))  # statements asked for per refill request
+STATEMENT_STREAMING = os.getenv("STATEMENT_STREAMING", "true").lower() == "true"
+STATEMENT_PERSIST_BATCH = int(os.getenv("STATEMENT_PERSIST_BATCH", "5"))  # streamed statements written per transaction
+
+def normalize_category(category: str) -> str:
+    # "  Movies &  TV " and "movies & tv" share a bank
+    return re.sub(r"\s+", " ", (category or "").strip().lower())
+
+async def draw(session_id: int, category: str, count: int) -> list[str]:
+    # Copy up to `count` random bank statements the session hasn't used yet into game_sentences
+    rows = await fetch(DRAW_STATEMENTS, session_id, normalize_category(category), count)
+    request_refill(category)
+    return [row["sentence"] for row in rows]
+
+async def add(category: str, sentences: list[str]):
+    if not sentences:
+        return
+    async with transaction() as tx:
+        await tx.executemany("""
+            INSERT INTO statement_bank (category_key, sentence)
+            VALUES ($1, $2)
+            ON CONFLICT (category_key, sentence) DO NOTHING
+        """, [(normalize_category(category), s) for s in sentences])
+
+async def insert_session_sentences(session_id: int, sentences: list[str]):
+    async with transaction() as tx:
+        await tx.executemany(
+            "INSERT INTO game_sentences (session_id, sentence) VALUES ($1, $2)",
+            [(session_id, s) for s in sentences]
+        )
+
+async def fill_session(session_id: int, category: str, count: int, needed_now: int = 1) -> list[str]:
+    # Bank first; only the shortfall goes to the model (and into the bank for next time).
+    # With streaming, returns once `needed_now` statements exist; the rest are written
+    # in the background while the game runs.
+    drawn = await draw(session_id, category, count)
+    missing = count - len(drawn)
+    if missing <= 0:
+        return drawn
+
+    if not STATEMENT_STREAMING:
+        generated = await generate_statements(category, missing)
+        await add(category, generated)
+        await insert_session_sentences(session_id, generated)
+        return drawn + generated
+
+    stream = stream_statements(category, missing)
+    head = []
+    try:
+        while len(head) < needed_now - len(drawn):
+            try:
+                head.append(await stream.__anext__())
+            except StopAsyncIteration:
+                break
+    except Exception as e:
+        # The model failed before the game could start: keep what arrived, fill up from the bank
+        logger.error(f"Streaming statements for session {session_id} failed: {e}")
+        if head:
+            await insert_session_sentences(session_id, head)
+            await add(category, head)
+        return drawn + head + await draw(session_id, category, missing - len(head))
+    if head:
+        await insert_session_sentences(session_id, head)
+        await add(category, head)
+
+    task = asyncio.create_task(_persist_stream(session_id, category, stream, missing - len(head)))
+    _stream_tasks.add(task)
+    task.add_done_callback(_stream_tasks.discard)
+    return drawn + head
+
+_stream_tasks: Set[asyncio.Task] = set()
+
+async def _persist_stream(session_id: int, category: str, stream, expected: int):
+    # Later statements go through the session's GameState so running rounds see them right away.
+    # If the stream fails partway, the statements still missing are drawn from the bank.
+    batch = []
+    persisted = 0
+    try:
+        async for sentence in stream:
+            batch.append(sentence)
+            if len(batch) >= STATEMENT_PERSIST_BATCH:
+                await _persist_batch(session_id, category, batch)
+                persisted += len(batch)
+                batch = []
+        if batch:
+            await _persist_batch(session_id, category, batch)
+    except Exception as e:
+        logger.error(f"Streaming statements for session {session_id} failed: {e}")
+        try:
+            if batch:
+                await _persist_batch(session_id, category, batch)
+                persisted += len(batch)
+            if expected > persisted and await draw(session_id, category, expected - persisted):
+                # draw() writes game_sentences directly; reload the cached state to pick them up
+                await invalidate_game_state(session_id)
+        except Exception as e:
+            logger.error(f"Falling back to the statement bank for session {session_id} failed: {e}")
+
+async def _persist_batch(session_id: int, category: str, batch: list[str]):
+    state = await get_game_state(session_id)
+    if state is None:
+        return
+    state.add_sentences(batch)
+    state.commit()
+    await add(category, batch)
+
+# ---- refill worker ----
+
+_refill_queue: asyncio.Queue = asyncio.Queue()
+_queued_categories: Set[str] = set()  # normalized keys waiting in the queue
+_refill_task: Optional[asyncio.Task] = None
+
+def request_refill(category: str):
+    key = normalize_category(category)
+    if _refill_task is None or not key or key in _queued_categories:
+        return
+    _queued_categories.add(key)
+    _refill_queue.put_nowait((key, category))
+
+async def _refiller():
+    while True:
+        key, category = await _refill_queue.get()
+        try:
+            row = await fetchrow(STATEMENT_BANK_COUNT, key)
+            if row["count"] < STATEMENT_BANK_MIN:
+                generated = await generate_statements(category, STATEMENT_BANK_BATCH)
+                await add(category, generated)
+                logger.info(f"Refilled '{key}' with {len(generated)} statements ({row['count']} in bank before)")
+        except Exception as e:
+            logger.error(f"Statement bank refill failed for '{key}': {e}")
+        finally:
+            _queued_categories.discard(key)
+            _refill_queue.task_done()
+
+def start_refill_worker():
+    global _refill_task
+    if _refill_task is None:
+        _refill_task = asyncio.create_task(_refiller())
+
+async def stop_refill_worker():
+    global _refill_task
+    if _refill_task is not None:
+        _refill_task.cancel()
+        _refill_task = None
+    for task in list(_stream_tasks):
+        task.cancel()
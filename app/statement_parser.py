@@ -0,0 +1,196 @@
+# app/statement_parser.py
+# Turns model output into a list of statements in one pass over the text.
+# Handles a JSON array or {"statements": [...]} object, numbered lists ("1. ", "2) "),
+# bulleted lists ("- ", "* ", "• ") and plain one-statement-per-line text. Works on a
+# whole response (parse_statements) or incrementally on a stream (StatementParser.feed).
+# In "auto" mode, code fences and a leading line of chatter ("Sure! Here you go:") are
+# skipped while looking for JSON. tests/test_statement_parser.py holds the corpus and fuzz
+# checks; `python -m bench.statement_parser` times it.
+
+import json
+import re
+from typing import List
+
+FORMATS = ("auto", "json", "lines")
+
+LIST_MARKER = re.compile(r"^\s*(?:\d+\s*[.):-]|[-*•])\s*")  # only at the start of a line
+JSON_START = re.compile(r'[\[{]\s*["\[{\]}]')  # '{"', '["', '[{', '[]' ... but not "[sic]"
+EDGE_CHARS = " \t.,"
+QUOTE_PAIRS = {'"': '"', "'": "'", "“": "”"}
+
+def unbalanced_quotes(text: str) -> bool:
+    return text.count('"') % 2 == 1 or text.count("“") != text.count("”")
+
+def clean_statement(text: str) -> str:
+    # Unescape first so an escaped closing quote is seen as a quote, not trimmed as stray
+    text = text.replace('\\"', '"').strip(EDGE_CHARS)
+    while len(text) > 1 and text[0] in QUOTE_PAIRS and text[-1] == QUOTE_PAIRS[text[0]]:
+        text = text[1:-1].strip(EDGE_CHARS)  # the whole statement was quoted
+    # A quote left open at either end is stray; quoted words inside ('say "hi"') are kept
+    if text[:1] in ('"', "“") and unbalanced_quotes(text):
+        text = text[1:]
+    if text[-1:] in ('"', "”") and unbalanced_quotes(text):
+        text = text[:-1]
+    return text.strip(EDGE_CHARS)
+
+def is_skippable_line(line: str) -> bool:
+    # Blank lines, code fences and headers like "Here are 10 statements:"
+    line = line.strip()
+    return not line or line.startswith("```") or line.endswith(":")
+
+def statements_from_line(line: str) -> List[str]:
+    if is_skippable_line(line):
+        return []
+    statement = clean_statement(LIST_MARKER.sub("", line, count=1))
+    return [statement] if statement else []
+
+class StatementParser:
+    def __init__(self, fmt: str = "auto"):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown statement format: {fmt}")
+        self.mode = None if fmt == "auto" else fmt
+        self.auto = fmt == "auto"
+        self.raw: List[str] = []  # kept in auto mode in case JSON turns out to be unparseable
+        # auto mode, until the format is known
+        self.pending = ""
+        self.scan_from = 0  # start of the unfinished line, or of its last "[" / "{"
+        self.chatter = False  # one line of text has been seen; a second one means "lines"
+        # lines mode
+        self.line_parts: List[str] = []
+        # json mode
+        self.in_string = False
+        self.escaped = False
+        self.containers: List[str] = []  # open "[" / "{" brackets
+        self.saw_array = False
+        self.string_parts: List[str] = []
+
+    def feed(self, text: str) -> List[str]:
+        if not text:
+            return []
+        if self.auto and self.mode != "lines":
+            self.raw.append(text)
+        if self.mode is None:
+            self.pending += text
+            return self._detect()
+        return self._feed_json(text) if self.mode == "json" else self._feed_lines(text)
+
+    def close(self) -> List[str]:
+        out = []
+        if self.mode is None:
+            if not self.pending:
+                return []
+            out = self._start("lines", self.pending)
+        if self.mode == "json":
+            if not self.saw_array and self.auto:
+                # Looked like JSON but never opened an array; read it as text instead
+                self.mode = "lines"
+                out += self._feed_lines("".join(self.raw))
+                out += self._close_lines()
+        else:
+            out += self._close_lines()
+        return out
+
+    # ---- format detection (auto) ----
+
+    def _detect(self) -> List[str]:
+        # JSON starts at the first '{"' / '["' / '[{' ..., wherever it is on its line. Blank
+        # lines, code fences, headers and one line of chatter may come before it; a list item
+        # or a second line of text means the answer is plain lines.
+        pending = self.pending
+        while True:
+            match = JSON_START.search(pending, self.scan_from)
+            newline = pending.find("\n", self.scan_from)
+            if match and (newline == -1 or match.start() < newline):
+                return self._start("json", pending[match.start():])
+            if newline == -1:
+                break
+            line = pending[pending.rfind("\n", 0, newline) + 1:newline]
+            self.scan_from = newline + 1
+            if is_skippable_line(line):
+                continue
+            if self.chatter or LIST_MARKER.match(line):
+                return self._start("lines", pending)
+            self.chatter = True
+        # Nothing decided yet: later text can only complete a JSON start at the last bracket
+        line_start = pending.rfind("\n") + 1
+        bracket = max(pending.rfind("[", line_start), pending.rfind("{", line_start))
+        self.scan_from = bracket if bracket != -1 else len(pending)
+        return []
+
+    def _start(self, mode: str, text: str) -> List[str]:
+        self.mode = mode
+        self.pending = ""
+        return self._feed_json(text) if mode == "json" else self._feed_lines(text)
+
+    # ---- lines ----
+
+    def _feed_lines(self, text: str) -> List[str]:
+        out = []
+        start = 0
+        newline = text.find("\n")
+        while newline != -1:
+            self.line_parts.append(text[start:newline])
+            out.extend(statements_from_line("".join(self.line_parts)))
+            self.line_parts = []
+            start = newline + 1
+            newline = text.find("\n", start)
+        if start < len(text):
+            self.line_parts.append(text[start:])
+        return out
+
+    def _close_lines(self) -> List[str]:
+        line = "".join(self.line_parts)
+        self.line_parts = []
+        return statements_from_line(line)
+
+    # ---- json ----
+
+    def _feed_json(self, text: str) -> List[str]:
+        # Every string literal directly inside an array is a statement; keys and other values are skipped
+        out = []
+        i, n = 0, len(text)
+        while i < n:
+            in_array = bool(self.containers) and self.containers[-1] == "["
+            if self.in_string:
+                start = i
+                while i < n:
+                    ch = text[i]
+                    if self.escaped:
+                        self.escaped = False
+                    elif ch == "\\":
+                        self.escaped = True
+                    elif ch == '"':
+                        break
+                    i += 1
+                if in_array:
+                    self.string_parts.append(text[start:i])
+                if i == n:
+                    break
+                self.in_string = False
+                if in_array:
+                    out.extend(self._finish_string())
+            else:
+                ch = text[i]
+                if ch == '"':
+                    self.in_string = True
+                elif ch in "[{":
+                    self.containers.append(ch)
+                    self.saw_array = self.saw_array or ch == "["
+                elif ch in "]}" and self.containers:
+                    self.containers.pop()
+            i += 1
+        return out
+
+    def _finish_string(self) -> List[str]:
+        raw = "".join(self.string_parts)
+        self.string_parts = []
+        try:
+            value = json.loads(f'"{raw}"')
+        except ValueError:
+            value = raw
+        value = clean_statement(value)
+        return [value] if value else []
+
+def parse_statements(text: str, fmt: str = "auto") -> List[str]:
+    parser = StatementParser(fmt)
+    return parser.feed(text or "") + parser.close()
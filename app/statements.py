@@ -0,0 +1,81 @@
+# app/statements.py
+# Statement generation for start_game.
+# Uses the async OpenAI client so a completion never blocks the event loop. Requests are
+# bounded by a timeout, retried by the client on connection errors / 429 / 5xx, and capped
+# at OPENAI_CONCURRENCY in flight per worker. Point OPENAI_BASE_URL at a local stub server
+# to run without the real API.
+
+import asyncio
+import logging
+import os
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+from app.statement_parser import StatementParser, parse_statements
+
+load_dotenv()
+
+logger = logging.getLogger("statements")
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # None = api.openai.com
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "20"))  # seconds per attempt
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", "4"))
+
+SYSTEM_PROMPT = "You are playing a GIF reaction game where users search for a GIF that best describes a statement."
+
+# Ask for {"statements": [...]} so parsing doesn't depend on how the model formats a list.
+# The parser still copes with numbered / bulleted / plain-line answers if this is turned off.
+OPENAI_JSON_OUTPUT = os.getenv("OPENAI_JSON_OUTPUT", "true").lower() == "true"
+
+client = AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    base_url=OPENAI_BASE_URL,
+    timeout=OPENAI_TIMEOUT,
+    max_retries=OPENAI_MAX_RETRIES,
+)
+generation_slots = asyncio.Semaphore(OPENAI_CONCURRENCY)
+
+def completion_args(category: str, count: int) -> dict:
+    prompt = f"Give me {count} statements about {category} for a GIF reaction game."
+    args = {"model": OPENAI_MODEL}
+    if OPENAI_JSON_OUTPUT:
+        prompt += ' Reply with a JSON object of the form {"statements": ["...", "..."]}.'
+        args["response_format"] = {"type": "json_object"}
+    else:
+        prompt += " Put each statement on its own line."
+    args["messages"] = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+    return args
+
+async def generate_statements(category: str, count: int) -> list[str]:
+    async with generation_slots:
+        completion = await client.chat.completions.create(**completion_args(category, count))
+
+    statements = parse_statements(completion.choices[0].message.content or "")
+    logger.debug(f"Generated {len(statements)} statements about '{category}' (asked for {count})")
+    return statements
+
+async def stream_statements(category: str, count: int):
+    # Yields statements as the completion streams in; the parser emits each one as soon as
+    # its closing quote (JSON) or newline (plain text) arrives.
+    parser = StatementParser()
+    produced = 0
+    async with generation_slots:
+        stream = await client.chat.completions.create(**completion_args(category, count), stream=True)
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            for statement in parser.feed(chunk.choices[0].delta.content or ""):
+                produced += 1
+                yield statement
+        for statement in parser.close():
+            produced += 1
+            yield statement
+    logger.debug(f"Streamed {produced} statements about '{category}' (asked for {count})")
+
+async def close_client():
+    await client.close()
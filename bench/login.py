@@ -0,0 +1,41 @@
+# bench/login.py
+# Login throughput benchmark: python -m bench.login [logins] [concurrency]
+# Runs the login path minus the database lookup (rate limit check, bcrypt verify, cookie
+# issue, then the first cookie decode) for distinct users and IPs, so nothing is throttled.
+# Concurrency defaults to HASH_WORKERS so no login waits in, or is shed by, the hash queue.
+
+import asyncio
+import os
+import sys
+import time
+
+from app.auth_utils import (
+    HASH_WORKERS, create_session_cookie, decode_session_data, hash_metrics, hash_password, verify_password_async
+)
+from app.rate_limit import allow_login_attempt
+
+async def login(i: int, stored: str, slots: asyncio.Semaphore) -> bool:
+    async with slots:
+        username = f"bench{i}"
+        if not allow_login_attempt(username, f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"):
+            return False
+        if not await verify_password_async("Benchmark1!", stored):
+            return False
+        cookie = create_session_cookie(username, i)
+        return decode_session_data(cookie) is not None
+
+async def benchmark(logins: int, concurrency: int):
+    stored = hash_password("Benchmark1!")
+    slots = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+    results = await asyncio.gather(*[login(i, stored, slots) for i in range(logins)], return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    ok = sum(1 for r in results if r is True)
+    cores = min(concurrency, HASH_WORKERS, os.cpu_count() or 1)
+    print(f"{ok}/{logins} logins in {elapsed:.2f}s, {concurrency} at a time on {HASH_WORKERS} hash workers")
+    print(f"{ok / elapsed:.1f} logins/s, {ok / elapsed / cores:.1f} logins/s per core")
+    print(f"hash queue: peak {hash_metrics['peak_pending']} pending, {hash_metrics['rejected']} rejected")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(benchmark(int(args[0]) if args else 50, int(args[1]) if len(args) > 1 else HASH_WORKERS))
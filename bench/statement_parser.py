@@ -0,0 +1,20 @@
+# bench/statement_parser.py
+# Micro-benchmark for app/statement_parser.py: python -m bench.statement_parser
+
+import json
+import timeit
+
+from app.statement_parser import parse_statements
+
+SAMPLES = {
+    "numbered": "\n".join(f"{i}. Statement number {i} about something funny" for i in range(1, 201)),
+    "json": json.dumps({"statements": [f"Statement number {i} about something funny" for i in range(1, 201)]}),
+    "fenced json": "```json\n" + json.dumps({"statements": [f"Statement {i}" for i in range(1, 201)]}) + "\n```",
+    # One long statement: the old splitter grew it one character at a time
+    "long line": "a" * 20000,
+}
+
+if __name__ == "__main__":
+    for name, sample in SAMPLES.items():
+        seconds = timeit.timeit(lambda: parse_statements(sample), number=200) / 200
+        print(f"{name}: {len(sample)} chars in {seconds * 1000:.3f} ms")
@@ -0,0 +1,53 @@
+# tests/test_auth_utils.py
+# Session cookies in app/auth_utils.py: expiry, legacy cookies and the verified-cookie cache.
+
+import os
+
+import pytest
+
+os.environ.setdefault("SECRET_KEY", "test")
+
+from app import auth_utils
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(auth_utils.time, "time", lambda: now[0])
+    monkeypatch.setattr(auth_utils, "session_cache", auth_utils.OrderedDict())
+    return now
+
+def test_cookie_round_trip(clock):
+    cookie = auth_utils.create_session_cookie("ann", 7)
+
+    assert auth_utils.decode_session_data(cookie) == {
+        "username": "ann", "user_id": 7, "exp": int(clock[0]) + auth_utils.SESSION_MAX_AGE,
+    }
+
+def test_cookie_expires_even_when_cached(clock):
+    cookie = auth_utils.create_session_cookie("ann", 7)
+    assert auth_utils.decode_session_data(cookie)
+
+    clock[0] += auth_utils.SESSION_MAX_AGE + 1
+
+    assert auth_utils.decode_session_data(cookie) is None
+
+def test_legacy_cookie_is_rejected(clock):
+    cookie = auth_utils.serializer.dumps({"username": "ann", "user_id": 7})
+
+    assert auth_utils.verify_session_cookie(cookie) is None
+    assert auth_utils.decode_session_data(cookie) is None
+    assert auth_utils.session_cache[cookie][0] is None
+
+def test_tampered_cookie_is_rejected(clock):
+    cookie = auth_utils.create_session_cookie("ann", 7)
+
+    assert auth_utils.decode_session_data(cookie[:-2] + "xx") is None
+    assert auth_utils.decode_session_data(auth_utils.serializer.dumps(["ann"])) is None
+
+def test_cache_is_bounded(clock, monkeypatch):
+    monkeypatch.setattr(auth_utils, "SESSION_CACHE_SIZE", 2)
+    cookies = [auth_utils.create_session_cookie(f"user{n}", n) for n in range(3)]
+    for cookie in cookies:
+        auth_utils.decode_session_data(cookie)
+
+    assert list(auth_utils.session_cache) == cookies[1:]
@@ -0,0 +1,95 @@
+# tests/test_backplane.py
+# PostgresBackplane envelopes with the database calls stubbed: small messages travel inside the
+# NOTIFY payload, large ones are stored and travel as a reference the other workers read back.
+
+import asyncio
+import json
+
+import pytest
+
+from app import backplane
+from app.queries import BACKPLANE_MESSAGE, PUBLISH_BACKPLANE_REFERENCE
+
+class FakeDatabase:
+    def __init__(self):
+        self.notified = []  # NOTIFY payloads, as the other workers would receive them
+        self.stored = {}  # backplane_messages: id => payload
+
+    async def execute(self, query, *args):
+        channel, payload = args
+        self.notified.append(payload)
+
+    async def fetchrow(self, query, *args):
+        if query is PUBLISH_BACKPLANE_REFERENCE:
+            channel, origin, payload, ttl = args
+            ref = len(self.stored) + 1
+            self.stored[ref] = payload
+            self.notified.append(json.dumps({"origin": origin, "ref": ref}))
+            return {"pg_notify": ""}
+        if query is BACKPLANE_MESSAGE:
+            payload = self.stored.get(args[0])
+            return {"payload": payload} if payload is not None else None
+        raise AssertionError(f"unexpected query {query}")
+
+@pytest.fixture
+def database(monkeypatch):
+    db = FakeDatabase()
+    monkeypatch.setattr(backplane, "execute", db.execute)
+    monkeypatch.setattr(backplane, "fetchrow", db.fetchrow)
+    return db
+
+def relay(db, *messages):
+    # Publish on this worker, then hand every NOTIFY to a second worker; returns what it delivered
+    delivered = []
+
+    async def deliver(room, kind, text, snapshot_text=None, key=None):
+        delivered.append((room, kind, json.loads(text), key))
+
+    async def scenario():
+        sender = backplane.PostgresBackplane()
+        receiver = backplane.PostgresBackplane()
+        receiver.deliver = deliver
+        for message in messages:
+            await sender.publish(*message)
+        for payload in db.notified:
+            envelope = json.loads(payload)
+            envelope["origin"] = "another worker"  # both backplanes share this process's WORKER_ID
+            receiver.on_notify(None, 0, backplane.BROADCAST_CHANNEL, json.dumps(envelope))
+        await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    return delivered
+
+def test_small_message_travels_in_the_notify_payload(database):
+    delivered = relay(database, ("session_1", "new_round", json.dumps({"type": "new_round", "round": 2})))
+
+    assert database.stored == {}
+    assert delivered == [("session_1", "new_round", {"type": "new_round", "round": 2}, None)]
+
+def test_large_message_travels_as_a_reference(database):
+    players = [{"username": f"player{n}", "score": n, "notes": "x" * 200} for n in range(60)]
+    delta = json.dumps({"type": "session_delta", "payload": {"session_id": 1, "players": players[:1]}})
+    snapshot = json.dumps({"type": "session_update", "payload": {"session_id": 1, "players": players}})
+
+    delivered = relay(database, ("session_1", "session_delta", delta, snapshot, 1))
+
+    assert len(database.stored) == 1
+    assert all(len(payload.encode()) <= backplane.NOTIFY_PAYLOAD_LIMIT for payload in database.notified)
+    # The other worker gets the whole message, with the delta turned into its full snapshot
+    assert delivered == [("session_1", "session_update", json.loads(snapshot), 1)]
+
+def test_expired_reference_is_skipped(database):
+    delivered = []
+
+    async def deliver(*args):
+        delivered.append(args)
+
+    async def scenario():
+        receiver = backplane.PostgresBackplane()
+        receiver.deliver = deliver
+        receiver.on_notify(None, 0, backplane.BROADCAST_CHANNEL, json.dumps({"origin": "another worker", "ref": 99}))
+        await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+
+    assert delivered == []
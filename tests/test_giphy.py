@@ -0,0 +1,178 @@
+# tests/test_giphy.py
+# app/giphy.py against a local fake GIPHY server: cache hits, TTL expiry and single-flight.
+
+import asyncio
+import json
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+import pytest
+
+from app import giphy
+
+def fake_gif(query: str, n: int) -> dict:
+    base = f"https://media.example/{query.replace(' ', '-')}/{n}"
+    return {
+        "id": f"{query}-{n}",
+        "title": f"{query} {n}",
+        "images": {
+            "fixed_width_small": {"url": f"{base}/small.gif", "webp": f"{base}/small.webp", "width": "100", "height": "80"},
+            "fixed_width_small_still": {"url": f"{base}/small_s.gif"},
+            "fixed_height": {"url": f"{base}/200.gif", "webp": f"{base}/200.webp", "width": "250", "height": "200"},
+            "fixed_height_still": {"url": f"{base}/200_s.gif"},
+            "original": {"url": f"{base}/original.gif"},
+        },
+    }
+
+class FakeGiphy(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeGiphyHandler)
+        self.requests = []  # (q, offset) per upstream request
+        self.delay = 0.0
+        self.status = 200
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+class FakeGiphyHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        query, offset = params["q"][0], int(params.get("offset", ["0"])[0])
+        self.server.requests.append((query, offset))
+        time.sleep(self.server.delay)
+
+        body = {
+            "data": [fake_gif(query, offset + n) for n in range(3)],
+            "pagination": {"total_count": 3, "count": 3, "offset": offset},
+        }
+        payload = json.dumps(body).encode()
+        self.send_response(self.server.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def fake_giphy(monkeypatch):
+    server = FakeGiphy()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setattr(giphy, "GIPHY_BASE_URL", server.base_url)
+    monkeypatch.setattr(giphy, "client", None)
+    monkeypatch.setattr(giphy, "search_cache", type(giphy.search_cache)())
+    monkeypatch.setattr(giphy, "in_flight", {})
+    monkeypatch.setattr(giphy, "cache_stats", {key: 0 for key in giphy.cache_stats})
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+def run(scenario):
+    # Each test gets its own event loop; the shared client is bound to it, so close it there too
+    async def wrapped():
+        try:
+            return await scenario()
+        finally:
+            await giphy.close_client()
+    return asyncio.run(wrapped())
+
+def test_repeat_search_is_served_from_cache(fake_giphy):
+    async def scenario():
+        first = await giphy.search("Funny  Cats")
+        second = await giphy.search(" funny cats ")
+        return first, second
+
+    first, second = run(scenario)
+
+    assert fake_giphy.requests == [("funny cats", 0)]
+    assert second == first
+    assert giphy.cache_stats["hits"] == 1
+    assert giphy.cache_stats["misses"] == 1
+    assert len(first["gifs"]) == 3
+
+def test_default_renditions_are_small(fake_giphy):
+    page = run(lambda: giphy.search("cats"))
+    gif = page["gifs"][0]
+
+    assert gif["url"].endswith("/small.gif")
+    assert gif["preview_webp"].endswith("/small.webp")
+    assert gif["preview"].endswith("/small_s.gif")
+    assert (gif["width"], gif["height"]) == (100, 80)
+
+def test_expired_entry_is_fetched_again(fake_giphy, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(giphy, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    monkeypatch.setattr(giphy, "GIPHY_CACHE_TTL", 60)
+
+    async def scenario():
+        await giphy.search("dogs")
+        now[0] += 59
+        await giphy.search("dogs")  # still fresh
+        now[0] += 2
+        await giphy.search("dogs")  # past the TTL
+
+    run(scenario)
+
+    assert fake_giphy.requests == [("dogs", 0), ("dogs", 0)]
+    assert giphy.cache_stats["hits"] == 1
+    assert giphy.cache_stats["misses"] == 2
+
+def test_concurrent_searches_share_one_request(fake_giphy):
+    fake_giphy.delay = 0.2
+
+    async def scenario():
+        return await asyncio.gather(*[giphy.search("party") for _ in range(10)])
+
+    pages = run(scenario)
+
+    assert fake_giphy.requests == [("party", 0)]
+    assert all(page == pages[0] for page in pages)
+    assert giphy.cache_stats["misses"] == 1
+    assert giphy.cache_stats["coalesced"] == 9
+    assert giphy.in_flight == {}
+
+def test_waiters_survive_a_cancelled_leader(fake_giphy):
+    fake_giphy.delay = 0.2
+
+    async def scenario():
+        leader = asyncio.create_task(giphy.search("wave"))
+        await asyncio.sleep(0.05)
+        waiter = asyncio.create_task(giphy.search("wave"))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        page = await waiter
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return page
+
+    page = run(scenario)
+
+    assert [gif["id"] for gif in page["gifs"]] == ["wave-0", "wave-1", "wave-2"]
+    assert fake_giphy.requests == [("wave", 0), ("wave", 0)]
+
+def test_upstream_error_reaches_every_waiter_and_is_not_cached(fake_giphy):
+    fake_giphy.delay = 0.1
+    fake_giphy.status = 500
+
+    async def scenario():
+        results = await asyncio.gather(*[giphy.search("broken") for _ in range(3)], return_exceptions=True)
+        fake_giphy.status = 200
+        fake_giphy.delay = 0
+        return results, await giphy.search("broken")
+
+    results, retry = run(scenario)
+
+    assert all(isinstance(r, httpx.HTTPStatusError) for r in results)
+    assert len(retry["gifs"]) == 3
+    assert fake_giphy.requests == [("broken", 0), ("broken", 0)]
@@ -0,0 +1,73 @@
+# tests/test_query_plans.py
+# Every named query in app/queries.py must be servable by an index.
+# Needs a real Postgres: set TEST_DATABASE_URL (a database the test may create schemas in).
+# The migrations are applied to a throwaway schema, which is dropped afterwards.
+
+import asyncio
+import os
+
+import pytest
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if not TEST_DATABASE_URL:
+    pytest.skip("TEST_DATABASE_URL is not set", allow_module_level=True)
+asyncpg = pytest.importorskip("asyncpg")
+
+from app.migrations import REQUIRED_TABLES, load_migrations
+from app.migrations.plans import explain_seq_scans
+from app.queries import REGISTRY
+
+SCHEMA = f"query_plans_{os.getpid()}"
+
+SEED = """
+    INSERT INTO users (username, hash)
+    SELECT 'player' || n, 'hash' FROM generate_series(1, 200) AS n;
+
+    INSERT INTO sessions (category, players, time_per_question, points_to_win, host_id, active)
+    SELECT 'movies', 4, 30, 5, n, n % 10 = 0 FROM generate_series(1, 200) AS n;
+
+    INSERT INTO session_users (session_id, user_id, is_host)
+    SELECT s, ((s + k) % 200) + 1, k = 0 FROM generate_series(1, 200) AS s, generate_series(0, 3) AS k;
+
+    INSERT INTO user_scores (session_id, user_id)
+    SELECT session_id, user_id FROM session_users;
+
+    INSERT INTO game_started (session_id) SELECT id FROM sessions WHERE id % 2 = 0;
+
+    INSERT INTO rounds (session_id, round, started, ended)
+    SELECT s, r, TRUE, r < 5 FROM generate_series(1, 200) AS s, generate_series(1, 5) AS r;
+
+    INSERT INTO game_sentences (session_id, sentence)
+    SELECT s, 'sentence ' || r FROM generate_series(1, 200) AS s, generate_series(1, 10) AS r;
+
+    INSERT INTO gif_urls (session_id, user_id, round, gif_url)
+    SELECT su.session_id, su.user_id, r, 'https://media.example/gif' FROM session_users su, generate_series(1, 5) AS r;
+
+    INSERT INTO votes (session_id, user_id, round, voted_for_user_id)
+    SELECT session_id, user_id, round, user_id FROM gif_urls;
+
+    INSERT INTO statement_bank (category_key, sentence)
+    SELECT 'category ' || (n % 20), 'statement ' || n FROM generate_series(1, 2000) AS n;
+"""
+
+async def check_plans() -> dict:
+    conn = await asyncpg.connect(TEST_DATABASE_URL)
+    try:
+        await conn.execute(f"CREATE SCHEMA {SCHEMA}")
+        try:
+            await conn.execute(f"SET search_path TO {SCHEMA}")
+            for migration in load_migrations():
+                await conn.execute(migration.sql)
+            await conn.execute(SEED)
+            await conn.execute(f"ANALYZE {', '.join(REQUIRED_TABLES)}")
+            return {name: await explain_seq_scans(conn, query) for name, query in sorted(REGISTRY.items())}
+        finally:
+            await conn.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    finally:
+        await conn.close()
+
+def test_named_queries_use_indexes():
+    scans = asyncio.run(check_plans())
+
+    assert scans
+    assert {name: tables for name, tables in scans.items() if tables} == {}
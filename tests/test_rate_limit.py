@@ -0,0 +1,63 @@
+# tests/test_rate_limit.py
+# app/rate_limit.py: token buckets, the per-IP attempt limit and per-(username, IP) failed logins.
+
+import types
+
+import pytest
+
+from app import rate_limit
+
+@pytest.fixture
+def limits(monkeypatch):
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: clock.now)
+    monkeypatch.setattr(rate_limit, "ip_limiter", rate_limit.TokenBucketLimiter(60, 20))
+    monkeypatch.setattr(rate_limit, "failed_login_limiter", rate_limit.TokenBucketLimiter(10, 5))
+    return clock
+
+def fail(username, ip, times):
+    for _ in range(times):
+        assert rate_limit.allow_login_attempt(username, ip)
+        rate_limit.record_failed_login(username, ip)
+
+def test_bucket_refills_over_time(limits):
+    limiter = rate_limit.TokenBucketLimiter(60, 2)
+
+    assert [limiter.allow("k") for _ in range(3)] == [True, True, False]
+    limits.now += 1  # one token a second
+    assert [limiter.allow("k") for _ in range(2)] == [True, False]
+    assert limiter.rejected == 2
+
+def test_bucket_keys_are_bounded():
+    limiter = rate_limit.TokenBucketLimiter(60, 1, max_keys=2)
+    for key in "abc":
+        limiter.allow(key)
+
+    assert list(limiter.buckets) == ["b", "c"]
+
+def test_failed_logins_lock_the_account_for_that_ip_only(limits):
+    fail("Ann", "10.0.0.1", 5)
+
+    assert not rate_limit.allow_login_attempt("ann", "10.0.0.1")
+    # Ann, logging in from their own address, is not affected by someone else's guesses
+    assert rate_limit.allow_login_attempt("ann", "10.0.0.2")
+    # The guesser can still sign in to other accounts
+    assert rate_limit.allow_login_attempt("bob", "10.0.0.1")
+    limits.now += 6  # LOGIN_RATE_PER_MINUTE 10: a failed login is forgiven every 6 seconds
+    assert rate_limit.allow_login_attempt("ann", "10.0.0.1")
+
+def test_successful_logins_are_not_limited_per_account(limits):
+    assert all(rate_limit.allow_login_attempt("ann", f"10.0.0.{n}") for n in range(50))
+
+def test_ip_bucket_limits_every_attempt(limits):
+    assert all(rate_limit.allow_auth_attempt("10.0.0.1") for _ in range(20))
+    assert not rate_limit.allow_auth_attempt("10.0.0.1")
+    assert not rate_limit.allow_login_attempt("someone else", "10.0.0.1")
+    assert rate_limit.allow_auth_attempt("10.0.0.2")
+
+def test_client_ip_honours_trusted_proxies(monkeypatch):
+    request = types.SimpleNamespace(headers={"x-forwarded-for": "6.6.6.6, 1.2.3.4"}, client=types.SimpleNamespace(host="10.0.0.9"))
+
+    assert rate_limit.client_ip(request) == "10.0.0.9"
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_HOPS", 1)
+    assert rate_limit.client_ip(request) == "1.2.3.4"
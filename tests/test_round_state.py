@@ -0,0 +1,38 @@
+# tests/test_round_state.py
+# The round-state store contract and the in-memory store's compare-and-set.
+
+import asyncio
+
+import pytest
+
+from app.round_state import InMemoryRoundStateStore, RoundStateStore, SUBMITTING_STATES
+
+def test_store_missing_a_method_fails_when_constructed():
+    class NoTransition(RoundStateStore):
+        async def get(self, session_id, round):
+            return None
+
+        async def set(self, session_id, round, state, start_at=None, end_at=None):
+            pass
+
+    with pytest.raises(TypeError):
+        NoTransition()
+
+def test_only_one_caller_moves_a_round_out_of_submitting():
+    store = InMemoryRoundStateStore()
+
+    async def scenario():
+        await store.set(1, 1, "started")
+        moved = await asyncio.gather(*[store.transition(1, 1, SUBMITTING_STATES, "voting") for _ in range(5)])
+        return moved, await store.get(1, 1)
+
+    moved, flag = asyncio.run(scenario())
+
+    assert moved.count(True) == 1
+    assert flag["state"] == "voting"
+
+def test_unrecorded_round_counts_as_no_state():
+    store = InMemoryRoundStateStore()
+
+    assert asyncio.run(store.transition(1, 2, (None,), "started"))
+    assert not asyncio.run(store.transition(1, 2, (None,), "started"))
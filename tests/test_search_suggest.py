@@ -0,0 +1,64 @@
+# tests/test_search_suggest.py
+# Round-scoped GIF search suggestions: a search only feeds a round's index when the player is
+# in that session and the round is the one being played.
+
+import asyncio
+import os
+import types
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")  # app.statements builds its client on import
+os.environ.setdefault("SECRET_KEY", "test")
+
+from app import search_suggest
+from app.auth_utils import Principal
+from app.routes import dashboard
+
+SESSION = 4
+ANN = Principal(1, "ann")
+MALLORY = Principal(2, "mallory")
+
+@pytest.fixture
+def game(monkeypatch):
+    state = types.SimpleNamespace(players={"ann": {"user_id": 1}}, current_round=3)
+
+    async def get_game_state(session_id):
+        return state if session_id == SESSION else None
+
+    async def search(query, offset, renditions):
+        return {"gifs": []}
+
+    monkeypatch.setattr(dashboard, "get_game_state", get_game_state)
+    monkeypatch.setattr(dashboard.giphy, "search", search)
+    monkeypatch.setattr(search_suggest, "prefetch", lambda queries: None)
+    monkeypatch.setattr(search_suggest, "popular_index", search_suggest.PrefixIndex(100))
+    monkeypatch.setattr(search_suggest, "round_indexes", search_suggest.OrderedDict())
+    return state
+
+def search(principal, query, session_id, round):
+    return asyncio.run(dashboard.search_gifs(query=query, offset=0, renditions="default",
+                                             session_id=session_id, round=round, principal=principal))
+
+def suggest(principal, prefix, session_id, round):
+    response = asyncio.run(dashboard.suggest_gif_searches(prefix=prefix, session_id=session_id, round=round,
+                                                          principal=principal))
+    return response.body
+
+def test_player_search_feeds_the_current_round(game):
+    search(ANN, "cat fail", SESSION, 3)
+
+    assert list(search_suggest.round_indexes) == [(SESSION, 3)]
+    assert b"cat fail" in suggest(ANN, "cat", SESSION, 3)
+
+@pytest.mark.parametrize("principal, session_id, round", [
+    (MALLORY, SESSION, 3),  # not a player in the session
+    (ANN, SESSION, 2),  # an old round
+    (ANN, SESSION, 99),  # a round that has not started
+    (ANN, 999, 1),  # no such session
+])
+def test_other_rounds_only_count_globally(game, principal, session_id, round):
+    search(principal, "cat fail", session_id, round)
+
+    assert search_suggest.round_indexes == {}
+    assert search_suggest.popular_index.counts == {"cat fail": 1}
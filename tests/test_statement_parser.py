@@ -0,0 +1,74 @@
+# tests/test_statement_parser.py
+# app/statement_parser.py on the kinds of answers the model gives: every sample must parse to
+# the same statements whether it arrives whole or streamed in small chunks.
+
+import random
+import string
+
+import pytest
+
+from app.statement_parser import StatementParser, clean_statement, parse_statements
+
+CORPUS = [
+    ('{"statements": ["When the Wi-Fi drops", "Monday morning meetings", "Finding \\"free\\" pizza"]}',
+     ["When the Wi-Fi drops", "Monday morning meetings", 'Finding "free" pizza']),
+    ('["When the Wi-Fi drops", "Monday morning meetings"]',
+     ["When the Wi-Fi drops", "Monday morning meetings"]),
+    ("Here are 3 statements:\n1. When the Wi-Fi drops.\n2) Monday morning meetings\n3. Finding 10 free pizzas",
+     ["When the Wi-Fi drops", "Monday morning meetings", "Finding 10 free pizzas"]),
+    ("- When the Wi-Fi drops\n* Monday morning meetings\n• Finding free pizza",
+     ["When the Wi-Fi drops", "Monday morning meetings", "Finding free pizza"]),
+    ("When the Wi-Fi drops\n\nMonday morning meetings\n",
+     ["When the Wi-Fi drops", "Monday morning meetings"]),
+    ('[{"text": "nested objects are skipped"}, "but this one counts"]', ["but this one counts"]),
+    ('{"statements": [', []),
+    ("", []),
+    # Code fences and chatter before the JSON
+    ('```json\n{"statements": ["a", "b"]}\n```', ["a", "b"]),
+    ('Sure! {"statements": ["a","b"]}', ["a", "b"]),
+    ('Sure! Here are your statements\n\n{"statements": ["a", "b"]}', ["a", "b"]),
+    ("```\n1. a\n2. b\n```", ["a", "b"]),
+    # A number inside a sentence is not a list marker
+    ("1. I scored 3. Then I left", ["I scored 3. Then I left"]),
+    ("When I eat 2 slices\n2. Then I left", ["When I eat 2 slices", "Then I left"]),
+    # Quoted words keep their quotes; quotes around the whole statement are dropped
+    ('{"statements": ["When you say \\"hi\\""]}', ['When you say "hi"']),
+    ('When you say "hi"\n"When you say bye"', ['When you say "hi"', "When you say bye"]),
+    ('1. When you say \\"hi\\"', ['When you say "hi"']),
+    ('[sic] is not JSON\nnor is this', ["[sic] is not JSON", "nor is this"]),
+]
+
+def streamed(text, size):
+    parser = StatementParser()
+    out = []
+    for k in range(0, len(text), size):
+        out += parser.feed(text[k:k + size])
+    return out + parser.close()
+
+@pytest.mark.parametrize("text, expected", CORPUS)
+def test_corpus(text, expected):
+    assert parse_statements(text) == expected
+    for size in (1, 3, 7):
+        assert streamed(text, size) == expected
+
+def test_explicit_formats():
+    assert parse_statements('["a", "b"]', "lines") == ['["a", "b"]']
+    assert parse_statements("Sure: [\"a\", \"b\"]", "json") == ["a", "b"]
+    with pytest.raises(ValueError):
+        StatementParser("yaml")
+
+def test_clean_statement():
+    assert clean_statement('"Monday morning meetings."') == "Monday morning meetings"
+    assert clean_statement('When you say "hi".') == 'When you say "hi"'
+    assert clean_statement('“Smart quotes”') == "Smart quotes"
+    assert clean_statement('Unclosed quote"') == "Unclosed quote"
+    assert clean_statement('"') == ""
+
+def test_fuzz():
+    rng = random.Random(0)
+    alphabet = string.printable + '"[]{}\\•“”'
+    for _ in range(2000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 200)))
+        whole = parse_statements(text)
+        assert all(isinstance(s, str) and s for s in whole)
+        assert streamed(text, rng.randint(1, 10)) == whole, text
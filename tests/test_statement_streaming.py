@@ -0,0 +1,185 @@
+# tests/test_statement_streaming.py
+# statement_bank.fill_session with streaming on, against a stub OpenAI client that streams
+# chunks on cue and an in-memory stand-in for the statement_bank / game_sentences tables.
+
+import asyncio
+import json
+import os
+import types
+from contextlib import asynccontextmanager
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")  # app.statements builds its client on import
+
+from app import statement_bank, statements
+from app.queries import DRAW_STATEMENTS
+
+SESSION = 3
+CATEGORY = "Office Life"
+
+class StubStream:
+    # Streams the given chunks; waits on `gate` before chunk `pause_at`, raises `error` at `fail_at`
+    def __init__(self, chunks, pause_at=None, fail_at=None):
+        self.chunks = chunks
+        self.pause_at = pause_at
+        self.fail_at = fail_at
+        self.gate = asyncio.Event()
+        self.finished = False
+
+    async def __aiter__(self):
+        for i, content in enumerate(self.chunks):
+            if i == self.pause_at:
+                await self.gate.wait()
+            if i == self.fail_at:
+                raise ConnectionError("stream reset by peer")
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=content))])
+        self.finished = True
+
+class StubOpenAI:
+    def __init__(self, stream):
+        self.requests = []
+
+        async def create(**args):
+            self.requests.append(args)
+            return stream
+
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=create))
+
+class FakeTables:
+    # statement_bank rows per category key and game_sentences rows per session, in insert order
+    def __init__(self, bank=()):
+        self.bank = {statement_bank.normalize_category(CATEGORY): list(bank)}
+        self.sentences = {SESSION: []}
+        self.invalidated = 0
+
+    async def fetch(self, query, *args):
+        assert query is DRAW_STATEMENTS
+        session_id, key, count = args
+        picked = [s for s in self.bank.get(key, []) if s not in self.sentences[session_id]][:count]
+        self.sentences[session_id].extend(picked)
+        return [{"sentence": s} for s in picked]
+
+    @asynccontextmanager
+    async def transaction(self):
+        tables = self
+
+        class Tx:
+            async def executemany(self, query, rows):
+                for first, sentence in rows:
+                    if "statement_bank" in query:
+                        if sentence not in tables.bank.setdefault(first, []):
+                            tables.bank[first].append(sentence)
+                    else:
+                        tables.sentences[first].append(sentence)
+        yield Tx()
+
+    async def get_game_state(self, session_id):
+        # Just enough GameState for _persist_batch: add_sentences is written straight through
+        tables = self
+
+        class State:
+            def add_sentences(self, sentences):
+                tables.sentences[session_id].extend(sentences)
+
+            def commit(self):
+                pass
+        return State()
+
+    async def invalidate_game_state(self, session_id):
+        self.invalidated += 1
+
+@pytest.fixture
+def tables(monkeypatch):
+    db = FakeTables(bank=["Bank one", "Bank two", "Bank three"])
+    monkeypatch.setattr(statement_bank, "fetch", db.fetch)
+    monkeypatch.setattr(statement_bank, "transaction", db.transaction)
+    monkeypatch.setattr(statement_bank, "get_game_state", db.get_game_state)
+    monkeypatch.setattr(statement_bank, "invalidate_game_state", db.invalidate_game_state)
+    monkeypatch.setattr(statement_bank, "STATEMENT_STREAMING", True)
+    monkeypatch.setattr(statement_bank, "STATEMENT_PERSIST_BATCH", 2)
+    return db
+
+def json_chunks(sentences, size=7):
+    text = json.dumps({"statements": sentences})
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def use_stream(monkeypatch, stream):
+    monkeypatch.setattr(statements, "client", StubOpenAI(stream))
+
+async def settle():
+    await asyncio.gather(*statement_bank._stream_tasks)
+
+def test_game_starts_on_the_first_statement_and_the_rest_follow_in_order(tables, monkeypatch):
+    tables.bank = {}  # new category: everything comes from the model
+    generated = [f"Generated {n}" for n in range(1, 7)]
+    chunks = json_chunks(generated)
+    # Hold the stream right after the first statement has closed
+    first_done = next(i for i in range(len(chunks)) if generated[0] + '"' in "".join(chunks[:i]))
+    stream = StubStream(chunks, pause_at=first_done)
+    use_stream(monkeypatch, stream)
+
+    async def scenario():
+        head = await statement_bank.fill_session(SESSION, CATEGORY, count=6, needed_now=1)
+        at_start = list(tables.sentences[SESSION])
+        stream.gate.set()
+        await settle()
+        return head, at_start
+
+    head, at_start = asyncio.run(scenario())
+
+    assert head == ["Generated 1"]
+    assert at_start == ["Generated 1"]  # round 1 is playable before the model has finished
+    assert stream.finished
+    assert tables.sentences[SESSION] == generated
+    assert tables.bank[statement_bank.normalize_category(CATEGORY)] == generated
+
+def test_bank_statements_come_first_and_only_the_shortfall_is_generated(tables, monkeypatch):
+    stream = StubStream(json_chunks(["Generated 1", "Generated 2"]))
+    client = StubOpenAI(stream)
+    monkeypatch.setattr(statements, "client", client)
+
+    async def scenario():
+        head = await statement_bank.fill_session(SESSION, CATEGORY, count=5, needed_now=1)
+        await settle()
+        return head
+
+    head = asyncio.run(scenario())
+
+    assert head == ["Bank one", "Bank two", "Bank three"]
+    assert "Give me 2 statements" in client.requests[0]["messages"][1]["content"]
+    assert tables.sentences[SESSION] == ["Bank one", "Bank two", "Bank three", "Generated 1", "Generated 2"]
+
+def test_stream_failure_partway_falls_back_to_the_bank(tables, monkeypatch):
+    tables.bank[statement_bank.normalize_category(CATEGORY)] = []  # empty at start, refilled meanwhile
+    generated = [f"Generated {n}" for n in range(1, 6)]
+    chunks = json_chunks(generated)
+    after_three = next(i for i in range(len(chunks)) if generated[2] + '"' in "".join(chunks[:i]))
+    use_stream(monkeypatch, StubStream(chunks, fail_at=after_three))
+
+    async def scenario():
+        head = await statement_bank.fill_session(SESSION, CATEGORY, count=5, needed_now=1)
+        tables.bank[statement_bank.normalize_category(CATEGORY)] += ["Refilled one", "Refilled two", "Refilled three"]
+        await settle()
+        return head
+
+    head = asyncio.run(scenario())
+
+    assert head == ["Generated 1"]
+    sentences = tables.sentences[SESSION]
+    assert sentences[:3] == generated[:3]
+    assert sentences[3:] == ["Refilled one", "Refilled two"]
+    assert len(set(sentences)) == len(sentences) == 5
+    assert tables.invalidated == 1
+
+def test_stream_failure_before_the_first_statement_uses_the_bank(tables, monkeypatch):
+    use_stream(monkeypatch, StubStream(json_chunks(["Generated 1"]), fail_at=0))
+
+    async def scenario():
+        # The bank's three statements were drawn first; nothing is left for the missing two
+        return await statement_bank.fill_session(SESSION, CATEGORY, count=5, needed_now=4)
+
+    head = asyncio.run(scenario())
+
+    assert head == ["Bank one", "Bank two", "Bank three"]
+    assert tables.sentences[SESSION] == head
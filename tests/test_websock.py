@@ -0,0 +1,166 @@
+# tests/test_websock.py
+# Presence coalescing and the per-socket Outbox in app/routes/websock.py, against stubbed
+# payload builders, broadcasts and sockets.
+
+import asyncio
+import json
+import types
+
+import pytest
+
+from app.routes import websock
+
+ROOM = "session_7"
+
+@pytest.fixture
+def presence(monkeypatch):
+    sent = []
+
+    async def fake_payload(room, trigger_user, trigger_event, notify=None):
+        return {
+            "session_id": 7,
+            "players": ["ann", "bob", "cat"],
+            "trigger_user": trigger_user,
+            "trigger_event": trigger_event,
+            "notify": notify or [],
+        }
+
+    async def fake_broadcast(room, message, snapshot=None):
+        sent.append(message)
+
+    monkeypatch.setattr(websock, "PRESENCE_COALESCE_SECONDS", 0.01)
+    monkeypatch.setattr(websock, "build_presence_payload", fake_payload)
+    monkeypatch.setattr(websock, "broadcast", fake_broadcast)
+    monkeypatch.setattr(websock, "pending_presence", {})
+    monkeypatch.setattr(websock, "presence_tasks", {})
+    monkeypatch.setattr(websock, "last_presence_payload", {ROOM: {"session_id": 7, "players": ["ann", "bob", "cat"]}})
+    monkeypatch.setattr(websock, "rooms_needing_snapshot", set())
+    return sent
+
+def flush(*events):
+    async def scenario():
+        for user, event in events:
+            await websock.broadcast_presence(ROOM, trigger_user=user, trigger_event=event)
+        await asyncio.gather(*websock.presence_tasks.values())
+    asyncio.run(scenario())
+
+def test_every_join_in_one_window_is_notified(presence):
+    flush(("ann", "joined"), ("bob", "joined"), ("cat", "presence_update"), ("ann", "joined"))
+
+    assert len(presence) == 1
+    delta = presence[0]
+    assert delta["type"] == "session_delta"
+    assert delta["payload"]["notify"] == [{"user": "ann", "event": "joined"}, {"user": "bob", "event": "joined"}]
+    # The trigger fields still name the last join, not the heartbeat that came after it
+    assert (delta["payload"]["trigger_user"], delta["payload"]["trigger_event"]) == ("ann", "joined")
+
+def test_unchanged_heartbeat_sends_nothing(presence):
+    flush(("cat", "presence_update"))
+
+    assert presence == []
+
+def test_join_and_leave_are_both_kept(presence):
+    flush(("ann", "joined"), ("ann", "left"))
+
+    assert presence[0]["payload"]["notify"] == [{"user": "ann", "event": "joined"}, {"user": "ann", "event": "left"}]
+
+# ---- Outbox overflow policies ----
+
+class FakeSocket:
+    # send_text blocks until the gate opens, like a client that stopped reading
+    def __init__(self):
+        self.client_state = types.SimpleNamespace(name="CONNECTED")
+        self.gate = asyncio.Event()
+        self.sent = []
+        self.closed = False
+
+    async def send_text(self, text):
+        await self.gate.wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self):
+        self.closed = True
+
+def message(kind, session_id=None, **fields):
+    payload = {"session_id": session_id, **fields} if session_id is not None else fields
+    return {"type": kind, "payload": payload} if kind in websock.SESSION_MESSAGE_TYPES else {"type": kind, **fields}
+
+def put(outbox, kind, session_id=None, snapshot=None, **fields):
+    msg = message(kind, session_id, **fields)
+    snapshot_text = websock.encode_message(snapshot) if snapshot else None
+    return outbox.put(kind, websock.encode_message(msg), snapshot_text, websock.session_key(msg))
+
+def queued(outbox):
+    return [(kind, key, json.loads(text)) for kind, key, text, _ in outbox.queue]
+
+@pytest.fixture
+def small_queue(monkeypatch):
+    monkeypatch.setattr(websock, "WS_QUEUE_SIZE", 3)
+    monkeypatch.setattr(websock, "WS_SEND_TIMEOUT", 5)
+    monkeypatch.setattr(websock, "rooms", {})
+    monkeypatch.setattr(websock, "outboxes", {})
+    monkeypatch.setattr(websock, "rooms_needing_snapshot", set())
+
+def test_full_queue_coalesces_updates_for_the_same_session(small_queue, monkeypatch):
+    monkeypatch.setattr(websock, "WS_OVERFLOW_POLICY", "coalesce")
+
+    async def scenario():
+        outbox = websock.Outbox(ROOM, FakeSocket())
+        put(outbox, "session_update", 1, players=["ann"])
+        put(outbox, "start_voting", round=2)
+        put(outbox, "session_delta", 2, players=["zed"])
+        # Full: a delta for session 1 replaces session 1's queued update with its full snapshot
+        ok = put(outbox, "session_delta", 1, players=["ann", "bob"],
+                 snapshot={"type": "session_update", "payload": {"session_id": 1, "players": ["ann", "bob"]}})
+        contents = queued(outbox)
+        outbox.close()
+        return ok, contents
+
+    ok, contents = asyncio.run(scenario())
+
+    assert ok
+    assert [(kind, key) for kind, key, _ in contents] == [("start_voting", None), ("session_delta", 2), ("session_update", 1)]
+    assert contents[2][2]["payload"]["players"] == ["ann", "bob"]
+
+def test_game_events_are_never_dropped(small_queue, monkeypatch):
+    monkeypatch.setattr(websock, "WS_OVERFLOW_POLICY", "drop_oldest")
+
+    async def scenario():
+        outbox = websock.Outbox(ROOM, FakeSocket())
+        put(outbox, "session_update", 1, players=["ann"])
+        put(outbox, "start_voting", round=2)
+        put(outbox, "session_delta", 1, players=["bob"])
+        ok = put(outbox, "results", round_winners=["ann"])
+        contents = queued(outbox)
+        outbox.close()
+        return ok, contents, outbox
+
+    ok, contents, outbox = asyncio.run(scenario())
+
+    assert ok
+    assert outbox.dropped == 1
+    assert [kind for kind, _, _ in contents] == ["start_voting", "session_delta", "results"]
+    # The queued delta lost its base, so the next session message goes out as a full snapshot
+    assert outbox.needs_snapshot
+
+def test_overflow_with_only_game_events_disconnects_and_stops_sending(small_queue):
+    async def scenario():
+        ws = FakeSocket()
+        await websock.connect_to_room(ROOM, ws)
+        for round in range(1, 5):
+            await websock.deliver_local(ROOM, "new_round", websock.encode_message({"type": "new_round", "round": round}))
+            await asyncio.sleep(0)  # round 1 is in flight on the blocked socket, 2-4 fill the queue
+        # The socket unblocks in the same tick as the overflow, so the writer's cancellation
+        # lands on a send that has already completed
+        ws.gate.set()
+        await websock.deliver_local(ROOM, "results", websock.encode_message({"type": "results"}))
+        dropped = ws not in websock.outboxes and ROOM not in websock.rooms
+        await asyncio.sleep(0.05)
+        return ws, dropped
+
+    ws, dropped = asyncio.run(scenario())
+
+    assert dropped
+    assert ws.closed
+    # Only the send that was already in flight reached the socket
+    assert ws.sent == [{"type": "new_round", "round": 1}]